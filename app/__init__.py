@@ -6,4 +6,80 @@ import os
 
 # Initialize Flask extensions
 mongo = PyMongo()
-cors = CORS()
\ No newline at end of file
+cors = CORS()
+
+API_V2_PREFIX = '/api/v2'
+TEMPLATE_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'templates'))
+
+
+def create_app(config=None):
+    """Build the application.
+
+    `config` (a mapping) overrides the defaults of app/config.py. Creating
+    the app does not touch the network: the MongoClient connects on first
+    use, and indexes are created by `flask --app app init-db` (or at
+    creation with MONGO_ENSURE_INDEXES).
+    """
+    from app.cache import LRUCache, RecordCache, RedisCache
+    from app.compression import register_compression
+    from app.config import Config, mongo_client_options
+    from app.error_handlers import register_error_handlers
+    from app.json_provider import OrjsonProvider
+    from app.metrics import mongo_listeners, register_metrics
+    from app.overdue import start_overdue_scheduler
+    from app.routes.api import bp as api_bp
+    from app.routes.documents import bp as documents_bp
+    from app.routes.loans import bp as loans_bp
+    from app.routes.subscribers import bp as subscribers_bp
+    from app.slow_queries import SlowQueryLog
+    from app.schemas import init_db
+
+    app = Flask(__name__, template_folder=TEMPLATE_FOLDER)
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+
+    # ObjectId, datetime and Decimal128 are encoded by the JSON provider, so
+    # documents from PyMongo can be passed to jsonify() as they are
+    app.json = OrjsonProvider(app)
+    cors.init_app(app)
+    listeners = mongo_listeners() if app.config['METRICS_ENABLED'] else []
+    slow_queries = SlowQueryLog(
+        app.config['SLOW_QUERY_MS'], app.config['SLOW_QUERY_LOG_SIZE'], app.config['SLOW_QUERY_EXPLAIN']
+    )
+    if app.config['SLOW_QUERY_LOG_SIZE'] > 0:
+        listeners.append(slow_queries)
+    mongo.init_app(app, event_listeners=listeners, **mongo_client_options(app.config))
+    slow_queries.attach(mongo.cx)
+    app.extensions['slow_queries'] = slow_queries
+
+    app.extensions['record_cache'] = RecordCache(
+        LRUCache(app.config['CACHE_MAXSIZE'], app.config['CACHE_LOCAL_TTL']),
+        RedisCache(app.config['CACHE_REDIS_URL'], app.config['CACHE_TTL']) if app.config['CACHE_REDIS_URL'] else None
+    )
+
+    register_error_handlers(app)
+    if app.config['METRICS_ENABLED']:
+        # Before compression, whose after_request hook must run first
+        register_metrics(app)
+    register_compression(app)
+    app.register_blueprint(api_bp)
+    # Resource blueprints: {data, total, page, ...} envelopes and
+    # schema-validated writes, next to the /api routes the UI uses
+    app.register_blueprint(documents_bp, url_prefix=f'{API_V2_PREFIX}/documents')
+    app.register_blueprint(loans_bp, url_prefix=f'{API_V2_PREFIX}/loans')
+    app.register_blueprint(subscribers_bp, url_prefix=f'{API_V2_PREFIX}/subscribers')
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create the MongoDB indexes (app/indexes.py)."""
+        init_db(mongo)
+        print("Indexes created")
+
+    if app.config['MONGO_ENSURE_INDEXES']:
+        init_db(mongo)
+
+    if app.config['OVERDUE_SCAN_INTERVAL'] > 0:
+        start_overdue_scheduler(mongo.db, app.config['OVERDUE_SCAN_INTERVAL'])
+
+    return app
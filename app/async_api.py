@@ -0,0 +1,569 @@
+# async_api.py
+# Async serving mode: the subscriber, document and loan routes of
+# app/routes/api.py on Quart and Motor. A worker keeps serving other requests
+# while one waits on MongoDB, and the independent queries of a request run
+# concurrently with asyncio.gather.
+#
+#   hypercorn --workers 4 --bind 0.0.0.0:5000 asgi:app
+#
+# Search, suggest, facets, import/export, batch circulation and the /api/v2
+# blueprints stay on the WSGI app. Run one mode or the other against a
+# database: the async app counts its writes for the list ETags but does not
+# use the record cache.
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+from quart import Blueprint, Quart, Response, current_app, jsonify, render_template, request
+from werkzeug.local import LocalProxy
+
+from app import TEMPLATE_FOLDER
+from app.circulation import (
+    OPEN_LOAN_STATUSES, CirculationError, document_return_update, subscriber_return_update
+)
+from app.conditional import COUNTERS_COLLECTION, change_counter_updates, new_record_fields, touch
+from app.config import Config, mongo_client_options
+from app.facets import facet_cache
+from app.filters import document_filter, loan_filter
+from app.json_provider import OrjsonProvider, dumps_bytes
+from app.pagination import (
+    MAX_PER_PAGE, PaginationError, decode_cursor, keyset_filter, merge_filters, next_page_link, page_window,
+    parse_page, parse_per_page, parse_sort, sort_spec
+)
+from app.read_model import (
+    LOAN_LIST_PROJECTION, READ_MODEL_DENORMALIZED, READ_MODELS,
+    loan_display_fields, loan_list_pipeline, sync_document_title, sync_subscriber_name
+)
+from app.routes.api import (
+    DOCUMENT_PROJECTION, DOCUMENT_SORT_KEYS, LOAN_SORT_KEYS, STREAM_BATCH_SIZE, SUBSCRIBER_LIST_PROJECTION,
+    SUBSCRIBER_SORT_KEYS, parse_loan_dates
+)
+from app.serializers import serialize_loan, serialize_subscriber
+from app.streaming import CHUNK_SIZE
+from app.suggest import SUGGEST_FIELD, document_suggest_keys, subscriber_suggest_keys
+
+bp = Blueprint('async_api', __name__)
+
+# Motor database of the running app
+db = LocalProxy(lambda: current_app.extensions['motor_db'])
+
+
+def create_async_app(config=None):
+    """Quart counterpart of create_app(), with the same configuration"""
+    app = Quart(__name__, template_folder=TEMPLATE_FOLDER)
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+    app.json = OrjsonProvider(app)
+
+    @app.before_serving
+    async def open_client():
+        # Created on the server's event loop, one pool per worker
+        client = AsyncIOMotorClient(app.config['MONGO_URI'], **mongo_client_options(app.config))
+        app.extensions['motor_client'] = client
+        app.extensions['motor_db'] = client.get_default_database()
+
+    @app.after_serving
+    async def close_client():
+        app.extensions.pop('motor_client').close()
+
+    app.register_blueprint(bp)
+    return app
+
+
+async def records_changed(**record_ids):
+    """Count the change for the list ETags (see conditional.list_validators)
+    and drop the facet counts if the catalogue changed"""
+    if record_ids:
+        await db[COUNTERS_COLLECTION].bulk_write(change_counter_updates(*record_ids), ordered=False)
+    if 'documents' in record_ids:
+        facet_cache.invalidate()
+
+
+async def paginate(collection, filter_query, sort_key, direction, cursor, per_page, projection=None):
+    """pagination.paginate() on Motor. Returns (items, next_cursor)."""
+    position = decode_cursor(cursor, sort_key, direction)
+    if position is not None:
+        filter_query = merge_filters(filter_query, keyset_filter(sort_key, direction, position))
+    items = await (
+        collection.find(filter_query, projection)
+        .sort(sort_spec(sort_key, direction))
+        .limit(per_page + 1)
+        .to_list(None)
+    )
+    return page_window(items, per_page, sort_key, direction)
+
+
+def keyset_response(name, items, next_cursor, per_page, sort_key, direction):
+    return jsonify({
+        name: items,
+        "pagination": {
+            "per_page": per_page,
+            "sort": sort_key,
+            "order": "asc" if direction == ASCENDING else "desc",
+            "next_cursor": next_cursor,
+            "has_next": next_cursor is not None
+        }
+    })
+
+
+def stream_rows(cursor, serialize, fmt='json'):
+    """streaming.stream_rows() for a Motor cursor"""
+    ndjson = fmt == 'ndjson'
+
+    async def body():
+        buffer = bytearray(b'' if ndjson else b'[')
+        first = True
+        async for row in cursor:
+            if not ndjson and not first:
+                buffer += b','
+            buffer += dumps_bytes(serialize(row))
+            if ndjson:
+                buffer += b'\n'
+            first = False
+            if len(buffer) >= CHUNK_SIZE:
+                yield bytes(buffer)
+                buffer.clear()
+        if not ndjson:
+            buffer += b']'
+        yield bytes(buffer)
+
+    return Response(body(), mimetype='application/x-ndjson' if ndjson else 'application/json')
+
+
+# Frontend routes
+@bp.route('/')
+async def index():
+    return await render_template('index.html')
+
+
+# Subscribers
+@bp.route('/api/subscribers/', methods=['GET'])
+async def get_subscribers():
+    try:
+        projection = None if request.args.get('include') == 'loans' else SUBSCRIBER_LIST_PROJECTION
+        if 'cursor' in request.args:
+            sort_key, direction = parse_sort(request.args, SUBSCRIBER_SORT_KEYS)
+            per_page = parse_per_page(request.args)
+            subscribers, next_cursor = await paginate(
+                db.subscribers, {}, sort_key, direction, request.args['cursor'], per_page, projection
+            )
+            return keyset_response(
+                "subscribers", [serialize_subscriber(subscriber) for subscriber in subscribers],
+                next_cursor, per_page, sort_key, direction
+            )
+
+        subscribers = db.subscribers.find({}, projection, batch_size=STREAM_BATCH_SIZE)
+        return stream_rows(subscribers, serialize_subscriber, request.args.get('format', 'json'))
+    except PaginationError as e:
+        return jsonify({"error": "Invalid pagination parameters", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": "Internal server error", "message": str(e)}), 500
+
+
+@bp.route('/api/subscribers', methods=['POST'])
+async def add_subscriber():
+    try:
+        data = await request.get_json()
+        data['inscription_date'] = datetime.utcnow()
+        data['current_loans'] = []
+        data['loan_history'] = []
+        data[SUGGEST_FIELD] = subscriber_suggest_keys(data)
+        data.update(new_record_fields())
+
+        result = await db.subscribers.insert_one(data)
+        await records_changed(subscribers=[result.inserted_id])
+        return jsonify({
+            "message": "Subscriber added successfully",
+            "id": str(result.inserted_id)
+        }), 201
+    except Exception as e:
+        return jsonify({"message": "Failed to add subscriber", "error": str(e)}), 400
+
+
+@bp.route('/api/subscribers/<subscriber_id>', methods=['GET'])
+async def get_subscriber(subscriber_id):
+    try:
+        subscriber = await db.subscribers.find_one({"_id": ObjectId(subscriber_id)})
+        if not subscriber:
+            return jsonify({"message": "Subscriber not found"}), 404
+        return jsonify(subscriber)
+    except Exception as e:
+        return jsonify({"message": "Failed to fetch subscriber", "error": str(e)}), 400
+
+
+@bp.route('/api/subscribers/<subscriber_id>', methods=['PUT'])
+async def update_subscriber(subscriber_id):
+    try:
+        data = await request.get_json()
+        subscriber_id = ObjectId(subscriber_id)
+        result = await db.subscribers.update_one(
+            {"_id": subscriber_id},
+            touch({"$set": {
+                "first_name": data.get("first_name"),
+                "last_name": data.get("last_name"),
+                "email": data.get("email"),
+                "address": data.get("address"),
+                "phone": data.get("phone"),
+                SUGGEST_FIELD: subscriber_suggest_keys(data)
+            }})
+        )
+        # Only once the subscriber itself was updated
+        if result.matched_count and ("first_name" in data or "last_name" in data):
+            await sync_subscriber_name(db, subscriber_id, data)
+            await records_changed(subscribers=[subscriber_id], loans=[])
+        else:
+            await records_changed(subscribers=[subscriber_id])
+
+        return jsonify({"message": "Subscriber updated successfully"}), 200
+    except Exception as e:
+        return jsonify({"message": "Failed to update subscriber", "error": str(e)}), 400
+
+
+@bp.route('/api/subscribers/<subscriber_id>', methods=['DELETE'])
+async def delete_subscriber(subscriber_id):
+    try:
+        result = await db.subscribers.delete_one({"_id": ObjectId(subscriber_id)})
+        if result.deleted_count == 1:
+            await records_changed(subscribers=[subscriber_id])
+            return jsonify({"message": "Subscriber deleted successfully"}), 200
+        return jsonify({"message": "Subscriber not found"}), 404
+    except Exception as e:
+        return jsonify({"error": "Failed to delete subscriber", "message": str(e)}), 400
+
+
+# Documents
+@bp.route('/api/documents/', methods=['GET'])
+async def get_documents():
+    try:
+        sort_key, direction = parse_sort(request.args, DOCUMENT_SORT_KEYS)
+        filter_query = document_filter(request.args)
+
+        if 'cursor' in request.args:
+            per_page = parse_per_page(request.args)
+            documents, next_cursor = await paginate(
+                db.documents, filter_query, sort_key, direction, request.args['cursor'], per_page,
+                DOCUMENT_PROJECTION
+            )
+            return keyset_response("documents", documents, next_cursor, per_page, sort_key, direction)
+
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 10))
+        if filter_query or request.args.get('count') == 'exact':
+            count = db.documents.count_documents(filter_query)
+        else:
+            count = db.documents.estimated_document_count()
+        # The count and the page are independent queries
+        total_documents, documents = await asyncio.gather(
+            count,
+            db.documents.find(filter_query, DOCUMENT_PROJECTION)
+            .sort(sort_spec(sort_key, direction))
+            .skip((page - 1) * per_page)
+            .limit(per_page)
+            .to_list(None)
+        )
+
+        return jsonify({
+            "documents": documents,
+            "pagination": {
+                "page": page,
+                "per_page": per_page,
+                "total_documents": total_documents,
+                "total_pages": max(1, (total_documents + per_page - 1) // per_page)
+            }
+        })
+    except PaginationError as e:
+        return jsonify({"error": "Invalid pagination parameters", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": "Internal server error", "message": str(e)}), 500
+
+
+@bp.route('/api/documents', methods=['POST'])
+async def create_document():
+    try:
+        data = await request.get_json()
+        data['available'] = True  # New documents are always available
+        data[SUGGEST_FIELD] = document_suggest_keys(data)
+        data.update(new_record_fields())
+        result = await db.documents.insert_one(data)
+        await records_changed(documents=[result.inserted_id])
+        return jsonify({
+            "message": "Document created successfully",
+            "id": str(result.inserted_id)
+        }), 201
+    except Exception as e:
+        return jsonify({"message": "Failed to create document", "error": str(e)}), 400
+
+
+@bp.route('/api/documents/<document_id>', methods=['GET'])
+async def get_document(document_id):
+    try:
+        document = await db.documents.find_one({"_id": ObjectId(document_id)}, DOCUMENT_PROJECTION)
+        if not document:
+            return jsonify({"message": "Document not found"}), 404
+        return jsonify(document)
+    except Exception as e:
+        return jsonify({"message": "Failed to fetch document", "error": str(e)}), 400
+
+
+@bp.route('/api/documents/<document_id>', methods=['PUT'])
+async def update_document(document_id):
+    try:
+        data = await request.get_json()
+        document_id = ObjectId(document_id)
+        result = await db.documents.update_one(
+            {"_id": document_id},
+            touch({"$set": {
+                "title": data.get("title"),
+                "author": data.get("author"),
+                "type": data.get("type"),
+                "isbn": data.get("isbn"),
+                "genre": data.get("genre"),
+                "publication_date": data.get("publication_date"),
+                "available": data.get("available", True),
+                SUGGEST_FIELD: document_suggest_keys(data)
+            }})
+        )
+        if result.matched_count == 0:
+            return jsonify({"message": "Document not found"}), 404
+
+        # Only once the document itself was updated
+        if "title" in data:
+            await sync_document_title(db, document_id, data.get("title"))
+            await records_changed(documents=[document_id], loans=[])
+        else:
+            await records_changed(documents=[document_id])
+        return jsonify({"message": "Document updated successfully"}), 200
+    except Exception as e:
+        return jsonify({"message": "Failed to update document", "error": str(e)}), 400
+
+
+@bp.route('/api/documents/<document_id>', methods=['DELETE'])
+async def delete_document(document_id):
+    try:
+        document_id = ObjectId(document_id)
+        loan = await db.loans.find_one({"document_id": document_id, "status": {"$in": OPEN_LOAN_STATUSES}})
+        if loan:
+            return jsonify({"message": "Cannot delete document that is currently loaned"}), 400
+
+        result = await db.documents.delete_one({"_id": document_id})
+        if result.deleted_count == 0:
+            return jsonify({"message": "Document not found"}), 404
+        await records_changed(documents=[document_id])
+        return jsonify({"message": "Document deleted successfully"}), 200
+    except Exception as e:
+        return jsonify({"message": "Failed to delete document", "error": str(e)}), 400
+
+
+# Loans
+@bp.route('/api/loans/', methods=['GET'])
+async def get_loans():
+    try:
+        sort_key, direction = parse_sort(request.args, LOAN_SORT_KEYS)
+        match = loan_filter(request.args)
+
+        read_model = request.args.get('read_model', current_app.config['LOANS_READ_MODEL'])
+        if read_model not in READ_MODELS:
+            return jsonify({"error": f"Unknown read model '{read_model}'"}), 400
+
+        if 'cursor' in request.args:
+            per_page = parse_per_page(request.args)
+            if read_model == READ_MODEL_DENORMALIZED:
+                loans, next_cursor = await paginate(
+                    db.loans, match, sort_key, direction, request.args['cursor'], per_page, LOAN_LIST_PROJECTION
+                )
+            else:
+                position = decode_cursor(request.args['cursor'], sort_key, direction)
+                if position is not None:
+                    match = merge_filters(match, keyset_filter(sort_key, direction, position))
+                pipeline = loan_list_pipeline(match, sort_spec(sort_key, direction), per_page + 1)
+                loans, next_cursor = page_window(
+                    await db.loans.aggregate(pipeline).to_list(None), per_page, sort_key, direction
+                )
+            return keyset_response("loans", loans, next_cursor, per_page, sort_key, direction)
+
+        skip, limit = parse_page(request.args, MAX_PER_PAGE)
+        if read_model == READ_MODEL_DENORMALIZED:
+            cursor = (
+                db.loans.find(match, LOAN_LIST_PROJECTION)
+                .sort(sort_spec(sort_key, direction))
+                .skip(skip)
+                .limit(limit + 1)
+            )
+        else:
+            cursor = db.loans.aggregate(loan_list_pipeline(match, sort_spec(sort_key, direction), limit + 1, skip))
+        loans = await cursor.to_list(None)
+        response = jsonify(loans[:limit])
+        if len(loans) > limit:
+            response.headers['Link'] = next_page_link(request.base_url, request.args, skip, limit)
+        return response
+    except PaginationError as e:
+        return jsonify({"error": "Invalid pagination parameters", "message": str(e)}), 400
+    except (InvalidId, ValueError) as e:
+        return jsonify({"error": "Invalid filter", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": "Failed to fetch loans"}), 500
+
+
+async def _release(subscriber_id, document_id, loan_id):
+    """Undo a partial checkout"""
+    await asyncio.gather(
+        db.subscribers.update_one(
+            {'_id': subscriber_id},
+            touch({'$pull': {'current_loans': {'_id': loan_id}}})
+        ),
+        db.loans.delete_one({'_id': loan_id}),
+        db.documents.update_one(
+            {'_id': document_id, 'current_loan_id': loan_id},
+            touch({'$set': {'available': True}, '$unset': {'current_loan_id': ''}})
+        )
+    )
+
+
+async def checkout(subscriber_id, document_id, loan_date, due_date):
+    """circulation.checkout() in two concurrent rounds instead of three
+    sequential round trips.
+
+    The document claim (the same conditional find_one_and_update, so only
+    one of several concurrent checkouts wins) runs together with the
+    subscriber lookup; the loan insert and the push onto current_loans then
+    run together. A failure in either round releases the document.
+    """
+    loan_id = ObjectId()
+    subscriber, document = await asyncio.gather(
+        db.subscribers.find_one({'_id': subscriber_id}, {'first_name': 1, 'last_name': 1}),
+        db.documents.find_one_and_update(
+            {'_id': document_id, 'available': True},
+            touch({'$set': {'available': False, 'current_loan_id': loan_id}}),
+            projection={'title': 1}
+        )
+    )
+    if document is None:
+        raise CirculationError('Document not available', 400)
+    if subscriber is None:
+        await _release(subscriber_id, document_id, loan_id)
+        raise CirculationError('Subscriber not found', 404)
+
+    loan = {
+        '_id': loan_id,
+        'subscriber_id': subscriber_id,
+        'document_id': document_id,
+        'loan_date': loan_date,
+        'due_date': due_date,
+        'status': 'active'
+    }
+    results = await asyncio.gather(
+        db.subscribers.update_one({'_id': subscriber_id}, touch({'$push': {'current_loans': dict(loan)}})),
+        db.loans.insert_one(dict(loan, **loan_display_fields(subscriber, document), **new_record_fields())),
+        return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        await _release(subscriber_id, document_id, loan_id)
+        raise errors[0]
+    return loan
+
+
+@bp.route('/api/loans', methods=['POST'])
+async def create_loan():
+    try:
+        data = await request.get_json()
+        loan_date, due_date = parse_loan_dates(data)
+
+        subscriber_id = ObjectId(data['subscriber_id'])
+        document_id = ObjectId(data['document_id'])
+        loan = await checkout(subscriber_id, document_id, loan_date, due_date)
+        await records_changed(documents=[document_id], subscribers=[subscriber_id], loans=[loan['_id']])
+
+        return jsonify({
+            "message": "Loan created successfully",
+            "id": str(loan['_id'])
+        }), 201
+    except CirculationError as e:
+        return jsonify({"error": e.message}), e.status_code
+    except ValueError:
+        return jsonify({"error": "Invalid date format"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/api/loans/<loan_id>', methods=['GET'])
+async def get_loan(loan_id):
+    try:
+        loan = await db.loans.find_one({"_id": ObjectId(loan_id)})
+        if not loan:
+            return jsonify({"message": "Loan not found"}), 404
+        return jsonify(serialize_loan(loan))
+    except Exception as e:
+        return jsonify({"message": "Failed to fetch loan", "error": str(e)}), 400
+
+
+@bp.route('/api/loans/<loan_id>', methods=['PUT'])
+async def update_loan(loan_id):
+    try:
+        data = await request.get_json()
+        loan_id = ObjectId(loan_id)
+        loan = await db.loans.find_one({"_id": loan_id})
+        if not loan:
+            return jsonify({"message": "Loan not found"}), 404
+
+        if data.get("status") == "returned" and loan["status"] in OPEN_LOAN_STATUSES:
+            # Same writes as circulation.return_batch: the loan is closed only
+            # if still open, then its document and subscriber are written at once
+            return_date = datetime.utcnow()
+            closed = await db.loans.update_one(
+                {"_id": loan_id, "status": {"$in": OPEN_LOAN_STATUSES}},
+                touch({"$set": {"status": "returned", "return_date": return_date}})
+            )
+            if closed.modified_count:
+                returned = dict(loan, status="returned", return_date=return_date)
+                await asyncio.gather(
+                    db.documents.update_one(*document_return_update(loan)),
+                    db.subscribers.update_one(*subscriber_return_update(loan["subscriber_id"], [returned]))
+                )
+            await records_changed(loans=[loan_id], documents=[loan["document_id"]], subscribers=[loan["subscriber_id"]])
+            return jsonify({"message": "Loan updated successfully"}), 200
+
+        await db.loans.update_one({"_id": loan_id}, touch({"$set": {"status": data.get("status", loan["status"])}}))
+        await records_changed(loans=[loan_id])
+        return jsonify({"message": "Loan updated successfully"}), 200
+    except Exception as e:
+        return jsonify({"message": "Failed to update loan", "error": str(e)}), 400
+
+
+@bp.route('/api/loans/<loan_id>', methods=['DELETE'])
+async def delete_loan(loan_id):
+    try:
+        loan_id = ObjectId(loan_id)
+        loan = await db.loans.find_one({"_id": loan_id}, {"status": 1})
+        if not loan:
+            return jsonify({"message": "Loan not found"}), 404
+        if loan["status"] in OPEN_LOAN_STATUSES:
+            return jsonify({"message": "Cannot delete active loan"}), 400
+
+        await db.loans.delete_one({"_id": loan_id})
+        await records_changed(loans=[loan_id])
+        return jsonify({"message": "Loan deleted successfully"}), 200
+    except Exception as e:
+        return jsonify({"message": "Failed to delete loan", "error": str(e)}), 400
+
+
+@bp.route('/api/loans/subscriber/<subscriber_id>', methods=['GET'])
+async def get_subscriber_loans(subscriber_id):
+    try:
+        loans = await db.loans.find({"subscriber_id": ObjectId(subscriber_id)}).sort("loan_date", -1).to_list(None)
+        return jsonify([serialize_loan(loan) for loan in loans]), 200
+    except Exception as e:
+        return jsonify({"message": "Failed to fetch subscriber loans", "error": str(e)}), 400
+
+
+@bp.route('/api/loans/document/<document_id>', methods=['GET'])
+async def get_document_loans(document_id):
+    try:
+        loans = await db.loans.find({"document_id": ObjectId(document_id)}).sort("loan_date", -1).to_list(None)
+        return jsonify([serialize_loan(loan) for loan in loans]), 200
+    except Exception as e:
+        return jsonify({"message": "Failed to fetch document loans", "error": str(e)}), 400
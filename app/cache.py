@@ -0,0 +1,172 @@
+# cache.py
+# Read-through cache for single-record lookups (documents, subscribers,
+# loans): a bounded LRU with TTL in each process, optionally in front of a
+# shared Redis-compatible server
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from bson import json_util
+
+try:
+    import redis
+except ImportError:  # optional, only needed with CACHE_REDIS_URL
+    redis = None
+
+DEFAULT_MAXSIZE = 1024
+DEFAULT_TTL = 60
+
+MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds"""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, key):
+        """Return the cached value or MISSING"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return MISSING
+            if entry[0] <= now:
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def set(self, key, value, generation=None):
+        """Store a value; skipped if anything was invalidated since `generation`"""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), maxsize=self.maxsize, ttl=self.ttl)
+
+
+class RedisCache:
+    """Shared tier: values stored as Extended JSON with a TTL"""
+
+    def __init__(self, url, ttl=DEFAULT_TTL, prefix='mediatheque:'):
+        if redis is None:
+            raise RuntimeError('CACHE_REDIS_URL is set but the redis package is not installed')
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key):
+        try:
+            raw = self.client.get(self.prefix + key)
+        except redis.RedisError:
+            # The database stays the source of truth; an unreachable cache
+            # only costs the lookup
+            self._count('errors')
+            return MISSING
+        if raw is None:
+            self._count('misses')
+            return MISSING
+        self._count('hits')
+        return json_util.loads(raw)
+
+    def set(self, key, value):
+        try:
+            self.client.set(self.prefix + key, json_util.dumps(value), ex=self.ttl)
+        except redis.RedisError:
+            self._count('errors')
+
+    def delete(self, *keys):
+        try:
+            self.client.delete(*[self.prefix + key for key in keys])
+            self._count('invalidations')
+        except redis.RedisError:
+            self._count('errors')
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, ttl=self.ttl)
+
+
+def record_key(collection, record_id):
+    return f'{collection}:{record_id}'
+
+
+class RecordCache:
+    """Read-through cache of records by (collection, _id).
+
+    Callers get a private copy, so they may modify what they receive.
+    Records that do not exist are not cached.
+    """
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+
+    def get_or_load(self, collection, record_id, load):
+        key = record_key(collection, record_id)
+        value = self.local.get(key)
+        if value is not MISSING:
+            return copy.deepcopy(value)
+
+        generation = self.local.generation
+        if self.shared is not None:
+            value = self.shared.get(key)
+        if value is MISSING:
+            value = load()
+            if value is None:
+                return None
+            if self.shared is not None:
+                self.shared.set(key, value)
+        self.local.set(key, value, generation)
+        return copy.deepcopy(value)
+
+    def invalidate(self, collection, *record_ids):
+        keys = [record_key(collection, record_id) for record_id in record_ids]
+        if not keys:
+            return
+        self.local.delete(*keys)
+        if self.shared is not None:
+            self.shared.delete(*keys)
+
+    def stats(self):
+        return {
+            'local': self.local.stats(),
+            'shared': self.shared.stats() if self.shared is not None else None
+        }
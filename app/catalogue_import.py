@@ -0,0 +1,156 @@
+# catalogue_import.py
+# Bulk import of documents from CSV or JSON Lines
+import codecs
+import csv
+import json
+from datetime import date, datetime
+
+from marshmallow import EXCLUDE, ValidationError, fields
+from pymongo.errors import BulkWriteError
+
+from app.conditional import new_record_fields
+from app.schemas import DocumentSchema
+from app.suggest import SUGGEST_FIELD, document_suggest_keys
+
+FORMATS = ('csv', 'jsonl')
+DEFAULT_BATCH_SIZE = 1000
+# Rows listed individually in the report; the counts always cover every row
+MAX_REPORTED_ROWS = 1000
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class DocumentImportSchema(DocumentSchema):
+    """DocumentSchema plus the optional catalogue columns.
+
+    Any other column is dropped, as are the dump-only and server-managed
+    fields of an /api/export file (_id, available, current_loan_id, version,
+    last_updated, suggest_keys): a re-imported export gets fresh ObjectIds
+    and starts out available.
+    """
+    description = fields.Str()
+    language = fields.Str()
+    publisher = fields.Str()
+    pages = fields.Int()
+    location = fields.Str()
+
+
+document_import_schema = DocumentImportSchema(unknown=EXCLUDE)
+
+
+def guess_format(filename):
+    """Pick csv or jsonl from a file name, or None"""
+    if filename:
+        extension = filename.rsplit('.', 1)[-1].lower()
+        if extension == 'csv':
+            return 'csv'
+        if extension in ('jsonl', 'ndjson'):
+            return 'jsonl'
+    return None
+
+
+def iter_rows(stream, fmt):
+    """Yield (row_number, row) from a binary stream, one line at a time.
+
+    Lines that cannot be parsed yield (row_number, ValueError).
+    """
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # Empty cells mean "not set" (an empty isbn would collide on the
+            # unique index)
+            yield reader.line_num, {key: value for key, value in row.items() if key and value not in (None, '')}
+    elif fmt == 'jsonl':
+        for row_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError('Expected a JSON object')
+                yield row_number, row
+            except ValueError as e:
+                yield row_number, ValueError(str(e))
+    else:
+        raise ValueError(f"Unsupported format '{fmt}'")
+
+
+def _prepare(row, now):
+    document = document_import_schema.load(row)
+    # BSON has no date type
+    if isinstance(document.get('publication_date'), date):
+        document['publication_date'] = datetime.combine(document['publication_date'], datetime.min.time())
+    document['available'] = True
+    document[SUGGEST_FIELD] = document_suggest_keys(document)
+    document['added_date'] = now
+    document.update(new_record_fields(now))
+    return document
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.counts = {'invalid': 0, 'duplicate': 0, 'failed': 0}
+        self.rows = {'invalid': [], 'duplicate': [], 'failed': []}
+
+    def reject(self, kind, row_number, **details):
+        self.counts[kind] += 1
+        if len(self.rows[kind]) < MAX_REPORTED_ROWS:
+            self.rows[kind].append(dict(row=row_number, **details))
+
+    def to_dict(self):
+        return {
+            'inserted': self.inserted,
+            'invalid': self.counts['invalid'],
+            'duplicates': self.counts['duplicate'],
+            'failed': self.counts['failed'],
+            'invalid_rows': self.rows['invalid'],
+            'duplicate_rows': self.rows['duplicate'],
+            'failed_rows': self.rows['failed']
+        }
+
+
+def _flush(collection, batch, report):
+    documents = [document for _, document in batch]
+    try:
+        result = collection.insert_many(documents, ordered=False)
+        report.inserted += len(result.inserted_ids)
+    except BulkWriteError as e:
+        # Unordered: every row without a write error was inserted
+        report.inserted += e.details.get('nInserted', 0)
+        for error in e.details.get('writeErrors', []):
+            row_number, document = batch[error['index']]
+            if error.get('code') == DUPLICATE_KEY_ERROR:
+                report.reject('duplicate', row_number, isbn=document.get('isbn'))
+            else:
+                report.reject('failed', row_number, error=error.get('errmsg'))
+
+
+def import_documents(collection, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """Validate rows with DocumentSchema and insert them in unordered batches.
+
+    `rows` yields (row_number, row) as produced by iter_rows(). Invalid rows
+    and duplicate ISBNs are reported per row instead of stopping the import.
+    Returns the report as a dict.
+    """
+    if batch_size < 1:
+        raise ValueError('batch_size must be at least 1')
+    report = ImportReport()
+    batch = []
+    now = datetime.utcnow()
+    for row_number, row in rows:
+        if isinstance(row, Exception):
+            report.reject('invalid', row_number, errors=str(row))
+            continue
+        try:
+            batch.append((row_number, _prepare(row, now)))
+        except ValidationError as e:
+            report.reject('invalid', row_number, errors=e.messages)
+            continue
+        if len(batch) >= batch_size:
+            _flush(collection, batch, report)
+            batch = []
+    if batch:
+        _flush(collection, batch, report)
+    return report.to_dict()
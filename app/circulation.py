@@ -0,0 +1,336 @@
+# circulation.py
+# Lending documents to subscribers and taking them back
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+
+from app.conditional import new_record_fields, touch
+from app.read_model import loan_display_fields
+
+# Largest basket accepted by checkout_batch()
+MAX_BATCH_ITEMS = 100
+# Largest book-drop batch accepted by return_batch()
+MAX_RETURN_ITEMS = 1000
+# Loans still out; 'overdue' is set by the sweep in app/overdue.py
+OPEN_LOAN_STATUSES = ('active', 'overdue')
+
+
+class CirculationError(Exception):
+    def __init__(self, message, status_code):
+        self.message = message
+        self.status_code = status_code
+
+
+def checkout(db, subscriber_id, document_id, loan_date, due_date, session=None):
+    """Lend a document to a subscriber and return the new loan.
+
+    The document is claimed with a single conditional find_one_and_update on
+    {_id, available: True}, so among concurrent checkouts of the same item
+    exactly one succeeds; the others get a CirculationError. The claim stores
+    the id of the loan being created in documents.current_loan_id.
+
+    Without a session, a failure after the claim releases the document again.
+    With a session the caller runs this inside a transaction instead.
+    """
+    loan_id = ObjectId()
+    document = db.documents.find_one_and_update(
+        {'_id': document_id, 'available': True},
+        touch({'$set': {'available': False, 'current_loan_id': loan_id}}),
+        projection={'title': 1},
+        session=session
+    )
+    if document is None:
+        raise CirculationError('Document not available', 400)
+
+    loan = {
+        '_id': loan_id,
+        'subscriber_id': subscriber_id,
+        'document_id': document_id,
+        'loan_date': loan_date,
+        'due_date': due_date,
+        'status': 'active'
+    }
+
+    try:
+        subscriber = db.subscribers.find_one_and_update(
+            {'_id': subscriber_id},
+            touch({'$push': {'current_loans': dict(loan)}}),
+            projection={'first_name': 1, 'last_name': 1},
+            session=session
+        )
+        if subscriber is None:
+            raise CirculationError('Subscriber not found', 404)
+
+        # Copy the display fields used by the loans list onto the loan
+        loan.update(loan_display_fields(subscriber, document))
+        loan.update(new_record_fields())
+        db.loans.insert_one(loan, session=session)
+    except Exception:
+        if session is None:
+            _release(db, subscriber_id, document_id, loan_id)
+        raise
+
+    return loan
+
+
+def _release(db, subscriber_id, document_id, loan_id):
+    """Undo a partial checkout"""
+    db.subscribers.update_one(
+        {'_id': subscriber_id},
+        touch({'$pull': {'current_loans': {'_id': loan_id}}})
+    )
+    db.documents.update_one(
+        {'_id': document_id, 'current_loan_id': loan_id},
+        touch({'$set': {'available': True}, '$unset': {'current_loan_id': ''}})
+    )
+
+
+def checkout_in_transaction(client, db, subscriber_id, document_id, loan_date, due_date):
+    """Run checkout() as one multi-document transaction (needs a replica set)"""
+    with client.start_session() as session:
+        return session.with_transaction(
+            lambda s: checkout(db, subscriber_id, document_id, loan_date, due_date, session=s)
+        )
+
+
+def _parse_ids(raw_ids, kind, results):
+    """Append a result per raw id and return [(result, ObjectId)] for the valid, unique ones"""
+    parsed = []
+    seen = set()
+    for raw_id in raw_ids:
+        result = {kind: raw_id}
+        results.append(result)
+        try:
+            object_id = ObjectId(raw_id)
+        except (InvalidId, TypeError):
+            result['status'] = 'invalid_id'
+            continue
+        if object_id in seen:
+            result['status'] = 'duplicate'
+            continue
+        seen.add(object_id)
+        parsed.append((result, object_id))
+    return parsed
+
+
+def checkout_batch(db, subscriber_id, document_ids, loan_date, due_date):
+    """Lend a basket of documents to one subscriber.
+
+    All documents are claimed with one bulk_write of conditional updates, each
+    tagging its document with the id of the loan it will get. One find then
+    tells which claims won, the subscriber is updated once and the loans are
+    written with insert_many. Returns one result per requested id, in order:
+    {'document_id', 'status': 'checked_out' | 'unavailable' | 'not_found' |
+    'invalid_id' | 'duplicate', 'loan_id'}.
+    """
+    if len(document_ids) > MAX_BATCH_ITEMS:
+        raise CirculationError(f'At most {MAX_BATCH_ITEMS} documents per batch', 400)
+
+    results = []
+    requested = _parse_ids(document_ids, 'document_id', results)
+    claims = {document_id: ObjectId() for _, document_id in requested}
+
+    if not claims:
+        return results
+
+    db.documents.bulk_write([
+        UpdateOne(
+            {'_id': document_id, 'available': True},
+            touch({'$set': {'available': False, 'current_loan_id': loan_id}})
+        )
+        for document_id, loan_id in claims.items()
+    ], ordered=False)
+
+    documents = {
+        document['_id']: document
+        for document in db.documents.find(
+            {'_id': {'$in': list(claims)}},
+            {'title': 1, 'current_loan_id': 1}
+        )
+    }
+
+    loans = []
+    for result, document_id in requested:
+        document = documents.get(document_id)
+        if document is None:
+            result['status'] = 'not_found'
+        elif document.get('current_loan_id') != claims[document_id]:
+            result['status'] = 'unavailable'
+        else:
+            result['status'] = 'checked_out'
+            result['loan_id'] = str(claims[document_id])
+            loans.append({
+                '_id': claims[document_id],
+                'subscriber_id': subscriber_id,
+                'document_id': document_id,
+                'loan_date': loan_date,
+                'due_date': due_date,
+                'status': 'active'
+            })
+
+    if not loans:
+        return results
+
+    try:
+        subscriber = db.subscribers.find_one_and_update(
+            {'_id': subscriber_id},
+            touch({'$push': {'current_loans': {'$each': [dict(loan) for loan in loans]}}}),
+            projection={'first_name': 1, 'last_name': 1}
+        )
+        if subscriber is None:
+            raise CirculationError('Subscriber not found', 404)
+
+        for loan in loans:
+            loan.update(loan_display_fields(subscriber, documents[loan['document_id']]))
+            loan.update(new_record_fields())
+        db.loans.insert_many(loans)
+    except Exception:
+        _release_many(db, subscriber_id, loans)
+        raise
+
+    return results
+
+
+def _release_many(db, subscriber_id, loans):
+    """Undo a partial batch checkout"""
+    loan_ids = [loan['_id'] for loan in loans]
+    db.subscribers.update_one(
+        {'_id': subscriber_id},
+        touch({'$pull': {'current_loans': {'_id': {'$in': loan_ids}}}})
+    )
+    db.loans.delete_many({'_id': {'$in': loan_ids}})
+    db.documents.update_many(
+        {'current_loan_id': {'$in': loan_ids}},
+        touch({'$set': {'available': True}, '$unset': {'current_loan_id': ''}})
+    )
+
+
+def document_return_update(loan):
+    """(filter, update) freeing the document of a loan just returned.
+
+    A document lent again since is left alone; records from before
+    current_loan_id existed have none.
+    """
+    return (
+        {
+            '_id': loan['document_id'],
+            '$or': [{'current_loan_id': loan['_id']}, {'current_loan_id': {'$exists': False}}]
+        },
+        touch({'$set': {'available': True}, '$unset': {'current_loan_id': ''}})
+    )
+
+
+def subscriber_return_update(subscriber_id, loans_returned):
+    """(filter, update) moving returned loans from current_loans to loan_history"""
+    return (
+        {'_id': subscriber_id},
+        touch({
+            '$pull': {'current_loans': {'_id': {'$in': [loan['_id'] for loan in loans_returned]}}},
+            '$push': {'loan_history': {'$each': loans_returned}}
+        })
+    )
+
+
+def return_batch(db, loan_ids=(), document_ids=(), return_date=None):
+    """Check in many loans at once (book-drop processing).
+
+    Loans can be given by loan id or by document id (its open loan, active
+    or overdue). They
+    are resolved with one query, then the loans, documents and subscribers are
+    each updated with a single bulk write; the documents and subscribers only
+    for the loans whose status this call changed. Returns one result per requested
+    id, loan ids first: {'loan_id' | 'document_id', 'status': 'returned' |
+    'not_active' | 'not_found' | 'not_on_loan' | 'invalid_id' | 'duplicate'}.
+    """
+    if len(loan_ids) + len(document_ids) > MAX_RETURN_ITEMS:
+        raise CirculationError(f'At most {MAX_RETURN_ITEMS} items per batch', 400)
+
+    return_date = return_date or datetime.utcnow()
+    results = []
+    by_loan = _parse_ids(loan_ids, 'loan_id', results)
+    by_document = _parse_ids(document_ids, 'document_id', results)
+
+    clauses = []
+    if by_loan:
+        clauses.append({'_id': {'$in': [loan_id for _, loan_id in by_loan]}})
+    if by_document:
+        clauses.append({
+            'document_id': {'$in': [document_id for _, document_id in by_document]},
+            'status': {'$in': OPEN_LOAN_STATUSES}
+        })
+    if not clauses:
+        return results
+
+    loans = {}
+    open_by_document = {}
+    for loan in db.loans.find({'$or': clauses}):
+        loans[loan['_id']] = loan
+        if loan.get('status') in OPEN_LOAN_STATUSES:
+            open_by_document[loan['document_id']] = loan
+
+    returning = {}
+    for result, loan_id in by_loan:
+        loan = loans.get(loan_id)
+        if loan is None:
+            result['status'] = 'not_found'
+        elif loan.get('status') not in OPEN_LOAN_STATUSES:
+            result['status'] = 'not_active'
+        else:
+            result['status'] = 'returned'
+            returning[loan_id] = (result, loan)
+    for result, document_id in by_document:
+        loan = open_by_document.get(document_id)
+        if loan is None:
+            result['status'] = 'not_on_loan'
+        elif loan['_id'] in returning:
+            # Already listed by its loan id
+            result['status'] = 'duplicate'
+        else:
+            result['status'] = 'returned'
+            result['loan_id'] = str(loan['_id'])
+            returning[loan['_id']] = (result, loan)
+
+    if not returning:
+        return results
+
+    db.loans.bulk_write([
+        UpdateOne(
+            {'_id': loan_id, 'status': {'$in': OPEN_LOAN_STATUSES}},
+            touch({'$set': {'status': 'returned', 'return_date': return_date}})
+        )
+        for loan_id in returning
+    ], ordered=False)
+
+    # Only the loans this call flipped: a concurrent return of the same loan
+    # may have won, and its document may already be lent again
+    flipped = {
+        loan['_id']
+        for loan in db.loans.find(
+            {'_id': {'$in': list(returning)}, 'status': 'returned', 'return_date': return_date},
+            {'_id': 1}
+        )
+    }
+    returned = []
+    for loan_id, (result, loan) in returning.items():
+        if loan_id in flipped:
+            returned.append(loan)
+        else:
+            result['status'] = 'not_active'
+    if not returned:
+        return results
+
+    db.documents.bulk_write([UpdateOne(*document_return_update(loan)) for loan in returned], ordered=False)
+
+    per_subscriber = {}
+    for loan in returned:
+        per_subscriber.setdefault(loan['subscriber_id'], []).append(
+            dict(loan, status='returned', return_date=return_date)
+        )
+    db.subscribers.bulk_write([
+        UpdateOne(*subscriber_return_update(subscriber_id, loans_returned))
+        for subscriber_id, loans_returned in per_subscriber.items()
+    ], ordered=False)
+
+    return results
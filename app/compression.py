@@ -0,0 +1,115 @@
+# compression.py
+# gzip / brotli compression of API responses above a size threshold
+import gzip
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+DEFAULT_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+# Favour speed: the payloads are generated per request
+BROTLI_QUALITY = 4
+
+COMPRESSIBLE_MIMETYPES = (
+    'application/json', 'application/x-ndjson', 'application/javascript',
+    'text/html', 'text/plain', 'text/css'
+)
+
+
+def choose_encoding(accept_encodings):
+    """'br', 'gzip' or None from the request's Accept-Encoding"""
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return accept_encodings.best_match(offered)
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressedBody:
+    """Compress a streamed body chunk by chunk, closing it as the server
+    closes us.
+
+    Each chunk is flushed as it is compressed so that the client can read
+    the rows it has received (NDJSON) before the stream ends.
+    """
+
+    def __init__(self, body, encoding, charset='utf-8'):
+        self.body = body
+        self.encoding = encoding
+        self.charset = charset
+
+    def __iter__(self):
+        if self.encoding == 'br':
+            compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            process, flush, finish = compressor.process, compressor.flush, compressor.finish
+        else:
+            compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            process, finish = compressor.compress, compressor.flush
+            flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+        for chunk in self.body:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(self.charset)
+            data = process(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+
+    def close(self):
+        if hasattr(self.body, 'close'):
+            self.body.close()
+
+
+def compress_response(response, min_size=DEFAULT_MIN_SIZE):
+    """Compress a response in place when the client accepts it.
+
+    Buffered responses below `min_size` are sent as is; streamed ones (the
+    full lists) are always compressed, chunk by chunk, since their size is
+    not known up front.
+    """
+    if (
+        response.direct_passthrough
+        or not 200 <= response.status_code < 300
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    if response.is_streamed:
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+        response.response = CompressedBody(response.response, encoding, response.charset)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # The compressed bytes differ from the identity ones, so a strong ETag
+    # no longer applies
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def register_compression(app):
+    @app.after_request
+    def compress_after_request(response):
+        return compress_response(response, app.config.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE))
@@ -0,0 +1,115 @@
+# conditional.py
+# Conditional GETs: record versions and collection change counters turned
+# into ETag / Last-Modified, and 304 responses when they still match
+import hashlib
+from datetime import datetime, timezone
+
+from bson import json_util
+from flask import Response, request
+from pymongo import UpdateOne
+
+VERSION_FIELD = 'version'
+LAST_UPDATED_FIELD = 'last_updated'
+COUNTERS_COLLECTION = 'change_counters'
+
+
+def touch(update):
+    """Add the record version bump to an update document.
+
+    Every write to a document, subscriber or loan goes through this, so the
+    version is enough to tell whether a record changed.
+    """
+    update = dict(update)
+    update['$inc'] = dict(update.get('$inc', {}), **{VERSION_FIELD: 1})
+    update['$currentDate'] = dict(update.get('$currentDate', {}), **{LAST_UPDATED_FIELD: True})
+    return update
+
+
+def new_record_fields(now=None):
+    """Version fields for a record being inserted"""
+    return {VERSION_FIELD: 1, LAST_UPDATED_FIELD: now or datetime.utcnow()}
+
+
+def change_counter_updates(*collections):
+    """The bulk write that counts a change to each of `collections`"""
+    return [
+        UpdateOne(
+            {'_id': collection},
+            {'$inc': {'version': 1}, '$currentDate': {'last_modified': True}},
+            upsert=True
+        )
+        for collection in collections
+    ]
+
+
+def bump_change_counters(db, *collections):
+    """Count a change to each collection; list ETags derive from these counters"""
+    if not collections:
+        return
+    db[COUNTERS_COLLECTION].bulk_write(change_counter_updates(*collections), ordered=False)
+
+
+def list_validators(db, *collections):
+    """(etag, last_modified) of a list built from `collections`.
+
+    The ETag also covers the path and query string, since filters, sort and
+    page give different lists. Costs one indexed lookup, no scan.
+    """
+    counters = {row['_id']: row for row in db[COUNTERS_COLLECTION].find({'_id': {'$in': list(collections)}})}
+    state = [(collection, counters.get(collection, {}).get('version', 0)) for collection in collections]
+    digest = hashlib.sha1(f'{request.full_path}|{state}'.encode('utf-8')).hexdigest()
+    modified = [row['last_modified'] for row in counters.values() if row.get('last_modified')]
+    return digest, max(modified) if modified else None
+
+
+def record_validators(record):
+    """(etag, last_modified) of a single record.
+
+    Records written before versions existed get a hash of their content.
+    """
+    if VERSION_FIELD in record:
+        etag = f"{record['_id']}-{record[VERSION_FIELD]}"
+    else:
+        etag = hashlib.sha1(json_util.dumps(record, sort_keys=True).encode('utf-8')).hexdigest()
+    return etag, record.get(LAST_UPDATED_FIELD)
+
+
+def _utc(value):
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def not_modified(etag, last_modified):
+    """Whether the client's If-None-Match / If-Modified-Since still hold"""
+    if request.if_none_match:
+        # If-None-Match wins over If-Modified-Since (RFC 7232, 6)
+        # Weak comparison: compressed responses carry W/ tags
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return _utc(last_modified).replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def conditional(etag, last_modified, build):
+    """Return 304 when the validators match, else build() with them attached.
+
+    `build` returns a response (or a (response, status) tuple) and is only
+    called when the client's copy is stale, so a 304 costs no
+    serialization.
+    """
+    if not_modified(etag, last_modified):
+        response = Response(status=304)
+    else:
+        response = build()
+        if isinstance(response, tuple):
+            response, status = response
+            response.status_code = status
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = _utc(last_modified)
+    # Let browsers keep the body but revalidate it on every use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,80 @@
+# config.py
+# Default configuration, read from the environment. create_app(config)
+# applies its `config` mapping on top of these.
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_bool(name, default='false'):
+    return os.environ.get(name, default).lower() == 'true'
+
+
+class Config:
+    MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://mongo-db:27017/mediatheque')
+    # One MongoClient per process, shared by every request thread. Requests
+    # beyond MONGO_MAX_POOL_SIZE concurrent operations wait up to
+    # MONGO_WAIT_QUEUE_TIMEOUT_MS for a connection.
+    MONGO_MAX_POOL_SIZE = _env_int('MONGO_MAX_POOL_SIZE', '50')
+    MONGO_MIN_POOL_SIZE = _env_int('MONGO_MIN_POOL_SIZE', '0')
+    MONGO_MAX_IDLE_TIME_MS = _env_int('MONGO_MAX_IDLE_TIME_MS', '300000')
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = _env_int('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000')
+    MONGO_CONNECT_TIMEOUT_MS = _env_int('MONGO_CONNECT_TIMEOUT_MS', '5000')
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = _env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')
+    # 0: no socket timeout (the exports keep cursors open for long)
+    MONGO_SOCKET_TIMEOUT_MS = _env_int('MONGO_SOCKET_TIMEOUT_MS', '0')
+    # Wire compression, e.g. "zstd,snappy,zlib" (zstd and snappy need the
+    # zstandard / python-snappy packages); empty to disable. Worth it when
+    # the database is not on the same host.
+    MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', '')
+    # Create the indexes of app/indexes.py when the app is created. Off by
+    # default so workers boot without touching the database; run
+    # `flask --app app init-db` once per deployment instead.
+    MONGO_ENSURE_INDEXES = _env_bool('MONGO_ENSURE_INDEXES')
+
+    # 'join' builds the loans list with $lookup, 'denormalized' reads the
+    # subscriber_name/document_title copied onto each loan (see
+    # scripts/backfill_loan_read_model.py for loans created before the switch)
+    LOANS_READ_MODEL = os.environ.get('LOANS_READ_MODEL', 'join')
+    # Responses (JSON, HTML) larger than this are gzip/brotli compressed
+    COMPRESS_MIN_SIZE = _env_int('COMPRESS_MIN_SIZE', '1024')
+    # Run each checkout as a multi-document transaction (requires a replica set)
+    LOANS_USE_TRANSACTIONS = _env_bool('LOANS_USE_TRANSACTIONS')
+    # Seconds between two overdue sweeps in this process; 0 leaves it to
+    # scripts/mark_overdue.py (e.g. from cron)
+    OVERDUE_SCAN_INTERVAL = _env_int('OVERDUE_SCAN_INTERVAL', '0')
+    # Read-through cache of single records (GET /api/<collection>/<id>). With
+    # CACHE_REDIS_URL the per-process LRU sits in front of a shared Redis and
+    # keeps its entries for CACHE_LOCAL_TTL seconds only, which bounds how
+    # long another worker can serve a record changed elsewhere.
+    CACHE_MAXSIZE = _env_int('CACHE_MAXSIZE', '1024')
+    CACHE_TTL = _env_int('CACHE_TTL', '60')
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', '')
+    CACHE_LOCAL_TTL = _env_int('CACHE_LOCAL_TTL', '5' if CACHE_REDIS_URL else CACHE_TTL)
+    # Prometheus metrics at /metrics (app/metrics.py)
+    METRICS_ENABLED = _env_bool('METRICS_ENABLED', 'true')
+    # Keep the last SLOW_QUERY_LOG_SIZE MongoDB commands slower than
+    # SLOW_QUERY_MS (0: every command) for GET /api/admin/slow-queries; a
+    # size of 0 turns the log off. With SLOW_QUERY_EXPLAIN, the first command
+    # of each query shape is explained in the background.
+    SLOW_QUERY_MS = _env_int('SLOW_QUERY_MS', '100')
+    SLOW_QUERY_LOG_SIZE = _env_int('SLOW_QUERY_LOG_SIZE', '200')
+    SLOW_QUERY_EXPLAIN = _env_bool('SLOW_QUERY_EXPLAIN')
+
+
+def mongo_client_options(config):
+    """MongoClient keyword arguments from the MONGO_* settings"""
+    options = {
+        'maxPoolSize': config['MONGO_MAX_POOL_SIZE'],
+        'minPoolSize': config['MONGO_MIN_POOL_SIZE'],
+        'maxIdleTimeMS': config['MONGO_MAX_IDLE_TIME_MS'] or None,
+        'waitQueueTimeoutMS': config['MONGO_WAIT_QUEUE_TIMEOUT_MS'] or None,
+        'connectTimeoutMS': config['MONGO_CONNECT_TIMEOUT_MS'],
+        'serverSelectionTimeoutMS': config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        'socketTimeoutMS': config['MONGO_SOCKET_TIMEOUT_MS'] or None,
+    }
+    if config['MONGO_COMPRESSORS']:
+        options['compressors'] = config['MONGO_COMPRESSORS']
+    return options
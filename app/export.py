@@ -0,0 +1,49 @@
+# export.py
+# Full-collection NDJSON exports for reporting
+from app.filters import document_filter, loan_filter
+from app.suggest import SUGGEST_FIELD
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 10000
+
+# collection -> (query parameter filter, fields never exported). The
+# typeahead keys and the bookkeeping of a document (version, last_updated,
+# current_loan_id) are not catalogue data.
+EXPORTS = {
+    'documents': (document_filter, (SUGGEST_FIELD, 'version', 'last_updated', 'current_loan_id')),
+    'subscribers': (lambda args: {}, ('password', SUGGEST_FIELD)),
+    'loans': (loan_filter, ())
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def export_projection(collection, fields=None):
+    """Projection for an export: the requested fields, minus the private ones"""
+    _, hidden = EXPORTS[collection]
+    if fields:
+        wanted = [field.strip() for field in fields.split(',') if field.strip()]
+        projection = {field: 1 for field in wanted if field not in hidden}
+        if not projection:
+            raise ExportError('No exportable field requested')
+        return projection
+    return {field: 0 for field in hidden} or None
+
+
+def export_cursor(db, collection, args, fields=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Server-side cursor over the filtered collection, fetched batch_size rows at a time.
+
+    `args` holds the same filter parameters as the collection's list endpoint
+    (type/available for documents, status/subscriber_id/... for loans).
+    """
+    if collection not in EXPORTS:
+        raise ExportError(f"Unknown collection '{collection}'")
+    build_filter, _ = EXPORTS[collection]
+    batch_size = max(1, min(int(batch_size), MAX_BATCH_SIZE))
+    return db[collection].find(
+        build_filter(args),
+        export_projection(collection, fields),
+        batch_size=batch_size
+    ).sort('_id', 1)
@@ -0,0 +1,64 @@
+# facets.py
+# Per-field counts for the catalogue dashboards, computed in one $facet
+from bson import json_util
+
+from app.cache import MISSING, LRUCache
+
+FACET_FIELDS = ('type', 'genre', 'language', 'available')
+FACET_CACHE_TTL = 60
+# Distinct filters kept per process, least recently used dropped first
+FACET_CACHE_MAXSIZE = 256
+
+
+def facet_pipeline(filter_query):
+    # Same stages as $sortByCount, with _id as tie-breaker for a stable order
+    facets = {
+        field: [
+            {'$group': {'_id': f'${field}', 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1, '_id': 1}}
+        ]
+        for field in FACET_FIELDS
+    }
+    facets['total'] = [{'$count': 'count'}]
+    return [{'$match': filter_query}, {'$facet': facets}]
+
+
+def compute_facets(collection, filter_query):
+    """Counts per value of each facet field for the documents matching the filter"""
+    result = next(collection.aggregate(facet_pipeline(filter_query)), {})
+    facets = {
+        field: [{'value': row['_id'], 'count': row['count']} for row in result.get(field, [])]
+        for field in FACET_FIELDS
+    }
+    total = result.get('total')
+    facets['total'] = total[0]['count'] if total else 0
+    return facets
+
+
+class FacetCache:
+    """Facet results per filter, dropped on any catalogue write.
+
+    The cache lives in the worker process; the TTL bounds how long another
+    worker's writes can go unnoticed.
+    """
+
+    def __init__(self, ttl=FACET_CACHE_TTL, maxsize=FACET_CACHE_MAXSIZE):
+        self._entries = LRUCache(maxsize, ttl)
+
+    def get(self, collection, filter_query):
+        """Return (facets, cached)"""
+        key = json_util.dumps(filter_query, sort_keys=True)
+        facets = self._entries.get(key)
+        if facets is not MISSING:
+            return facets, True
+        generation = self._entries.generation
+        facets = compute_facets(collection, filter_query)
+        # Not kept if a concurrent write already outdated it
+        self._entries.set(key, facets, generation)
+        return facets, False
+
+    def invalidate(self):
+        self._entries.clear()
+
+
+facet_cache = FacetCache()
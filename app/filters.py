@@ -0,0 +1,40 @@
+# filters.py
+# Translate list endpoint query parameters into MongoDB filters
+from datetime import datetime
+
+from bson import ObjectId
+
+
+def document_filter(args):
+    """Filter on ?type= and ?available= (same params as routes/documents.py)"""
+    filter_query = {}
+    if args.get('type'):
+        filter_query['type'] = args.get('type')
+    if args.get('available') is not None:
+        filter_query['available'] = args.get('available').lower() == 'true'
+    return filter_query
+
+
+def parse_day(value):
+    """Parse a YYYY-MM-DD query parameter (raises ValueError)"""
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def loan_filter(args):
+    """Filter on ?status=, ?subscriber_id=, ?document_id=, ?due_before= and ?due_after="""
+    filter_query = {}
+    if args.get('status'):
+        filter_query['status'] = args.get('status')
+    if args.get('subscriber_id'):
+        filter_query['subscriber_id'] = ObjectId(args.get('subscriber_id'))
+    if args.get('document_id'):
+        filter_query['document_id'] = ObjectId(args.get('document_id'))
+
+    due_date = {}
+    if args.get('due_before'):
+        due_date['$lt'] = parse_day(args.get('due_before'))
+    if args.get('due_after'):
+        due_date['$gte'] = parse_day(args.get('due_after'))
+    if due_date:
+        filter_query['due_date'] = due_date
+    return filter_query
@@ -0,0 +1,127 @@
+# index_advisor.py
+# Explain the query shape behind each route and flag plans that scan the
+# whole collection (COLLSCAN) or sort in memory (SORT)
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+from app.circulation import OPEN_LOAN_STATUSES
+from app.facets import facet_pipeline
+from app.filters import document_filter, loan_filter
+from app.overdue import DEFAULT_BATCH_SIZE as DEFAULT_OVERDUE_BATCH_SIZE
+from app.pagination import keyset_filter, merge_filters, sort_spec
+from app.read_model import loan_list_pipeline
+from app.suggest import prefix_filter
+
+# Plan stages reported by the advisor
+FLAGGED_STAGES = ('COLLSCAN', 'SORT')
+
+# Placeholder values: only the shape of a query matters to the planner
+_ID = ObjectId()
+
+
+def query_shapes():
+    """(route, collection, command) for every hot query of the API"""
+    newest = sort_spec('_id', DESCENDING)
+    return [
+        ('GET /api/subscribers/', 'subscribers', {'filter': {}, 'sort': newest}),
+        ('GET /api/subscribers/?sort=last_name', 'subscribers',
+         {'filter': {}, 'sort': sort_spec('last_name', DESCENDING)}),
+        ('GET /api/documents/', 'documents', {'filter': {}, 'sort': newest}),
+        ('GET /api/documents/?sort=title', 'documents',
+         {'filter': {}, 'sort': sort_spec('title', DESCENDING)}),
+        ('GET /api/documents/?type=', 'documents',
+         {'filter': document_filter({'type': 'book'}), 'sort': newest}),
+        ('GET /api/documents/?available=', 'documents',
+         {'filter': document_filter({'available': 'true'}), 'sort': newest}),
+        ('GET /api/documents/search', 'documents',
+         {'filter': {'$text': {'$search': 'ocean'}}}),
+        ('GET /api/documents/facets?type=', 'documents',
+         {'pipeline': facet_pipeline(document_filter({'type': 'book'}))}),
+        ('GET /api/suggest/documents', 'documents',
+         {'filter': prefix_filter('mis'), 'limit': 10}),
+        ('GET /api/suggest/subscribers', 'subscribers',
+         {'filter': prefix_filter('dup'), 'limit': 10}),
+        ('DELETE /api/documents/<id>', 'loans',
+         {'filter': {'document_id': _ID, 'status': {'$in': OPEN_LOAN_STATUSES}}}),
+        ('GET /api/loans/', 'loans', {'filter': {}, 'sort': newest}),
+        ('GET /api/loans/?sort=loan_date', 'loans',
+         {'filter': {}, 'sort': sort_spec('loan_date', DESCENDING)}),
+        ('GET /api/loans/?sort=due_date', 'loans',
+         {'filter': {}, 'sort': sort_spec('due_date', DESCENDING)}),
+        ('GET /api/loans/?subscriber_id=', 'loans',
+         {'filter': loan_filter({'subscriber_id': str(_ID)}), 'sort': sort_spec('loan_date', DESCENDING)}),
+        ('GET /api/loans/?document_id=', 'loans',
+         {'filter': loan_filter({'document_id': str(_ID)}), 'sort': sort_spec('loan_date', DESCENDING)}),
+        # What the web interface's loans tab sends: ?cursor=&status=, newest
+        # first, first page and next pages
+        ('GET /api/loans/?cursor=&status=', 'loans',
+         {'pipeline': loan_list_pipeline(loan_filter({'status': 'overdue'}), newest, 101)}),
+        ('GET /api/loans/?cursor=<next>&status=', 'loans',
+         {'pipeline': loan_list_pipeline(
+             merge_filters(loan_filter({'status': 'active'}), keyset_filter('_id', DESCENDING, (_ID, _ID))),
+             newest, 101
+         )}),
+        ('GET /api/loans/?status=&due_before=', 'loans',
+         {'filter': loan_filter({'status': 'active', 'due_before': '2024-01-01'}),
+          'sort': sort_spec('due_date', DESCENDING)}),
+        ('GET /api/loans/?status=overdue&sort=due_date', 'loans',
+         {'filter': loan_filter({'status': 'overdue'}), 'sort': sort_spec('due_date', DESCENDING)}),
+        ('overdue sweep', 'loans',
+         {'filter': {'status': 'active', 'due_date': {'$lt': datetime(2024, 1, 1)}},
+          'sort': [('due_date', ASCENDING), ('_id', ASCENDING)], 'limit': DEFAULT_OVERDUE_BATCH_SIZE}),
+        ('GET /api/loans/subscriber/<id>', 'loans',
+         {'filter': {'subscriber_id': _ID}, 'sort': [('loan_date', DESCENDING)]}),
+        ('GET /api/loans/document/<id>', 'loans',
+         {'filter': {'document_id': _ID}, 'sort': [('loan_date', DESCENDING)]}),
+        ('POST /api/loans/return', 'loans',
+         {'filter': {'document_id': {'$in': [_ID]}, 'status': {'$in': OPEN_LOAN_STATUSES}}}),
+    ]
+
+
+def _explain(db, collection, command):
+    if 'pipeline' in command:
+        explained = {'aggregate': collection, 'pipeline': command['pipeline'], 'cursor': {}}
+    else:
+        explained = {'find': collection, 'filter': command['filter']}
+        if 'sort' in command:
+            explained['sort'] = dict(command['sort'])
+        if 'limit' in command:
+            explained['limit'] = command['limit']
+    return db.command('explain', explained, verbosity='queryPlanner')
+
+
+def winning_stages(explain):
+    """Every stage name of the winning plan(s) in an explain() result.
+
+    Walks the whole document except rejected plans, so that it works for
+    find and aggregate explains across server versions.
+    """
+    stages = []
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == 'rejectedPlans':
+                continue
+            if key == 'stage' and isinstance(value, str):
+                stages.append(value)
+            else:
+                stages.extend(winning_stages(value))
+    elif isinstance(explain, list):
+        for value in explain:
+            stages.extend(winning_stages(value))
+    return stages
+
+
+def advise(db):
+    """Explain every query shape; returns [{'route', 'collection', 'stages', 'flags'}]"""
+    report = []
+    for route, collection, command in query_shapes():
+        stages = winning_stages(_explain(db, collection, command))
+        report.append({
+            'route': route,
+            'collection': collection,
+            'stages': stages,
+            'flags': sorted({stage for stage in stages if stage in FLAGGED_STAGES})
+        })
+    return report
@@ -0,0 +1,64 @@
+# indexes.py
+# Every index the application relies on, created idempotently by init_db()
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+
+INDEXES = {
+    'subscribers': [
+        IndexModel([('email', ASCENDING)], unique=True),
+        # Keyset pagination of the subscribers list sorts on (key, _id)
+        IndexModel([('last_name', ASCENDING), ('_id', ASCENDING)]),
+        # Prefix keys for search-as-you-type (see app/suggest.py)
+        IndexModel([('suggest_keys', ASCENDING)]),
+    ],
+    'documents': [
+        IndexModel([('isbn', ASCENDING)], unique=True, sparse=True),
+        IndexModel([('title', ASCENDING), ('_id', ASCENDING)]),
+        IndexModel([('author', ASCENDING), ('_id', ASCENDING)]),
+        # ?type= and ?available= filters of the documents list and facets,
+        # newest first
+        IndexModel([('type', ASCENDING), ('_id', ASCENDING)]),
+        IndexModel([('available', ASCENDING), ('_id', ASCENDING)]),
+        IndexModel([('suggest_keys', ASCENDING)]),
+        # Weighted full-text index behind GET /api/documents/search. Catalogue
+        # records carry their own `language` ("French", ...), which must not be
+        # read as the text index language, hence the unused override field.
+        IndexModel(
+            [('title', TEXT), ('author', TEXT), ('genre', TEXT), ('description', TEXT)],
+            weights={'title': 10, 'author': 5, 'genre': 3, 'description': 1},
+            default_language='none',
+            language_override='text_language',
+            name='catalogue_text'
+        ),
+    ],
+    'loans': [
+        IndexModel([('subscriber_id', ASCENDING), ('document_id', ASCENDING)]),
+        # A subscriber's / a document's loans, most recent first, with the
+        # _id tie-breaker of keyset pagination. The document_id prefix also
+        # serves the active-loan lookups of delete_document and batch returns.
+        IndexModel([('subscriber_id', ASCENDING), ('loan_date', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('document_id', ASCENDING), ('loan_date', DESCENDING), ('_id', DESCENDING)]),
+        # ?status= and due date filters of the loans list, and the overdue
+        # sweep (app/overdue.py)
+        IndexModel([('status', ASCENDING), ('due_date', ASCENDING), ('_id', ASCENDING)]),
+        # ?status= of the loans list in its default newest-first order, as the
+        # web interface's loans tab pages it
+        IndexModel([('status', ASCENDING), ('_id', ASCENDING)]),
+        # ?sort=loan_date and ?sort=due_date of the unfiltered loans list
+        IndexModel([('loan_date', ASCENDING), ('_id', ASCENDING)]),
+        IndexModel([('due_date', ASCENDING), ('_id', ASCENDING)]),
+    ],
+    'job_runs': [
+        IndexModel([('job', ASCENDING), ('started_at', DESCENDING)]),
+    ],
+}
+
+
+def ensure_indexes(db):
+    """Create the registered indexes; existing ones are left untouched.
+
+    Returns {collection: [index names]}.
+    """
+    return {
+        collection: db[collection].create_indexes(models)
+        for collection, models in INDEXES.items()
+    }
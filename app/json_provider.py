@@ -0,0 +1,41 @@
+# json_provider.py
+# Flask JSON provider backed by orjson, encoding BSON types natively
+import orjson
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from flask.json.provider import JSONProvider
+
+# datetime and date are handled by orjson itself (RFC 3339); MongoDB
+# returns naive datetimes in UTC
+DUMP_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        # As a string, a float would lose precision
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps_bytes(obj):
+    """Serialize in a single pass, documents straight from PyMongo included"""
+    return orjson.dumps(obj, default=_default, option=DUMP_OPTIONS)
+
+
+class OrjsonProvider(JSONProvider):
+    """Used by jsonify(), request.json and flask.json.dumps"""
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        # Skip the bytes -> str -> bytes round trip of dumps()
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
@@ -0,0 +1,217 @@
+# metrics.py
+# Prometheus metrics: per-route request latency, size and concurrency, and
+# per-collection MongoDB command timings and pool waits collected through
+# pymongo's monitoring listeners. Served at /metrics.
+#
+# With several worker processes (gunicorn), set PROMETHEUS_MULTIPROC_DIR to
+# an empty directory before the app is imported (gunicorn.conf.py does):
+# each process writes its samples there and /metrics adds them up.
+import os
+import threading
+import time
+
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from pymongo import monitoring
+
+METRICS_PATH = '/metrics'
+# Label of requests that matched no route (404s), to bound the cardinality
+UNMATCHED_ROUTE = 'unmatched'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time to serve a request, streamed body included',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes', 'Response body size as sent (after compression)',
+    ['method', 'route'], buckets=SIZE_BUCKETS
+)
+IN_PROGRESS = Gauge(
+    'http_requests_in_progress', 'Requests being served', ['method'], multiprocess_mode='livesum'
+)
+
+MONGO_COMMANDS = Counter(
+    'mongodb_commands_total', 'MongoDB commands sent', ['collection', 'command', 'outcome']
+)
+MONGO_LATENCY = Histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command round trip', ['collection', 'command'],
+    buckets=MONGO_BUCKETS
+)
+POOL_WAIT = Histogram(
+    'mongodb_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection', buckets=MONGO_BUCKETS
+)
+POOL_CHECKOUT_FAILURES = Counter(
+    'mongodb_pool_checkout_failures_total', 'Connection checkouts that failed', ['reason']
+)
+POOL_CONNECTIONS = Gauge(
+    'mongodb_pool_connections', 'Open pooled connections', multiprocess_mode='livesum'
+)
+POOL_CHECKED_OUT = Gauge(
+    'mongodb_pool_checked_out_connections', 'Connections in use', multiprocess_mode='livesum'
+)
+
+
+def command_collection(command_name, command):
+    """Collection a command applies to, '' for database-level commands"""
+    if command_name == 'getMore':
+        return command.get('collection', '')
+    target = command.get(command_name)
+    return target if isinstance(target, str) else ''
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Count and time MongoDB commands per collection and command name.
+
+    The succeeded/failed events do not carry the command, so the collection
+    is remembered from the started event until then.
+    """
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        self._collections[(event.connection_id, event.request_id)] = command_collection(
+            event.command_name, event.command
+        )
+
+    def _finished(self, event, outcome):
+        collection = self._collections.pop((event.connection_id, event.request_id), '')
+        MONGO_COMMANDS.labels(collection, event.command_name, outcome).inc()
+        MONGO_LATENCY.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+    def succeeded(self, event):
+        self._finished(event, 'success')
+
+    def failed(self, event):
+        self._finished(event, 'failure')
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool usage. A checkout starts and ends on the thread that
+    asked for the connection, so the wait is timed with a thread local."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, 'started', None)
+        if started is not None:
+            POOL_WAIT.observe(time.perf_counter() - started)
+            self._local.started = None
+        POOL_CHECKED_OUT.inc()
+
+    def connection_check_out_failed(self, event):
+        self._local.started = None
+        POOL_CHECKOUT_FAILURES.labels(event.reason).inc()
+
+    def connection_checked_in(self, event):
+        POOL_CHECKED_OUT.dec()
+
+    def connection_created(self, event):
+        POOL_CONNECTIONS.inc()
+
+    def connection_closed(self, event):
+        POOL_CONNECTIONS.dec()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+def mongo_listeners():
+    """Listeners to pass to MongoClient(event_listeners=...)"""
+    return [CommandMetrics(), PoolMetrics()]
+
+
+class CountingBody:
+    """Wrap a streamed body to add up the bytes sent, closing it as the
+    server closes us"""
+
+    def __init__(self, body):
+        self.body = body
+        self.size = 0
+
+    def __iter__(self):
+        for chunk in self.body:
+            self.size += len(chunk)
+            yield chunk
+
+    def close(self):
+        if hasattr(self.body, 'close'):
+            self.body.close()
+
+
+def metrics_view():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def register_metrics(app):
+    """Time every request and serve METRICS_PATH.
+
+    Register before the other after_request hooks (compression) so that the
+    size observed is the size sent.
+    """
+
+    @app.before_request
+    def start_request_metrics():
+        if request.path == METRICS_PATH:
+            return
+        g.metrics_started = time.perf_counter()
+        g.metrics_method = request.method
+        IN_PROGRESS.labels(request.method).inc()
+
+    @app.after_request
+    def observe_request_metrics(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        method = g.pop('metrics_method')
+        route = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+        status = str(response.status_code)
+
+        def observe(size):
+            REQUEST_LATENCY.labels(method, route, status).observe(time.perf_counter() - started)
+            RESPONSE_SIZE.labels(method, route).observe(size)
+            IN_PROGRESS.labels(method).dec()
+
+        # Observed once the server is done with the body: streamed responses
+        # (lists, exports) spend most of their time there
+        if response.is_streamed:
+            body = response.response = CountingBody(response.response)
+            response.call_on_close(lambda: observe(body.size))
+        else:
+            response.call_on_close(lambda: observe(response.content_length or 0))
+        return response
+
+    @app.teardown_request
+    def abandon_request_metrics(exc):
+        # No response made it to after_request
+        if g.pop('metrics_started', None) is not None:
+            IN_PROGRESS.labels(g.pop('metrics_method')).dec()
+
+    app.add_url_rule(METRICS_PATH, 'metrics', metrics_view)
@@ -0,0 +1,88 @@
+# overdue.py
+# Periodic sweep marking active loans past their due date as overdue
+import logging
+import threading
+import time
+from datetime import datetime
+
+from pymongo import ASCENDING
+
+from app.conditional import bump_change_counters, touch
+
+JOB_NAME = 'mark_overdue'
+DEFAULT_BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def mark_overdue(db, now=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Set status 'overdue' on active loans with due_date < now.
+
+    Works in batches of at most `batch_size` loans: the ids come from a
+    covered scan of the (status, due_date, _id) index and are updated with
+    one update_many, as is the copy embedded in each subscriber's
+    current_loans. The run is recorded in the job_runs collection.
+    Returns that record.
+    """
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+    run = {'job': JOB_NAME, 'started_at': datetime.utcnow(), 'due_before': now, 'loans_marked': 0, 'batches': 0}
+
+    while True:
+        batch = list(
+            db.loans.find(
+                {'status': 'active', 'due_date': {'$lt': now}},
+                {'_id': 1, 'subscriber_id': 1}
+            )
+            .sort([('due_date', ASCENDING), ('_id', ASCENDING)])
+            .limit(batch_size)
+        )
+        if not batch:
+            break
+
+        loan_ids = [loan['_id'] for loan in batch]
+        # Re-check the status: a loan returned since the scan stays returned
+        result = db.loans.update_many(
+            {'_id': {'$in': loan_ids}, 'status': 'active'},
+            touch({'$set': {'status': 'overdue'}})
+        )
+        db.subscribers.update_many(
+            {'_id': {'$in': list({loan['subscriber_id'] for loan in batch})}},
+            touch({'$set': {'current_loans.$[loan].status': 'overdue'}}),
+            array_filters=[{'loan._id': {'$in': loan_ids}, 'loan.status': 'active'}]
+        )
+        run['loans_marked'] += result.modified_count
+        run['batches'] += 1
+        if len(batch) < batch_size:
+            break
+
+    if run['loans_marked']:
+        bump_change_counters(db, 'loans', 'subscribers')
+    run['finished_at'] = datetime.utcnow()
+    run['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    db.job_runs.insert_one(run)
+    return run
+
+
+def last_run(db):
+    """Most recent recorded sweep, or None"""
+    return db.job_runs.find_one({'job': JOB_NAME}, sort=[('started_at', -1)])
+
+
+def start_overdue_scheduler(db, interval, batch_size=DEFAULT_BATCH_SIZE):
+    """Run mark_overdue() every `interval` seconds in a daemon thread.
+
+    The sweep only touches loans that are still active, so several
+    processes running it at the same time is harmless.
+    """
+    def loop():
+        while True:
+            try:
+                mark_overdue(db, batch_size=batch_size)
+            except Exception:
+                logger.exception("Error in overdue scan")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name='overdue-scanner', daemon=True)
+    thread.start()
+    return thread
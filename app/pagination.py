@@ -0,0 +1,162 @@
+# pagination.py
+import base64
+import binascii
+from urllib.parse import urlencode
+
+from bson import json_util
+from pymongo import ASCENDING, DESCENDING
+
+from app.cache import MISSING, LRUCache
+
+DEFAULT_PER_PAGE = 10
+MAX_PER_PAGE = 100
+
+# Filtered counts are cached for a short while so that page after page of the
+# same listing does not rescan the collection
+COUNT_CACHE_TTL = 30
+COUNT_CACHE_MAXSIZE = 1024
+_count_cache = LRUCache(COUNT_CACHE_MAXSIZE, COUNT_CACHE_TTL)
+
+
+class PaginationError(ValueError):
+    """Raised for a malformed cursor or an unsupported sort"""
+
+
+def parse_per_page(args, default=DEFAULT_PER_PAGE):
+    """Read per_page from the query string, clamped to [1, MAX_PER_PAGE]"""
+    per_page = int(args.get('per_page', default))
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+def parse_page(args, default_per_page=DEFAULT_PER_PAGE):
+    """(skip, limit) for the ?page= (from 1) and ?per_page= query params"""
+    page = max(1, int(args.get('page', 1)))
+    per_page = parse_per_page(args, default_per_page)
+    return (page - 1) * per_page, per_page
+
+
+def next_page_link(url, args, skip, per_page):
+    """Link header (rel="next") to the ?page= after the one read at `skip`"""
+    query = args.to_dict(flat=False)
+    query['page'] = [str(skip // per_page + 2)]
+    query['per_page'] = [str(per_page)]
+    return f'<{url}?{urlencode(query, doseq=True)}>; rel="next"'
+
+
+def parse_sort(args, allowed, default='_id'):
+    """Return (sort_key, direction) from the `sort` and `order` query params"""
+    sort_key = args.get('sort', default)
+    if sort_key not in allowed:
+        raise PaginationError(f"Unsupported sort key '{sort_key}'")
+    direction = ASCENDING if args.get('order', 'desc').lower() == 'asc' else DESCENDING
+    return sort_key, direction
+
+
+def sort_spec(sort_key, direction):
+    """Sort on the requested key with _id as the tie-breaker"""
+    if sort_key == '_id':
+        return [('_id', direction)]
+    return [(sort_key, direction), ('_id', direction)]
+
+
+def encode_cursor(sort_key, direction, item):
+    """Build an opaque cursor pointing just after `item`"""
+    payload = json_util.dumps({
+        'k': sort_key,
+        'd': direction,
+        'v': item.get(sort_key),
+        'id': item['_id']
+    })
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort_key, direction):
+    """Return (value, last_id) from a cursor, or None for an empty cursor"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        value, last_id = payload['v'], payload['id']
+        cursor_key, cursor_direction = payload['k'], payload['d']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise PaginationError('Malformed cursor')
+    if cursor_key != sort_key or cursor_direction != direction:
+        raise PaginationError('Cursor does not match the requested sort order')
+    return value, last_id
+
+
+def keyset_filter(sort_key, direction, position):
+    """Filter selecting the rows that come after `position` in sort order"""
+    value, last_id = position
+    op = '$gt' if direction == ASCENDING else '$lt'
+    if sort_key == '_id':
+        return {'_id': {op: last_id}}
+
+    # null sorts before every other value, and range operators never match
+    # across types, so a null position needs its own predicate
+    if value is None:
+        after = [{sort_key: None, '_id': {op: last_id}}]
+        if direction == ASCENDING:
+            after.append({sort_key: {'$ne': None}})
+        return {'$or': after}
+
+    after = [
+        {sort_key: {op: value}},
+        {sort_key: value, '_id': {op: last_id}}
+    ]
+    if direction == DESCENDING:
+        after.append({sort_key: None})
+    return {'$or': after}
+
+
+def merge_filters(*filters):
+    """AND together the non-empty filters"""
+    filters = [f for f in filters if f]
+    if not filters:
+        return {}
+    if len(filters) == 1:
+        return filters[0]
+    return {'$and': filters}
+
+
+def page_window(items, per_page, sort_key, direction):
+    """Trim an over-fetched page (per_page + 1 rows) and compute next_cursor"""
+    if len(items) > per_page:
+        items = items[:per_page]
+        return items, encode_cursor(sort_key, direction, items[-1])
+    return items, None
+
+
+def paginate(collection, filter_query, sort_key, direction, cursor, per_page, projection=None):
+    """Fetch one keyset page. Returns (items, next_cursor)."""
+    position = decode_cursor(cursor, sort_key, direction)
+    if position is not None:
+        filter_query = merge_filters(filter_query, keyset_filter(sort_key, direction, position))
+    items = list(
+        collection.find(filter_query, projection)
+        .sort(sort_spec(sort_key, direction))
+        .limit(per_page + 1)
+    )
+    return page_window(items, per_page, sort_key, direction)
+
+
+def count_total(collection, filter_query, mode='estimated'):
+    """Count matching rows.
+
+    mode is 'exact' (count_documents), 'estimated' (collection metadata when
+    unfiltered, otherwise a short-lived cached count) or 'none'.
+    """
+    if mode == 'none':
+        return None
+    if mode == 'exact':
+        return collection.count_documents(filter_query)
+    if not filter_query:
+        return collection.estimated_document_count()
+
+    key = (collection.full_name, json_util.dumps(filter_query, sort_keys=True))
+    total = _count_cache.get(key)
+    if total is MISSING:
+        total = collection.count_documents(filter_query)
+        _count_cache.set(key, total)
+    return total
@@ -0,0 +1,144 @@
+# read_model.py
+# Display fields copied onto each loan so the loans list can be served by a
+# plain indexed find instead of joining subscribers and documents
+from pymongo import UpdateMany
+
+from app.conditional import touch
+
+READ_MODEL_JOIN = 'join'
+READ_MODEL_DENORMALIZED = 'denormalized'
+READ_MODELS = (READ_MODEL_JOIN, READ_MODEL_DENORMALIZED)
+
+# Fields returned by the loans list when reading the denormalized model
+LOAN_LIST_PROJECTION = {
+    'loan_date': 1,
+    'due_date': 1,
+    'status': 1,
+    'subscriber_name': 1,
+    'document_title': 1
+}
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def subscriber_name(subscriber):
+    """Display name stored on loans, 'first_name last_name'"""
+    parts = [subscriber.get('first_name'), subscriber.get('last_name')]
+    return ' '.join(part for part in parts if part)
+
+
+def loan_display_fields(subscriber, document):
+    return {
+        'subscriber_name': subscriber_name(subscriber),
+        'document_title': document.get('title')
+    }
+
+
+def loan_list_pipeline(match, sort, limit=None, skip=0):
+    """Filter, sort and limit the loans first, then join only the display fields"""
+    pipeline = [{'$match': match}, {'$sort': dict(sort)}]
+    if skip:
+        pipeline.append({'$skip': skip})
+    if limit is not None:
+        pipeline.append({'$limit': limit})
+    pipeline.extend([
+        {
+            '$lookup': {
+                'from': 'subscribers',
+                'localField': 'subscriber_id',
+                'foreignField': '_id',
+                'pipeline': [{'$project': {'_id': 0, 'first_name': 1, 'last_name': 1}}],
+                'as': 'subscriber'
+            }
+        },
+        {
+            '$lookup': {
+                'from': 'documents',
+                'localField': 'document_id',
+                'foreignField': '_id',
+                'pipeline': [{'$project': {'_id': 0, 'title': 1}}],
+                'as': 'document'
+            }
+        },
+        # Keep loans whose subscriber or document was deleted so that page
+        # sizes and cursors stay consistent
+        {
+            '$unwind': {'path': '$subscriber', 'preserveNullAndEmptyArrays': True}
+        },
+        {
+            '$unwind': {'path': '$document', 'preserveNullAndEmptyArrays': True}
+        },
+        {
+            '$project': {
+                '_id': 1,
+                'loan_date': 1,
+                'due_date': 1,
+                'status': 1,
+                'subscriber_name': {
+                    '$concat': ['$subscriber.first_name', ' ', '$subscriber.last_name']
+                },
+                'document_title': '$document.title'
+            }
+        }
+    ])
+    return pipeline
+
+
+def sync_subscriber_name(db, subscriber_id, subscriber):
+    """Fan a renamed subscriber out to all of their loans.
+
+    The loans get a new version like any other write; callers then count
+    the change with records_changed(loans=...).
+    """
+    return db.loans.update_many(
+        {'subscriber_id': subscriber_id},
+        touch({'$set': {'subscriber_name': subscriber_name(subscriber)}})
+    )
+
+
+def sync_document_title(db, document_id, title):
+    """Fan a retitled document out to all of its loans (see sync_subscriber_name)"""
+    return db.loans.update_many(
+        {'document_id': document_id},
+        touch({'$set': {'document_title': title}})
+    )
+
+
+def synced_loan_ids(db, key, record_id):
+    """Ids of the loans a sync_* call rewrites, to drop from the record cache"""
+    return db.loans.distinct('_id', {key: record_id})
+
+
+def _backfill(collection, loans, key, fields, display, batch_size):
+    modified = 0
+    requests = []
+    for row in collection.find({}, fields, batch_size=batch_size):
+        requests.append(UpdateMany({key: row['_id']}, {'$set': display(row)}))
+        if len(requests) >= batch_size:
+            modified += loans.bulk_write(requests, ordered=False).modified_count
+            requests = []
+    if requests:
+        modified += loans.bulk_write(requests, ordered=False).modified_count
+    return modified
+
+
+def backfill_loan_read_model(db, batch_size=BACKFILL_BATCH_SIZE):
+    """Populate subscriber_name and document_title on existing loans.
+
+    One UpdateMany per subscriber and per document, sent in bulk_write batches.
+    Returns the number of loans modified by each pass.
+    """
+    return {
+        'subscriber_name': _backfill(
+            db.subscribers, db.loans, 'subscriber_id',
+            {'first_name': 1, 'last_name': 1},
+            lambda subscriber: {'subscriber_name': subscriber_name(subscriber)},
+            batch_size
+        ),
+        'document_title': _backfill(
+            db.documents, db.loans, 'document_id',
+            {'title': 1},
+            lambda document: {'document_title': document.get('title')},
+            batch_size
+        )
+    }
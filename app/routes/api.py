@@ -0,0 +1,771 @@
+# app/routes/api.py
+# The REST API and the frontend page, registered by create_app()
+from flask import Blueprint, current_app, jsonify, render_template, request
+from werkzeug.local import LocalProxy
+from app import mongo
+#from app.auth import requires_auth, create_token, bcrypt
+from app.catalogue_import import (
+    DEFAULT_BATCH_SIZE as DEFAULT_IMPORT_BATCH_SIZE, FORMATS as IMPORT_FORMATS,
+    guess_format, import_documents, iter_rows
+)
+from app.conditional import (
+    bump_change_counters, conditional, list_validators, new_record_fields, record_validators, touch
+)
+from app.circulation import (
+    OPEN_LOAN_STATUSES, CirculationError, checkout, checkout_batch, checkout_in_transaction, return_batch
+)
+from app.export import DEFAULT_BATCH_SIZE as DEFAULT_EXPORT_BATCH_SIZE, ExportError, export_cursor
+from app.facets import facet_cache
+from app.filters import document_filter, loan_filter
+from app.pagination import (
+    MAX_PER_PAGE, PaginationError, count_total, decode_cursor, keyset_filter, merge_filters,
+    next_page_link, page_window, paginate, parse_page, parse_per_page, parse_sort, sort_spec
+)
+from app.read_model import (
+    LOAN_LIST_PROJECTION, READ_MODEL_DENORMALIZED, READ_MODELS,
+    loan_list_pipeline, sync_document_title, sync_subscriber_name, synced_loan_ids
+)
+from app.serializers import serialize_loan, serialize_subscriber
+from app.streaming import export_response, stream_rows
+from app.suggest import (
+    DEFAULT_LIMIT as DEFAULT_SUGGEST_LIMIT, MAX_LIMIT as MAX_SUGGEST_LIMIT, SUGGEST_FIELD,
+    document_label, document_suggest_keys, normalize, subscriber_label,
+    subscriber_suggest_keys, suggest
+)
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime, timedelta
+from functools import wraps
+from pymongo import ASCENDING
+
+bp = Blueprint('api', __name__)
+
+# Per-app RecordCache, built by create_app() from the CACHE_* settings
+record_cache = LocalProxy(lambda: current_app.extensions['record_cache'])
+
+# Sort keys accepted by the documents list (each backed by a (key, _id) index)
+DOCUMENT_SORT_KEYS = ('_id', 'title', 'author')
+SUBSCRIBER_SORT_KEYS = ('_id', 'last_name')
+LOAN_SORT_KEYS = ('_id', 'loan_date', 'due_date')
+
+# List views do not need the embedded loan arrays
+SUBSCRIBER_LIST_PROJECTION = {'current_loans': 0, 'loan_history': 0}
+# The typeahead keys are for the suggest index only
+DOCUMENT_PROJECTION = {SUGGEST_FIELD: 0}
+
+# Rows fetched per getMore when streaming a whole collection
+STREAM_BATCH_SIZE = 500
+
+# Ranked search results are paged with skip, so keep them shallow
+MAX_SEARCH_PAGE = 50
+
+# Frontend routes
+@bp.route('/')
+def index():
+    return render_template('index.html')
+
+def records_changed(**record_ids):
+    """After a write: drop the cached records, count the change for the list
+    ETags and drop the facet counts if the catalogue changed.
+
+    Called as records_changed(documents=[...], subscribers=[...]).
+    """
+    for collection, ids in record_ids.items():
+        record_cache.invalidate(collection, *ids)
+    bump_change_counters(mongo.db, *record_ids)
+    if 'documents' in record_ids:
+        facet_cache.invalidate()
+
+def conditional_list(*collections):
+    """Answer 304 for a list view while none of `collections` changed"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag, last_modified = list_validators(mongo.db, *collections)
+            return conditional(etag, last_modified, lambda: view(*args, **kwargs))
+        return wrapper
+    return decorator
+
+@bp.route('/api/subscribers/', methods=['GET'])
+@conditional_list('subscribers')
+def get_subscribers():
+    try:
+        # The embedded loan arrays are left out unless ?include=loans
+        projection = None if request.args.get('include') == 'loans' else SUBSCRIBER_LIST_PROJECTION
+
+        # Keyset mode: ?cursor= (empty for the first page) then next_cursor
+        if 'cursor' in request.args:
+            sort_key, direction = parse_sort(request.args, SUBSCRIBER_SORT_KEYS)
+            per_page = parse_per_page(request.args)
+            subscribers, next_cursor = paginate(
+                mongo.db.subscribers, {}, sort_key, direction,
+                request.args['cursor'], per_page, projection
+            )
+            return jsonify({
+                "subscribers": [serialize_subscriber(subscriber) for subscriber in subscribers],
+                "pagination": {
+                    "per_page": per_page,
+                    "sort": sort_key,
+                    "order": "asc" if direction == ASCENDING else "desc",
+                    "next_cursor": next_cursor,
+                    "has_next": next_cursor is not None
+                }
+            })
+
+        # Full listing: stream straight from the server-side cursor so memory
+        # stays flat whatever the size of the collection (?format=ndjson for
+        # one subscriber per line)
+        subscribers = mongo.db.subscribers.find({}, projection, batch_size=STREAM_BATCH_SIZE)
+        return stream_rows(subscribers, serialize_subscriber, request.args.get('format', 'json'))
+    except PaginationError as e:
+        return jsonify({"error": "Invalid pagination parameters", "message": str(e)}), 400
+    except Exception as e:
+        current_app.logger.exception("Error in get_subscribers")
+        return jsonify({"error": "Internal server error", "message": str(e)}), 500
+
+@bp.route('/api/subscribers', methods=['POST'])
+def add_subscriber():
+    try:
+        data = request.json
+        data['inscription_date'] = datetime.utcnow()
+        data['current_loans'] = []
+        data['loan_history'] = []
+        data[SUGGEST_FIELD] = subscriber_suggest_keys(data)
+        data.update(new_record_fields())
+        
+        result = mongo.db.subscribers.insert_one(data)
+        records_changed(subscribers=[result.inserted_id])
+        return jsonify({
+            "message": "Subscriber added successfully",
+            "id": str(result.inserted_id)
+        }), 201
+    except Exception as e:
+        return jsonify({"message": "Failed to add subscriber", "error": str(e)}), 400
+
+@bp.route('/api/subscribers/<subscriber_id>', methods=['DELETE'])
+def delete_subscriber(subscriber_id):
+    try:
+        result = mongo.db.subscribers.delete_one({"_id": ObjectId(subscriber_id)})
+        if result.deleted_count == 1:
+            records_changed(subscribers=[subscriber_id])
+            return jsonify({"message": "Subscriber deleted successfully"}), 200
+        else:
+            return jsonify({"message": "Subscriber not found"}), 404
+    except Exception as e:
+        return jsonify({"error": "Failed to delete subscriber", "message": str(e)}), 400
+
+@bp.route('/api/subscribers/<subscriber_id>', methods=['PUT'])
+def update_subscriber(subscriber_id):
+    try:
+        data = request.json
+        result = mongo.db.subscribers.update_one(
+            {"_id": ObjectId(subscriber_id)},
+            touch({"$set": {
+                "first_name": data.get("first_name"),
+                "last_name": data.get("last_name"),
+                "email": data.get("email"),
+                "address": data.get("address"),
+                "phone": data.get("phone"),
+                SUGGEST_FIELD: subscriber_suggest_keys(data)
+            }})
+        )
+
+        # Keep the name copied onto this subscriber's loans in sync
+        if result.modified_count and ("first_name" in data or "last_name" in data):
+            sync_subscriber_name(mongo.db, ObjectId(subscriber_id), data)
+            records_changed(
+                subscribers=[subscriber_id],
+                loans=synced_loan_ids(mongo.db, 'subscriber_id', ObjectId(subscriber_id))
+            )
+        else:
+            records_changed(subscribers=[subscriber_id])
+
+        return jsonify({"message": "Subscriber updated successfully"}), 200
+    except Exception as e:
+        return jsonify({"message": "Failed to update subscriber", "error": str(e)}), 400
+
+@bp.route('/api/subscribers/<subscriber_id>', methods=['GET'])
+def get_subscriber(subscriber_id):
+    try:
+        subscriber_id = ObjectId(subscriber_id)
+        subscriber = record_cache.get_or_load(
+            'subscribers', subscriber_id,
+            lambda: mongo.db.subscribers.find_one({"_id": subscriber_id})
+        )
+        if not subscriber:
+            return jsonify({"message": "Subscriber not found"}), 404
+
+        etag, last_modified = record_validators(subscriber)
+        return conditional(etag, last_modified, lambda: jsonify(subscriber))
+    except Exception as e:
+        return jsonify({"message": "Failed to fetch subscriber", "error": str(e)}), 400
+
+@bp.route('/api/documents/', methods=['GET'])
+@conditional_list('documents')
+def get_documents():
+    try:
+        sort_key, direction = parse_sort(request.args, DOCUMENT_SORT_KEYS)
+        filter_query = document_filter(request.args)
+
+        # Keyset mode: clients pass ?cursor= (empty for the first page) and
+        # follow next_cursor, so deep pages cost the same as the first one
+        if 'cursor' in request.args:
+            per_page = parse_per_page(request.args)
+            documents, next_cursor = paginate(
+                mongo.db.documents, filter_query, sort_key, direction,
+                request.args['cursor'], per_page, DOCUMENT_PROJECTION
+            )
+
+            pagination = {
+                "per_page": per_page,
+                "sort": sort_key,
+                "order": "asc" if direction == ASCENDING else "desc",
+                "next_cursor": next_cursor,
+                "has_next": next_cursor is not None
+            }
+            total_documents = count_total(mongo.db.documents, filter_query, request.args.get('count', 'none'))
+            if total_documents is not None:
+                pagination["total_documents"] = total_documents
+
+            return jsonify({"documents": documents, "pagination": pagination})
+
+        # Get query parameters for pagination
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 10))
+
+        # Get total documents (estimated unless ?count=exact)
+        count_mode = request.args.get('count', 'estimated')
+        total_documents = count_total(mongo.db.documents, filter_query, 'exact' if count_mode == 'exact' else 'estimated')
+        total_pages = max(1, (total_documents + per_page - 1) // per_page)
+
+        # Calculate skip
+        skip = (page - 1) * per_page
+
+        # Query documents with sorting (newest first)
+        documents = list(mongo.db.documents.find(filter_query, DOCUMENT_PROJECTION).sort(sort_spec(sort_key, direction)).skip(skip).limit(per_page))
+
+        return jsonify({
+            "documents": documents,
+            "pagination": {
+                "page": page,
+                "per_page": per_page,
+                "total_documents": total_documents,
+                "total_pages": total_pages
+            }
+        })
+
+    except PaginationError as e:
+        return jsonify({"error": "Invalid pagination parameters", "message": str(e)}), 400
+    except Exception as e:
+        current_app.logger.exception("Error in get_documents")
+        return jsonify({
+            "error": "Internal server error",
+            "message": str(e)
+        }), 500
+    
+@bp.route('/api/documents/search', methods=['GET'])
+def search_documents():
+    """Ranked full-text search over title, author, genre and description"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({"error": "Missing search query", "message": "Use ?q=..."}), 400
+
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = parse_per_page(request.args)
+        if page > MAX_SEARCH_PAGE:
+            return jsonify({"error": "Page out of range", "message": f"Search results stop at page {MAX_SEARCH_PAGE}"}), 400
+
+        filter_query = merge_filters({'$text': {'$search': query}}, document_filter(request.args))
+        projection = dict(DOCUMENT_PROJECTION, score={'$meta': 'textScore'})
+
+        # Fetch one extra row to know whether there is a next page
+        documents = list(
+            mongo.db.documents.find(filter_query, projection)
+            .sort([('score', {'$meta': 'textScore'})])
+            .skip((page - 1) * per_page)
+            .limit(per_page + 1)
+        )
+        has_next = len(documents) > per_page
+        documents = documents[:per_page]
+
+        pagination = {"page": page, "per_page": per_page, "has_next": has_next}
+        total_documents = count_total(mongo.db.documents, filter_query, request.args.get('count', 'none'))
+        if total_documents is not None:
+            pagination["total_documents"] = total_documents
+
+        return jsonify({"query": query, "documents": documents, "pagination": pagination})
+    except ValueError as e:
+        return jsonify({"error": "Invalid pagination parameters", "message": str(e)}), 400
+    except Exception as e:
+        current_app.logger.exception("Error in search_documents")
+        return jsonify({"error": "Internal server error", "message": str(e)}), 500
+
+@bp.route('/api/documents/facets', methods=['GET'])
+def get_document_facets():
+    """Counts per type, genre, language and availability for the list filters"""
+    try:
+        facets, cached = facet_cache.get(mongo.db.documents, document_filter(request.args))
+        return jsonify({"facets": facets, "cached": cached}), 200
+    except Exception as e:
+        current_app.logger.exception("Error in get_document_facets")
+        return jsonify({"error": "Internal server error", "message": str(e)}), 500
+
+@bp.route('/api/documents/<document_id>', methods=['PUT'])
+def update_document(document_id):
+    try:
+        data = request.json
+        result = mongo.db.documents.update_one(
+            {"_id": ObjectId(document_id)},
+            touch({"$set": {
+                "title": data.get("title"),
+                "author": data.get("author"),
+                "type": data.get("type"),
+                "isbn": data.get("isbn"),
+                "genre": data.get("genre"),
+                "publication_date": data.get("publication_date"),
+                "available": data.get("available", True),
+                SUGGEST_FIELD: document_suggest_keys(data)
+            }})
+        )
+        if result.modified_count == 0:
+            return jsonify({"message": "Document not found"}), 404
+
+        # Keep the title copied onto this document's loans in sync
+        if "title" in data:
+            sync_document_title(mongo.db, ObjectId(document_id), data.get("title"))
+            records_changed(
+                documents=[document_id],
+                loans=synced_loan_ids(mongo.db, 'document_id', ObjectId(document_id))
+            )
+        else:
+            records_changed(documents=[document_id])
+
+        return jsonify({"message": "Document updated successfully"}), 200
+    except Exception as e:
+        return jsonify({"message": "Failed to update document", "error": str(e)}), 400
+
+@bp.route('/api/documents/<document_id>', methods=['DELETE'])
+def delete_document(document_id):
+    try:
+        # Check if document is currently loaned
+        loan = mongo.db.loans.find_one({
+            "document_id": ObjectId(document_id),
+            "status": {"$in": OPEN_LOAN_STATUSES}
+        })
+        if loan:
+            return jsonify({"message": "Cannot delete document that is currently loaned"}), 400
+        
+        result = mongo.db.documents.delete_one({"_id": ObjectId(document_id)})
+        if result.deleted_count == 0:
+            return jsonify({"message": "Document not found"}), 404
+        records_changed(documents=[document_id])
+        return jsonify({"message": "Document deleted successfully"}), 200
+    except Exception as e:
+        return jsonify({"message": "Failed to delete document", "error": str(e)}), 400
+
+@bp.route('/api/documents', methods=['POST'])
+def create_document():
+    try:
+        data = request.json
+        data['available'] = True  # New documents are always available
+        data[SUGGEST_FIELD] = document_suggest_keys(data)
+        data.update(new_record_fields())
+        result = mongo.db.documents.insert_one(data)
+        records_changed(documents=[result.inserted_id])
+        return jsonify({
+            "message": "Document created successfully",
+            "id": str(result.inserted_id)
+        }), 201
+    except Exception as e:
+        return jsonify({"message": "Failed to create document", "error": str(e)}), 400
+
+@bp.route('/api/documents/import', methods=['POST'])
+def import_documents_route():
+    """Bulk import documents from a CSV or JSON Lines upload.
+
+    The file is sent as multipart field `file` or as the raw request body;
+    ?format=csv|jsonl is needed when it cannot be guessed from the file name.
+    """
+    try:
+        upload = request.files.get('file')
+        stream = upload.stream if upload else request.stream
+        fmt = request.args.get('format') or guess_format(upload.filename if upload else None)
+        if fmt not in IMPORT_FORMATS:
+            return jsonify({"error": "Unsupported format", "message": "Use ?format=csv or ?format=jsonl"}), 400
+        batch_size = request.args.get('batch_size', DEFAULT_IMPORT_BATCH_SIZE)
+        if not str(batch_size).isdigit() or int(batch_size) < 1:
+            return jsonify({"error": "Invalid batch_size", "message": "batch_size must be a positive integer"}), 400
+        batch_size = int(batch_size)
+
+        try:
+            report = import_documents(mongo.db.documents, iter_rows(stream, fmt), batch_size)
+        finally:
+            # Earlier batches may be in even if a later one failed
+            records_changed(documents=[])
+        return jsonify({"message": "Import finished", **report}), 200
+    except Exception as e:
+        current_app.logger.exception("Error in import_documents")
+        return jsonify({"message": "Failed to import documents", "error": str(e)}), 400
+
+@bp.route('/api/documents/<document_id>', methods=['GET'])
+def get_document(document_id):
+    try:
+        document_id = ObjectId(document_id)
+        document = record_cache.get_or_load(
+            'documents', document_id,
+            lambda: mongo.db.documents.find_one({"_id": document_id}, DOCUMENT_PROJECTION)
+        )
+        if not document:
+            return jsonify({"message": "Document not found"}), 404
+
+        etag, last_modified = record_validators(document)
+        return conditional(etag, last_modified, lambda: jsonify(document))
+    except Exception as e:
+        current_app.logger.exception("Error in get_document")
+        return jsonify({"message": "Failed to fetch document", "error": str(e)}), 400
+
+
+def loan_array_response(loans, skip, limit):
+    """Plain-array page of loans, fetched with one extra row.
+
+    When more loans follow, the Link header points at the next ?page=.
+    """
+    response = jsonify(loans[:limit])
+    if len(loans) > limit:
+        response.headers['Link'] = next_page_link(request.base_url, request.args, skip, limit)
+    return response
+
+def get_loans_denormalized(match, sort_key, direction):
+    """Serve the loans list from the display fields stored on each loan"""
+    if 'cursor' in request.args:
+        per_page = parse_per_page(request.args)
+        loans, next_cursor = paginate(
+            mongo.db.loans, match, sort_key, direction,
+            request.args['cursor'], per_page, LOAN_LIST_PROJECTION
+        )
+
+        return jsonify({
+            "loans": loans,
+            "pagination": {
+                "per_page": per_page,
+                "sort": sort_key,
+                "order": "asc" if direction == ASCENDING else "desc",
+                "next_cursor": next_cursor,
+                "has_next": next_cursor is not None
+            }
+        })
+
+    skip, limit = parse_page(request.args, MAX_PER_PAGE)
+    loans = list(
+        mongo.db.loans.find(match, LOAN_LIST_PROJECTION).sort(sort_spec(sort_key, direction)).skip(skip).limit(limit + 1)
+    )
+    return loan_array_response(loans, skip, limit)
+
+@bp.route('/api/loans/', methods=['GET'])
+@conditional_list('loans', 'subscribers', 'documents')
+def get_loans():
+    try:
+        sort_key, direction = parse_sort(request.args, LOAN_SORT_KEYS)
+        match = loan_filter(request.args)
+
+        read_model = request.args.get('read_model', current_app.config['LOANS_READ_MODEL'])
+        if read_model not in READ_MODELS:
+            return jsonify({"error": f"Unknown read model '{read_model}'"}), 400
+        if read_model == READ_MODEL_DENORMALIZED:
+            return get_loans_denormalized(match, sort_key, direction)
+
+        # Keyset mode: ?cursor= (empty for the first page) then next_cursor
+        if 'cursor' in request.args:
+            per_page = parse_per_page(request.args)
+            position = decode_cursor(request.args['cursor'], sort_key, direction)
+            if position is not None:
+                match = merge_filters(match, keyset_filter(sort_key, direction, position))
+
+            pipeline = loan_list_pipeline(match, sort_spec(sort_key, direction), per_page + 1)
+            loans, next_cursor = page_window(
+                list(mongo.db.loans.aggregate(pipeline)), per_page, sort_key, direction
+            )
+
+            return jsonify({
+                "loans": loans,
+                "pagination": {
+                    "per_page": per_page,
+                    "sort": sort_key,
+                    "order": "asc" if direction == ASCENDING else "desc",
+                    "next_cursor": next_cursor,
+                    "has_next": next_cursor is not None
+                }
+            })
+
+        # Plain array: one ?page= of at most ?per_page= (default 100) loans
+        skip, limit = parse_page(request.args, MAX_PER_PAGE)
+        loans = list(mongo.db.loans.aggregate(loan_list_pipeline(match, sort_spec(sort_key, direction), limit + 1, skip)))
+        return loan_array_response(loans, skip, limit)
+    except PaginationError as e:
+        return jsonify({"error": "Invalid pagination parameters", "message": str(e)}), 400
+    except (InvalidId, ValueError) as e:
+        return jsonify({"error": "Invalid filter", "message": str(e)}), 400
+    except Exception as e:
+        current_app.logger.exception("Error fetching loans")
+        return jsonify({"error": "Failed to fetch loans"}), 500
+
+
+
+def parse_loan_dates(data):
+    """Parse and validate the loan_date/due_date of a checkout request"""
+    loan_date = datetime.strptime(data['loan_date'], '%Y-%m-%d')
+    due_date = datetime.strptime(data['due_date'], '%Y-%m-%d')
+    if loan_date > due_date:
+        raise CirculationError("Return date must be after loan date", 400)
+    return loan_date, due_date
+
+@bp.route('/api/loans', methods=['POST'])
+def create_loan():
+    try:
+        data = request.json
+        loan_date, due_date = parse_loan_dates(data)
+
+        subscriber_id = ObjectId(data['subscriber_id'])
+        document_id = ObjectId(data['document_id'])
+
+        # Claim the document and record the loan; concurrent checkouts of the
+        # same document cannot both succeed
+        if current_app.config['LOANS_USE_TRANSACTIONS']:
+            loan = checkout_in_transaction(mongo.cx, mongo.db, subscriber_id, document_id, loan_date, due_date)
+        else:
+            loan = checkout(mongo.db, subscriber_id, document_id, loan_date, due_date)
+        # Availability and current_loans changed
+        records_changed(documents=[document_id], subscribers=[subscriber_id], loans=[loan['_id']])
+
+        return jsonify({
+            "message": "Loan created successfully",
+            "id": str(loan['_id'])
+        }), 201
+
+    except CirculationError as e:
+        return jsonify({"error": e.message}), e.status_code
+    except ValueError as e:
+        return jsonify({"error": "Invalid date format"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/loans/batch', methods=['POST'])
+def create_loans_batch():
+    """Check out a basket of documents for one subscriber"""
+    try:
+        data = request.json
+        loan_date, due_date = parse_loan_dates(data)
+
+        document_ids = data.get('document_ids')
+        if not isinstance(document_ids, list) or not document_ids:
+            return jsonify({"error": "document_ids must be a non-empty list"}), 400
+
+        subscriber_id = ObjectId(data['subscriber_id'])
+        results = checkout_batch(mongo.db, subscriber_id, document_ids, loan_date, due_date)
+        checked_out = sum(1 for result in results if result['status'] == 'checked_out')
+        if checked_out:
+            records_changed(
+                documents=[result['document_id'] for result in results if result['status'] == 'checked_out'],
+                subscribers=[subscriber_id],
+                loans=[]
+            )
+
+        return jsonify({
+            "message": f"{checked_out} of {len(results)} documents checked out",
+            "checked_out": checked_out,
+            "failed": len(results) - checked_out,
+            "results": results
+        }), 201 if checked_out else 400
+
+    except CirculationError as e:
+        return jsonify({"error": e.message}), e.status_code
+    except InvalidId:
+        return jsonify({"error": "Invalid subscriber ID"}), 400
+    except ValueError as e:
+        return jsonify({"error": "Invalid date format"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def loans_changed(loan_ids):
+    """records_changed() for loans and their documents and subscribers"""
+    loans = list(mongo.db.loans.find({'_id': {'$in': loan_ids}}, {'subscriber_id': 1, 'document_id': 1}))
+    records_changed(
+        loans=loan_ids,
+        documents=[loan['document_id'] for loan in loans],
+        subscribers=[loan['subscriber_id'] for loan in loans]
+    )
+
+@bp.route('/api/loans/return', methods=['POST'])
+def return_loans_batch():
+    """Check in a batch of loans given by loan_ids and/or document_ids"""
+    try:
+        data = request.json or {}
+        loan_ids = data.get('loan_ids', [])
+        document_ids = data.get('document_ids', [])
+        if not isinstance(loan_ids, list) or not isinstance(document_ids, list) or not (loan_ids or document_ids):
+            return jsonify({"error": "Provide a non-empty loan_ids or document_ids list"}), 400
+
+        results = return_batch(mongo.db, loan_ids, document_ids)
+        returned = sum(1 for result in results if result['status'] == 'returned')
+        if returned:
+            loans_changed([ObjectId(result['loan_id']) for result in results if result['status'] == 'returned'])
+
+        return jsonify({
+            "message": f"{returned} of {len(results)} items returned",
+            "returned": returned,
+            "failed": len(results) - returned,
+            "results": results
+        }), 200
+
+    except CirculationError as e:
+        return jsonify({"error": e.message}), e.status_code
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/loans/<loan_id>', methods=['GET'])
+def get_loan(loan_id):
+    try:
+        loan_id = ObjectId(loan_id)
+        loan = record_cache.get_or_load('loans', loan_id, lambda: mongo.db.loans.find_one({"_id": loan_id}))
+        if not loan:
+            return jsonify({"message": "Loan not found"}), 404
+        etag, last_modified = record_validators(loan)
+        return conditional(etag, last_modified, lambda: jsonify(serialize_loan(loan)))
+    except Exception as e:
+        return jsonify({"message": "Failed to fetch loan", "error": str(e)}), 400
+
+@bp.route('/api/loans/<loan_id>', methods=['PUT'])
+def update_loan(loan_id):
+    try:
+        data = request.json
+        loan = mongo.db.loans.find_one({"_id": ObjectId(loan_id)})
+        if not loan:
+            return jsonify({"message": "Loan not found"}), 404
+
+        # Returning the document: same path as POST /api/v2/loans/<id>/return,
+        # which frees the document and writes the subscriber's loan_history
+        # only if this request is the one that closed the loan
+        if data.get("status") == "returned" and loan["status"] in OPEN_LOAN_STATUSES:
+            result = return_batch(mongo.db, [loan_id])[0]
+            if result["status"] == "not_found":
+                return jsonify({"message": "Loan not found"}), 404
+            records_changed(loans=[loan_id], documents=[loan["document_id"]], subscribers=[loan["subscriber_id"]])
+            return jsonify({"message": "Loan updated successfully"}), 200
+
+        mongo.db.loans.update_one(
+            {"_id": ObjectId(loan_id)},
+            touch({"$set": {"status": data.get("status", loan["status"])}})
+        )
+        records_changed(loans=[loan_id])
+
+        return jsonify({"message": "Loan updated successfully"}), 200
+    except Exception as e:
+        return jsonify({"message": "Failed to update loan", "error": str(e)}), 400
+
+@bp.route('/api/loans/<loan_id>', methods=['DELETE'])
+def delete_loan(loan_id):
+    try:
+        loan = mongo.db.loans.find_one({"_id": ObjectId(loan_id)})
+        if not loan:
+            return jsonify({"message": "Loan not found"}), 404
+            
+        # Can only delete returned loans
+        if loan["status"] in OPEN_LOAN_STATUSES:
+            return jsonify({"message": "Cannot delete active loan"}), 400
+            
+        result = mongo.db.loans.delete_one({"_id": ObjectId(loan_id)})
+        records_changed(loans=[loan_id])
+        return jsonify({"message": "Loan deleted successfully"}), 200
+    except Exception as e:
+        return jsonify({"message": "Failed to delete loan", "error": str(e)}), 400
+
+@bp.route('/api/loans/subscriber/<subscriber_id>', methods=['GET'])
+def get_subscriber_loans(subscriber_id):
+    try:
+        loans = list(mongo.db.loans.find({
+            "subscriber_id": ObjectId(subscriber_id)
+        }).sort("loan_date", -1))
+        return jsonify([serialize_loan(loan) for loan in loans]), 200
+    except Exception as e:
+        return jsonify({"message": "Failed to fetch subscriber loans", "error": str(e)}), 400
+
+@bp.route('/api/loans/document/<document_id>', methods=['GET'])
+def get_document_loans(document_id):
+    try:
+        loans = list(mongo.db.loans.find({
+            "document_id": ObjectId(document_id)
+        }).sort("loan_date", -1))
+        return jsonify([serialize_loan(loan) for loan in loans]), 200
+    except Exception as e:
+        return jsonify({"message": "Failed to fetch document loans", "error": str(e)}), 400
+    
+
+@bp.route('/api/suggest/documents', methods=['GET'])
+def suggest_documents():
+    """Typeahead on document titles and authors (?available=true for the loan form)"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', DEFAULT_SUGGEST_LIMIT)), MAX_SUGGEST_LIMIT))
+        prefix = request.args.get('q', '')
+        if not normalize(prefix):
+            return jsonify([])
+        return jsonify(suggest(
+            mongo.db.documents, prefix, {'title': 1, 'author': 1}, document_label,
+            limit, document_filter(request.args)
+        ))
+    except Exception as e:
+        return jsonify({"message": "Failed to fetch suggestions", "error": str(e)}), 400
+
+@bp.route('/api/suggest/subscribers', methods=['GET'])
+def suggest_subscribers():
+    """Typeahead on subscriber names and emails"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', DEFAULT_SUGGEST_LIMIT)), MAX_SUGGEST_LIMIT))
+        prefix = request.args.get('q', '')
+        if not normalize(prefix):
+            return jsonify([])
+        return jsonify(suggest(
+            mongo.db.subscribers, prefix, {'first_name': 1, 'last_name': 1, 'email': 1},
+            subscriber_label, limit
+        ))
+    except Exception as e:
+        return jsonify({"message": "Failed to fetch suggestions", "error": str(e)}), 400
+
+@bp.route('/api/export/<collection>', methods=['GET'])
+def export_collection(collection):
+    """Stream a whole collection as NDJSON (?gzip=true to compress).
+
+    Accepts the list endpoint filters, ?fields=a,b to project and
+    ?batch_size= to tune the server-side cursor.
+    """
+    try:
+        rows = export_cursor(
+            mongo.db, collection, request.args,
+            request.args.get('fields'),
+            request.args.get('batch_size', DEFAULT_EXPORT_BATCH_SIZE)
+        )
+        compress = request.args.get('gzip', 'false').lower() == 'true'
+        return export_response(rows, f"{collection}.ndjson", compress)
+    except ExportError as e:
+        return jsonify({"error": "Invalid export", "message": str(e)}), 400
+    except (InvalidId, ValueError) as e:
+        return jsonify({"error": "Invalid filter", "message": str(e)}), 400
+    except Exception as e:
+        current_app.logger.exception("Error in export_collection")
+        return jsonify({"error": "Internal server error", "message": str(e)}), 500
+
+@bp.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Hit/miss/eviction counters of the record cache of this process"""
+    return jsonify(record_cache.stats()), 200
+
+@bp.route('/api/admin/slow-queries', methods=['GET'])
+def get_slow_queries():
+    """Slow MongoDB commands recorded by this process, newest first (?limit=N)"""
+    limit = request.args.get('limit', type=int)
+    return jsonify(current_app.extensions['slow_queries'].report(limit)), 200
+
+@bp.route('/api/admin/slow-queries', methods=['DELETE'])
+def clear_slow_queries():
+    current_app.extensions['slow_queries'].clear()
+    return jsonify({"message": "Slow query log cleared"}), 200
@@ -1,12 +1,31 @@
 # app/routes/documents.py
 from flask import Blueprint, request, jsonify
 from bson import ObjectId
+from datetime import date, datetime
+from marshmallow.exceptions import ValidationError
+from app.conditional import new_record_fields, touch
+from app.read_model import sync_document_title, synced_loan_ids
+from app.routes.api import records_changed
 from app.schemas import DocumentSchema
+from app.serializers import serialize_document
+from app.suggest import SUGGEST_FIELD, document_suggest_keys
 #from app.auth import requires_auth
 from app import mongo
 
 bp = Blueprint('documents', __name__)
 
+# Input validation; responses go through app.serializers
+document_schema = DocumentSchema()
+
+def load_document(payload):
+    """Validate a request body into the stored shape"""
+    data = document_schema.load(payload)
+    # BSON has no date type; stored as midnight like the imported catalogue
+    if isinstance(data.get('publication_date'), date):
+        data['publication_date'] = datetime.combine(data['publication_date'], datetime.min.time())
+    data[SUGGEST_FIELD] = document_suggest_keys(data)
+    return data
+
 @bp.route('/', methods=['GET'])
 #@requires_auth
 def get_documents():
@@ -30,7 +49,7 @@ def get_documents():
         documents = list(mongo.db.documents.find(filter_query).skip(skip).limit(per_page))
         
         return jsonify({
-            'data': DocumentSchema.dump(documents, many=True),
+            'data': [serialize_document(row) for row in documents],
             'total': total,
             'page': page,
             'per_page': per_page,
@@ -46,7 +65,7 @@ def get_document(id):
         document = mongo.db.documents.find_one({'_id': ObjectId(id)})
         if not document:
             return jsonify({'error': 'Document not found'}), 404
-        return jsonify(DocumentSchema.dump(document))
+        return jsonify(serialize_document(document))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -54,10 +73,11 @@ def get_document(id):
 #@requires_auth
 def create_document():
     try:
-        data = DocumentSchema.load(request.json)
+        data = load_document(request.json)
         
         # Set initial availability
         data['available'] = True
+        data.update(new_record_fields())
         
         # Check if ISBN already exists (if provided)
         if data.get('isbn'):
@@ -65,14 +85,17 @@ def create_document():
                 return jsonify({'error': 'ISBN already exists'}), 400
         
         result = mongo.db.documents.insert_one(data)
+        records_changed(documents=[result.inserted_id])
         
         # Get the created document
         document = mongo.db.documents.find_one({'_id': result.inserted_id})
         
         return jsonify({
             'message': 'Document created successfully',
-            'data': DocumentSchema.dump(document)
+            'data': serialize_document(document)
         }), 201
+    except ValidationError as err:
+        return jsonify({'validation_errors': err.messages}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -80,7 +103,7 @@ def create_document():
 #@requires_auth
 def update_document(id):
     try:
-        data = DocumentSchema.load(request.json)
+        data = load_document(request.json)
         
         # Check if ISBN already exists for another document
         if data.get('isbn'):
@@ -90,19 +113,25 @@ def update_document(id):
         
         result = mongo.db.documents.update_one(
             {'_id': ObjectId(id)},
-            {'$set': data}
+            touch({'$set': data})
         )
         
-        if result.modified_count == 0:
+        if result.matched_count == 0:
             return jsonify({'error': 'Document not found'}), 404
             
+        # Keep the title copied onto this document's loans in sync
+        sync_document_title(mongo.db, ObjectId(id), data['title'])
+        records_changed(documents=[id], loans=synced_loan_ids(mongo.db, 'document_id', ObjectId(id)))
+            
         # Get updated document
         document = mongo.db.documents.find_one({'_id': ObjectId(id)})
         
         return jsonify({
             'message': 'Document updated successfully',
-            'data': DocumentSchema.dump(document)
+            'data': serialize_document(document)
         })
+    except ValidationError as err:
+        return jsonify({'validation_errors': err.messages}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -122,6 +151,7 @@ def delete_document(id):
         
         if result.deleted_count == 0:
             return jsonify({'error': 'Document not found'}), 404
+        records_changed(documents=[id])
             
         return jsonify({'message': 'Document deleted successfully'})
     except Exception as e:
@@ -1,13 +1,23 @@
 # app/routes/loans.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from bson import ObjectId
 from datetime import datetime, timedelta
+from marshmallow.exceptions import ValidationError
+from app.conditional import touch
+from app.routes.api import loans_changed, records_changed
 from app.schemas import LoanSchema
+from app.serializers import serialize_loan
+from app.circulation import (
+    OPEN_LOAN_STATUSES, CirculationError, checkout, checkout_batch, checkout_in_transaction, return_batch
+)
 #from app.auth import #@requires_auth
 from app import mongo
 
 bp = Blueprint('loans', __name__)
 
+# Input validation; responses go through app.serializers
+loan_schema = LoanSchema()
+
 @bp.route('/', methods=['GET'])
 #@requires_auth
 def get_loans():
@@ -31,7 +41,7 @@ def get_loans():
         loans = list(mongo.db.loans.find(filter_query).skip(skip).limit(per_page))
         
         return jsonify({
-            'data': LoanSchema.dump(loans, many=True),
+            'data': [serialize_loan(row) for row in loans],
             'total': total,
             'page': page,
             'per_page': per_page,
@@ -47,7 +57,7 @@ def get_loan(id):
         loan = mongo.db.loans.find_one({'_id': ObjectId(id)})
         if not loan:
             return jsonify({'error': 'Loan not found'}), 404
-        return jsonify(LoanSchema.dump(loan))
+        return jsonify(serialize_loan(loan))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -55,51 +65,92 @@ def get_loan(id):
 #@requires_auth
 def create_loan():
     try:
-        data = LoanSchema.load(request.json)
-        
-        # Verify subscriber exists
-        subscriber = mongo.db.subscribers.find_one({'_id': ObjectId(data['subscriber_id'])})
-        if not subscriber:
-            return jsonify({'error': 'Subscriber not found'}), 404
-            
-        # Verify document exists and is available
-        document = mongo.db.documents.find_one({'_id': ObjectId(data['document_id'])})
-        if not document:
-            return jsonify({'error': 'Document not found'}), 404
-        if not document.get('available', False):
-            return jsonify({'error': 'Document is not available'}), 400
-            
-        # Create loan record
-        loan_data = {
-            'subscriber_id': ObjectId(data['subscriber_id']),
-            'document_id': ObjectId(data['document_id']),
-            'loan_date': datetime.utcnow(),
-            'due_date': datetime.utcnow() + timedelta(days=14),
-            'status': 'active'
-        }
-        
-        # Update document availability
-        mongo.db.documents.update_one(
-            {'_id': ObjectId(data['document_id'])},
-            {'$set': {'available': False}}
-        )
-        
-        # Update subscriber's current loans
-        mongo.db.subscribers.update_one(
-            {'_id': ObjectId(data['subscriber_id'])},
-            {'$push': {'current_loans': loan_data}}
-        )
-        
-        # Create loan record
-        result = mongo.db.loans.insert_one(loan_data)
-        
-        # Get the created loan
-        loan = mongo.db.loans.find_one({'_id': result.inserted_id})
+        data = loan_schema.load(request.json)
+        subscriber_id = ObjectId(data['subscriber_id'])
+        document_id = ObjectId(data['document_id'])
+
+        # Due back in 14 days. The document is claimed atomically, so
+        # concurrent checkouts of the same item cannot both succeed
+        loan_date = datetime.utcnow()
+        due_date = loan_date + timedelta(days=14)
+        if current_app.config['LOANS_USE_TRANSACTIONS']:
+            loan = checkout_in_transaction(mongo.cx, mongo.db, subscriber_id, document_id, loan_date, due_date)
+        else:
+            loan = checkout(mongo.db, subscriber_id, document_id, loan_date, due_date)
+        records_changed(documents=[document_id], subscribers=[subscriber_id], loans=[loan['_id']])
         
         return jsonify({
             'message': 'Loan created successfully',
-            'data': LoanSchema.dump(loan)
+            'data': serialize_loan(loan)
         }), 201
+    except ValidationError as err:
+        return jsonify({'validation_errors': err.messages}), 400
+    except CirculationError as e:
+        return jsonify({'error': e.message}), e.status_code
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/batch', methods=['POST'])
+#@requires_auth
+def create_loans_batch():
+    try:
+        data = request.json
+        if not data.get('subscriber_id'):
+            return jsonify({'error': 'subscriber_id is required'}), 400
+        if not isinstance(data.get('document_ids'), list) or not data['document_ids']:
+            return jsonify({'error': 'document_ids must be a non-empty list'}), 400
+
+        # Same terms as a single checkout: due back in 14 days
+        loan_date = datetime.utcnow()
+        results = checkout_batch(
+            mongo.db,
+            ObjectId(data['subscriber_id']),
+            data['document_ids'],
+            loan_date,
+            loan_date + timedelta(days=14)
+        )
+        checked_out = sum(1 for result in results if result['status'] == 'checked_out')
+        if checked_out:
+            records_changed(
+                documents=[result['document_id'] for result in results if result['status'] == 'checked_out'],
+                subscribers=[data['subscriber_id']],
+                loans=[]
+            )
+
+        return jsonify({
+            'message': f'{checked_out} of {len(results)} documents checked out',
+            'checked_out': checked_out,
+            'failed': len(results) - checked_out,
+            'results': results
+        }), 201 if checked_out else 400
+    except CirculationError as e:
+        return jsonify({'error': e.message}), e.status_code
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/return', methods=['POST'])
+#@requires_auth
+def return_loans_batch():
+    try:
+        data = request.json or {}
+        loan_ids = data.get('loan_ids', [])
+        document_ids = data.get('document_ids', [])
+        if not isinstance(loan_ids, list) or not isinstance(document_ids, list) or not (loan_ids or document_ids):
+            return jsonify({'error': 'Provide a non-empty loan_ids or document_ids list'}), 400
+
+        results = return_batch(mongo.db, loan_ids, document_ids)
+        returned = sum(1 for result in results if result['status'] == 'returned')
+        if returned:
+            loans_changed([ObjectId(result['loan_id']) for result in results if result['status'] == 'returned'])
+
+        return jsonify({
+            'message': f'{returned} of {len(results)} items returned',
+            'returned': returned,
+            'failed': len(results) - returned,
+            'results': results
+        })
+    except CirculationError as e:
+        return jsonify({'error': e.message}), e.status_code
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -107,40 +158,18 @@ def create_loan():
 #@requires_auth
 def return_loan(id):
     try:
-        loan = mongo.db.loans.find_one({'_id': ObjectId(id)})
-        if not loan:
+        # Same bulk path as the book drop: loan, document and the
+        # subscriber's current_loans/loan_history in one write each
+        result = return_batch(mongo.db, [id])[0]
+        if result['status'] in ('not_found', 'invalid_id'):
             return jsonify({'error': 'Loan not found'}), 404
-            
-        if loan['status'] != 'active':
+        if result['status'] != 'returned':
             return jsonify({'error': 'Loan is not active'}), 400
-            
-        # Update loan status
-        mongo.db.loans.update_one(
-            {'_id': ObjectId(id)},
-            {
-                '$set': {
-                    'status': 'returned',
-                    'return_date': datetime.utcnow()
-                }
-            }
-        )
-        
-        # Update document availability
-        mongo.db.documents.update_one(
-            {'_id': loan['document_id']},
-            {'$set': {'available': True}}
-        )
-        
-        # Update subscriber's loans
-        mongo.db.subscribers.update_one(
-            {'_id': loan['subscriber_id']},
-            {
-                '$pull': {'current_loans': {'document_id': loan['document_id']}},
-                '$push': {'loan_history': loan}
-            }
-        )
+        loans_changed([ObjectId(id)])
         
         return jsonify({'message': 'Loan returned successfully'})
+    except CirculationError as e:
+        return jsonify({'error': e.message}), e.status_code
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -152,17 +181,25 @@ def extend_loan(id):
         if not loan:
             return jsonify({'error': 'Loan not found'}), 404
             
-        if loan['status'] != 'active':
+        if loan['status'] not in OPEN_LOAN_STATUSES:
             return jsonify({'error': 'Can only extend active loans'}), 400
             
         # Extend due date by 7 days
         new_due_date = loan['due_date'] + timedelta(days=7)
+        # An overdue loan extended past today is active again
+        status = 'overdue' if new_due_date < datetime.utcnow() else 'active'
         
         mongo.db.loans.update_one(
-            {'_id': ObjectId(id)},
-            {'$set': {'due_date': new_due_date}}
+            {'_id': loan['_id']},
+            touch({'$set': {'due_date': new_due_date, 'status': status}})
         )
+        # And the copy embedded in the subscriber's current_loans
+        mongo.db.subscribers.update_one(
+            {'_id': loan['subscriber_id'], 'current_loans._id': loan['_id']},
+            touch({'$set': {'current_loans.$.due_date': new_due_date, 'current_loans.$.status': status}})
+        )
+        records_changed(loans=[loan['_id']], subscribers=[loan['subscriber_id']])
         
         return jsonify({'message': 'Loan extended successfully'})
     except Exception as e:
-        return jsonify({'error': str(e)}),
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
@@ -1,14 +1,22 @@
 # app/routes/subscribers.py
 from flask import Blueprint, request, jsonify
 from bson import ObjectId
-from datetime import datetime, timezone
+from datetime import datetime
 from marshmallow.exceptions import ValidationError
 #from app.auth import requires_auth
 from app import mongo
+from app.conditional import new_record_fields, touch
+from app.read_model import sync_subscriber_name, synced_loan_ids
+from app.routes.api import records_changed
 from app.schemas import SubscriberSchema
+from app.serializers import serialize_subscriber
+from app.suggest import SUGGEST_FIELD, subscriber_suggest_keys
 
 bp = Blueprint('subscribers', __name__)
 
+# Input validation; responses go through app.serializers
+subscriber_schema = SubscriberSchema()
+
 # Default pagination values
 DEFAULT_PAGE = 1
 DEFAULT_PER_PAGE = 10
@@ -27,7 +35,6 @@ def get_subscribers():
         skip = (page - 1) * per_page
 
         total = mongo.db.subscribers.count_documents({})
-        print(f"Total subscribers: {total}")  # Debug statement
         subscribers = list(mongo.db.subscribers.find().skip(skip).limit(per_page))
         
         # Pagination flags
@@ -35,7 +42,7 @@ def get_subscribers():
         has_prev = page > 1
 
         return jsonify({
-            'data': SubscriberSchema.dump(subscribers, many=True),
+            'data': [serialize_subscriber(row) for row in subscribers],
             'total': total,
             'page': page,
             'per_page': per_page,
@@ -53,7 +60,7 @@ def get_subscriber(id):
         subscriber = mongo.db.subscribers.find_one({'_id': ObjectId(id)})
         if not subscriber:
             return jsonify({'error': 'Subscriber not found'}), 404
-        return jsonify(SubscriberSchema.dump(subscriber))
+        return jsonify(serialize_subscriber(subscriber))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -61,25 +68,28 @@ def get_subscriber(id):
 #@requires_auth
 def create_subscriber():
     try:
-        data = SubscriberSchema.load(request.json)
+        data = subscriber_schema.load(request.json)
         
         # Add creation timestamp and initialize lists
-        data['inscription_date'] = datetime.now(timezone.utc).isoformat()
+        data['inscription_date'] = datetime.utcnow()
         data['current_loans'] = []
         data['loan_history'] = []
+        data[SUGGEST_FIELD] = subscriber_suggest_keys(data)
+        data.update(new_record_fields())
         
         # Check if email already exists
         if mongo.db.subscribers.find_one({'email': data['email']}):
             return jsonify({'error': 'Email already registered'}), 400
         
         result = mongo.db.subscribers.insert_one(data)
+        records_changed(subscribers=[result.inserted_id])
         
         # Get the created subscriber
         subscriber = mongo.db.subscribers.find_one({'_id': result.inserted_id})
         
         return jsonify({
             'message': 'Subscriber created successfully',
-            'data': SubscriberSchema.dump(subscriber)
+            'data': serialize_subscriber(subscriber)
         }), 201
     except ValidationError as err:
         return jsonify({'validation_errors': err.messages}), 400
@@ -90,27 +100,32 @@ def create_subscriber():
 #@requires_auth
 def update_subscriber(id):
     try:
-        data = SubscriberSchema.load(request.json)
+        data = subscriber_schema.load(request.json)
         
         # Check if email already exists for another subscriber
         existing = mongo.db.subscribers.find_one({'email': data['email'], '_id': {'$ne': ObjectId(id)}})
         if existing:
             return jsonify({'error': 'Email already registered to another subscriber'}), 400
         
+        data[SUGGEST_FIELD] = subscriber_suggest_keys(data)
         result = mongo.db.subscribers.update_one(
             {'_id': ObjectId(id)},
-            {'$set': data}
+            touch({'$set': data})
         )
         
-        if result.modified_count == 0:
+        if result.matched_count == 0:
             return jsonify({'error': 'Subscriber not found'}), 404
+
+        # Keep the name copied onto this subscriber's loans in sync
+        sync_subscriber_name(mongo.db, ObjectId(id), data)
+        records_changed(subscribers=[id], loans=synced_loan_ids(mongo.db, 'subscriber_id', ObjectId(id)))
             
         # Get updated subscriber
         subscriber = mongo.db.subscribers.find_one({'_id': ObjectId(id)})
         
         return jsonify({
             'message': 'Subscriber updated successfully',
-            'data': SubscriberSchema.dump(subscriber)
+            'data': serialize_subscriber(subscriber)
         })
     except ValidationError as err:
         return jsonify({'validation_errors': err.messages}), 400
@@ -133,6 +148,7 @@ def delete_subscriber(id):
         
         if result.deleted_count == 0:
             return jsonify({'error': 'Subscriber not found'}), 404
+        records_changed(subscribers=[id])
             
         return jsonify({'message': 'Subscriber deleted successfully'})
     except Exception as e:
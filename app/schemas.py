@@ -1,6 +1,8 @@
 # schemas.py
 from marshmallow import Schema, fields, validate
 
+from app.indexes import ensure_indexes
+
 class SubscriberSchema(Schema):
     _id = fields.Str(dump_only=True)
     first_name = fields.Str(required=True, validate=validate.Length(min=2))
@@ -33,7 +35,5 @@ class LoanSchema(Schema):
 
 # MongoDB collection initialization
 def init_db(mongo):
-    # Create indexes
-    mongo.db.subscribers.create_index('email', unique=True)
-    mongo.db.documents.create_index('isbn', unique=True, sparse=True)
-    mongo.db.loans.create_index([('subscriber_id', 1), ('document_id', 1)])
\ No newline at end of file
+    # Create indexes (see app/indexes.py)
+    ensure_indexes(mongo.db)
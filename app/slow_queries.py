@@ -0,0 +1,235 @@
+# slow_queries.py
+# Slow operation log: a pymongo CommandListener that keeps the MongoDB
+# commands slower than SLOW_QUERY_MS in a bounded ring buffer, with the
+# route that sent them and the shape of their filter (values redacted).
+# Optionally, the first occurrence of each shape is explained
+# ("executionStats") on a background thread. Served at
+# GET /api/admin/slow-queries.
+import hashlib
+import json
+import logging
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+
+from flask import has_request_context, request
+from pymongo import monitoring
+
+from app.index_advisor import winning_stages
+
+DEFAULT_THRESHOLD_MS = 100
+DEFAULT_SIZE = 200
+# Distinct shapes explained per process; later new shapes are logged only
+MAX_EXPLAINED_SHAPES = 500
+
+# Commands explain() accepts; the others (getMore, insert, ...) are logged only
+EXPLAINABLE = ('find', 'aggregate', 'count', 'distinct', 'update', 'delete', 'findAndModify')
+# Session, transaction and concern fields that explain() refuses
+_NOT_EXPLAINED = ('lsid', 'txnNumber', 'autocommit', 'startTransaction', 'readConcern', 'writeConcern')
+
+REDACTED = '?'
+
+logger = logging.getLogger(__name__)
+
+
+def redact(value):
+    """Keep field names and operators, replace every value with '?'.
+
+    Lists of sub-documents ($and, $or, pipelines) are walked; other lists
+    ($in values) become a single '?'.
+    """
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and any(isinstance(item, dict) for item in value):
+        return [redact(item) for item in value]
+    return REDACTED
+
+
+def command_shape(command_name, command):
+    """Redacted filter (or pipeline) of a command, with its sort as is"""
+    if command_name == 'find':
+        shape = {'filter': redact(command.get('filter', {}))}
+        if command.get('sort'):
+            shape['sort'] = dict(command['sort'])
+        return shape
+    if command_name == 'aggregate':
+        return {'pipeline': redact(command.get('pipeline', []))}
+    if command_name in ('count', 'distinct', 'findAndModify'):
+        shape = {'filter': redact(command.get('query') or {})}
+        if command_name == 'distinct':
+            shape['key'] = command.get('key')
+        return shape
+    if command_name in ('update', 'delete'):
+        statements = command.get('updates' if command_name == 'update' else 'deletes') or [{}]
+        return {'filter': redact(statements[0].get('q', {}))}
+    return {}
+
+
+def shape_id(collection, command_name, shape):
+    """Short stable id of a query shape"""
+    key = json.dumps([collection, command_name, shape], sort_keys=True, default=str)
+    return hashlib.sha1(key.encode()).hexdigest()[:12]
+
+
+def _find_execution_stats(explain):
+    # Under queryPlanner for find, under the $cursor stage for aggregate
+    if isinstance(explain, dict):
+        if isinstance(explain.get('executionStats'), dict):
+            return explain['executionStats']
+        values = explain.values()
+    elif isinstance(explain, list):
+        values = explain
+    else:
+        return None
+    for value in values:
+        found = _find_execution_stats(value)
+        if found is not None:
+            return found
+    return None
+
+
+def explain_summary(explain):
+    """Plan stages and work counters of an explain('executionStats') result"""
+    stats = _find_execution_stats(explain) or {}
+    return {
+        # Aggregate explains also list the stages under executionStats
+        'stages': list(dict.fromkeys(winning_stages(explain.get('queryPlanner', explain)))),
+        'n_returned': stats.get('nReturned'),
+        'keys_examined': stats.get('totalKeysExamined'),
+        'docs_examined': stats.get('totalDocsExamined'),
+        'execution_time_ms': stats.get('executionTimeMillis'),
+    }
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Record commands slower than `threshold_ms` (0: every command).
+
+    Events of a command arrive on the thread that sent it, so the route is
+    read from the request context when the command starts.
+    """
+
+    def __init__(self, threshold_ms=DEFAULT_THRESHOLD_MS, size=DEFAULT_SIZE, explain=False):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.client = None
+        self.recorded = 0
+        self._entries = deque(maxlen=size)
+        self._started = {}
+        self._explains = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=100)
+        self._thread = None
+
+    def attach(self, client):
+        """Client used to run the explains"""
+        self.client = client
+
+    def started(self, event):
+        if event.command_name == 'explain':
+            return
+        route = None
+        if has_request_context():
+            rule = request.url_rule.rule if request.url_rule is not None else request.path
+            route = f'{request.method} {rule}'
+        self._started[(event.connection_id, event.request_id)] = (route, event.command)
+
+    def _finished(self, event, outcome):
+        started = self._started.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < self.threshold_ms:
+            return
+        route, command = started
+        command_name = event.command_name
+        collection = command.get('collection', '') if command_name == 'getMore' else command.get(command_name)
+        if not isinstance(collection, str):
+            collection = ''
+        shape = command_shape(command_name, command)
+        entry = {
+            'at': datetime.utcnow(),
+            'route': route,
+            'database': event.database_name,
+            'collection': collection,
+            'command': command_name,
+            'shape': shape,
+            'shape_id': shape_id(collection, command_name, shape),
+            'duration_ms': round(duration_ms, 3),
+            'outcome': outcome,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self.recorded += 1
+        logger.warning(
+            "Slow MongoDB %s on %s (%.1f ms, %s): %s",
+            command_name, collection, duration_ms, route or 'no request', json.dumps(shape, default=str)
+        )
+        if self.explain and command_name in EXPLAINABLE:
+            self._queue_explain(entry, event.database_name, command)
+
+    def succeeded(self, event):
+        self._finished(event, 'success')
+
+    def failed(self, event):
+        self._finished(event, 'failure')
+
+    def _queue_explain(self, entry, database, command):
+        with self._lock:
+            if entry['shape_id'] in self._explains or len(self._explains) >= MAX_EXPLAINED_SHAPES:
+                return
+            # Claimed now so that the shape is explained once
+            self._explains[entry['shape_id']] = {
+                'shape_id': entry['shape_id'],
+                'route': entry['route'],
+                'collection': entry['collection'],
+                'command': entry['command'],
+                'shape': entry['shape'],
+                'explain': None,
+            }
+            # Started lazily, in the process that serves (not a preloading master)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run_explains, name='slow-query-explain', daemon=True)
+                self._thread.start()
+        body = {key: value for key, value in command.items() if not key.startswith('$') and key not in _NOT_EXPLAINED}
+        try:
+            self._queue.put_nowait((entry['shape_id'], database, body))
+        except queue.Full:
+            with self._lock:
+                del self._explains[entry['shape_id']]
+
+    def _run_explains(self):
+        # On its own thread: explaining inside the listener would take a
+        # second pooled connection while the request thread holds one
+        while True:
+            key, database, body = self._queue.get()
+            try:
+                if body.get('pipeline') and any('$out' in stage or '$merge' in stage for stage in body['pipeline']):
+                    result = {'error': 'not explained: the pipeline writes'}
+                else:
+                    explain = self.client[database].command('explain', body, verbosity='executionStats')
+                    result = explain_summary(explain)
+            except Exception as e:
+                logger.exception("Error explaining slow query %s", key)
+                result = {'error': str(e)}
+            with self._lock:
+                if key in self._explains:
+                    self._explains[key]['explain'] = result
+
+    def report(self, limit=None):
+        """Entries newest first, and the explain of each shape seen"""
+        with self._lock:
+            entries = list(reversed(self._entries))
+            explains = [dict(explain) for explain in self._explains.values()]
+        return {
+            'threshold_ms': self.threshold_ms,
+            'recorded': self.recorded,
+            'entries': entries[:limit] if limit else entries,
+            'explains': explains,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._explains.clear()
+            self.recorded = 0
@@ -0,0 +1,96 @@
+# streaming.py
+# Stream large result sets to the client without materialising them
+import json as std_json
+import zlib
+from datetime import date
+
+from bson import ObjectId
+from flask import Response, json, stream_with_context
+
+# Serialized rows are grouped into chunks of roughly this size before being
+# handed to the WSGI server
+CHUNK_SIZE = 64 * 1024
+
+
+def _buffered(pieces):
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def iter_json_array(rows, serialize):
+    """Yield a JSON array one element at a time"""
+    yield '['
+    for index, row in enumerate(rows):
+        if index:
+            yield ','
+        yield json.dumps(serialize(row))
+    yield ']'
+
+
+def iter_ndjson(rows, serialize):
+    """Yield one JSON document per line"""
+    for row in rows:
+        yield json.dumps(serialize(row))
+        yield '\n'
+
+
+def stream_rows(rows, serialize, fmt='json'):
+    """Build a streamed Response for `rows` as a JSON array or NDJSON"""
+    if fmt == 'ndjson':
+        body, mimetype = iter_ndjson(rows, serialize), 'application/x-ndjson'
+    else:
+        body, mimetype = iter_json_array(rows, serialize), 'application/json'
+    return Response(stream_with_context(_buffered(body)), mimetype=mimetype)
+
+
+def _export_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def export_line(row):
+    """One NDJSON line for an exported document (ObjectId as str, ISO dates)"""
+    return std_json.dumps(row, default=_export_default, ensure_ascii=False) + '\n'
+
+
+def iter_gzip(chunks, level=6):
+    """Gzip a stream of text chunks incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(rows, compress=False):
+    """Buffered NDJSON chunks for `rows`, optionally gzip-compressed"""
+    chunks = _buffered(export_line(row) for row in rows)
+    if compress:
+        return iter_gzip(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
+
+
+def export_response(rows, filename, compress=False):
+    """Streamed NDJSON download (application/gzip when compressed)"""
+    if compress:
+        filename, mimetype = f'{filename}.gz', 'application/gzip'
+    else:
+        mimetype = 'application/x-ndjson'
+    return Response(
+        stream_with_context(iter_export(rows, compress)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,102 @@
+# suggest.py
+# Search-as-you-type on normalized prefix keys.
+#
+# Each document/subscriber stores `suggest_keys`: the lowercase, accent-free
+# form of its labels (whole and word by word). A B-tree index on that array
+# turns a prefix lookup into a single index range scan.
+import re
+import unicodedata
+
+from pymongo import UpdateOne
+
+from app.conditional import touch
+
+SUGGEST_FIELD = 'suggest_keys'
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 25
+BACKFILL_BATCH_SIZE = 1000
+
+_non_word = re.compile(r'[^\w@.]+')
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse punctuation/whitespace"""
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _non_word.sub(' ', text.lower()).strip()
+
+
+def suggest_keys(*values):
+    """Keys for the given labels: each full label plus each word in it"""
+    keys = []
+    for value in values:
+        if not value:
+            continue
+        normalized = normalize(value)
+        for key in [normalized] + normalized.split():
+            if key and key not in keys:
+                keys.append(key)
+    return keys
+
+
+def document_suggest_keys(document):
+    return suggest_keys(document.get('title'), document.get('author'))
+
+
+def subscriber_suggest_keys(subscriber):
+    full_name = ' '.join(part for part in (subscriber.get('first_name'), subscriber.get('last_name')) if part)
+    return suggest_keys(full_name, subscriber.get('email'))
+
+
+def document_label(document):
+    if document.get('author'):
+        return f"{document.get('title', '')} — {document['author']}"
+    return document.get('title', '')
+
+
+def subscriber_label(subscriber):
+    label = ' '.join(part for part in (subscriber.get('first_name'), subscriber.get('last_name')) if part)
+    if subscriber.get('email'):
+        label = f"{label} <{subscriber['email']}>"
+    return label
+
+
+def prefix_filter(prefix):
+    """Index range covering every key that starts with `prefix`.
+
+    $elemMatch makes both bounds apply to the same array element, so the
+    multikey index bounds are intersected into one tight range.
+    """
+    prefix = normalize(prefix)
+    return {SUGGEST_FIELD: {'$elemMatch': {'$gte': prefix, '$lt': prefix + '\uffff'}}}
+
+
+def suggest(collection, prefix, fields, label, limit=DEFAULT_LIMIT, extra_filter=None):
+    """Return [{'_id', 'label'}] for records with a key starting with `prefix`"""
+    filter_query = prefix_filter(prefix)
+    if extra_filter:
+        filter_query.update(extra_filter)
+    rows = collection.find(filter_query, fields).limit(limit)
+    return [{'_id': str(row['_id']), 'label': label(row)} for row in rows]
+
+
+def backfill_suggest_keys(collection, keys_for, fields, batch_size=BACKFILL_BATCH_SIZE):
+    """(Re)compute suggest_keys on every record of a collection.
+
+    Records whose keys are already right are left alone, so their version
+    (and ETag) does not change.
+    """
+    modified = 0
+    requests = []
+    for row in collection.find({}, fields, batch_size=batch_size):
+        keys = keys_for(row)
+        requests.append(UpdateOne(
+            {'_id': row['_id'], SUGGEST_FIELD: {'$ne': keys}},
+            touch({'$set': {SUGGEST_FIELD: keys}})
+        ))
+        if len(requests) >= batch_size:
+            modified += collection.bulk_write(requests, ordered=False).modified_count
+            requests = []
+    if requests:
+        modified += collection.bulk_write(requests, ordered=False).modified_count
+    return modified
@@ -0,0 +1,5 @@
+# asgi.py
+# Async entry point: hypercorn --workers 4 --bind 0.0.0.0:5000 asgi:app
+from app.async_api import create_async_app
+
+app = create_async_app()
@@ -0,0 +1,497 @@
+# api_suite.py
+# Load test of every /api route. Seeds a benchmark database to the requested
+# sizes with scripts/generate_test_data.py, serves the app in a child
+# process (or targets --url), then runs each scenario with --concurrency
+# closed-loop clients for --duration seconds.
+# Writes a JSON report with throughput, p50/p95/p99 latency and MongoDB
+# commands per request for every route; with --baseline, exits 1 when a
+# route got slower or issues more commands than in the stored report.
+#
+#   python benchmarks/api_suite.py --mongo-uri mongodb://localhost:27017/mediatheque_bench \
+#       --documents 20000 --subscribers 5000 --loans 40000 --save-baseline benchmarks/baseline.json
+#   python benchmarks/api_suite.py --mongo-uri ... --baseline benchmarks/baseline.json --output run.json
+#
+# The database is dropped and reseeded on every run; the suite refuses to
+# touch a database it did not seed. Baselines are only comparable on the
+# same host, sizes and server, so none is checked in.
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+from bson import ObjectId
+from pymongo import MongoClient, monitoring
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from http_load import percentile
+from scripts.generate_test_data import TYPES, DatasetPlan, generate_dataset
+
+SEED_MARKER = 'bench_meta'
+# Ids, title words and names the scenarios draw from
+SAMPLE_SIZE = 10000
+OPS_PATH = '/_bench/ops'
+DEFAULT_TOLERANCE = 0.25
+# Commands per request may grow by this much before it counts as a
+# regression (cache hits make it fractional)
+OPS_SLACK = 0.5
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def sample(db):
+    """Ids, title words and subscriber names of the seeded data"""
+    ids = {
+        name: [row['_id'] for row in db[name].find({}, {'_id': 1}).sort('_id', 1).limit(SAMPLE_SIZE)]
+        for name in ('documents', 'subscribers', 'loans')
+    }
+    titles = db.documents.find({}, {'title': 1}).sort('_id', 1).limit(SAMPLE_SIZE)
+    ids['words'] = sorted({word.lower() for row in titles for word in row['title'].split() if len(word) > 3})
+    ids['names'] = sorted({
+        (row['first_name'], row['last_name'])
+        for row in db.subscribers.find({}, {'first_name': 1, 'last_name': 1}).sort('_id', 1).limit(SAMPLE_SIZE)
+    })
+    return ids
+
+
+def prepare_database(mongo_uri, sizes, seed, workers):
+    """Seed the database of `mongo_uri` with scripts/generate_test_data.py,
+    unless it holds data we did not put there. Returns the sample of the
+    seeded data and the server version."""
+    client = MongoClient(mongo_uri)
+    db = client.get_default_database()
+    names = set(db.list_collection_names())
+    if names and SEED_MARKER not in names:
+        sys.exit(f"Database '{db.name}' has data and was not seeded by this suite; pick another --mongo-uri")
+
+    db[SEED_MARKER].replace_one({'_id': 'seed'}, {'_id': 'seed', 'seed': seed, **sizes}, upsert=True)
+    plan = DatasetPlan(
+        seed, sizes['subscribers'], sizes['documents'], sizes['loans'],
+        datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0),
+        history_days=730, skew=0.9, batch_size=5000
+    )
+    report = generate_dataset(mongo_uri, plan, workers, log=lambda message: print(message, file=sys.stderr))
+    print(f"Seeded {report['rows']} in {report['generate_s'] + report['embed_s'] + report['index_s']:.1f}s",
+          file=sys.stderr)
+
+    ids = sample(db)
+    version = client.server_info()['version']
+    client.close()
+    return ids, version
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Count the MongoDB commands sent while serving each route. PyMongo
+    publishes command events on the thread running the command, i.e. the
+    request thread."""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = defaultdict(int)
+            self.commands = defaultdict(int)
+
+    def started(self, event):
+        route = getattr(self.local, 'route', None)
+        if route is not None:
+            with self.lock:
+                self.commands[route] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class KeepAliveHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args):
+        pass
+
+
+def serve(mongo_uri, port, ready):
+    """Child process: the app on a threaded server, plus OPS_PATH"""
+    from flask import jsonify, request
+
+    from app import create_app
+
+    counter = CommandCounter()
+    monitoring.register(counter)
+    app = create_app({"MONGO_URI": mongo_uri})
+
+    @app.before_request
+    def start_counting():
+        if request.url_rule is not None and request.path != OPS_PATH:
+            # Left set after the request, so that the getMore commands of a
+            # streamed response count too
+            counter.local.route = f"{request.method} {request.url_rule.rule}"
+            with counter.lock:
+                counter.requests[counter.local.route] += 1
+
+    @app.route(OPS_PATH, methods=['GET', 'DELETE'])
+    def bench_ops():
+        with counter.lock:
+            ops = {route: {"requests": count, "commands": counter.commands[route]}
+                   for route, count in counter.requests.items()}
+        if request.method == 'DELETE':
+            counter.reset()
+        return jsonify(ops)
+
+    server = make_server('127.0.0.1', port, app, threaded=True, request_handler=KeepAliveHandler)
+    ready.set()
+    server.serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Client:
+    """One keep-alive connection; records the latency of each call by route"""
+
+    def __init__(self, host, port, samples):
+        self.host = host
+        self.port = port
+        self.samples = samples
+        self.connection = http.client.HTTPConnection(host, port, timeout=60)
+
+    def call(self, route, method, path, body=None, content_type='application/json'):
+        headers = {'Accept-Encoding': 'gzip'}
+        if body is not None:
+            headers['Content-Type'] = content_type
+            if content_type == 'application/json':
+                body = json.dumps(body)
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self.samples[route].append((time.perf_counter() - started, False))
+            return None
+        self.samples[route].append((time.perf_counter() - started, response.status < 400))
+        if response.getheader('Content-Type', '').startswith('application/json') and \
+                response.getheader('Content-Encoding') is None:
+            return json.loads(payload)
+        return None
+
+    def close(self):
+        self.connection.close()
+
+
+# Scenarios: fn(client, rng, ids) does one iteration. The route labels are
+# "METHOD rule", as the server counts them.
+def get(route, make_path):
+    def scenario(client, rng, ids):
+        client.call(route, 'GET', make_path(rng, ids))
+    return scenario
+
+
+def word(rng, ids):
+    return rng.choice(ids['words'])
+
+
+def person(rng, ids):
+    first_name, last_name = rng.choice(ids['names'])
+    return {"first_name": first_name, "last_name": last_name, "email": f"{ObjectId()}@bench.example"}
+
+
+def new_title(rng, ids):
+    return f"{word(rng, ids)} {word(rng, ids)}".capitalize()
+
+
+def subscriber_lifecycle(client, rng, ids):
+    created = client.call('POST /api/subscribers', 'POST', '/api/subscribers', person(rng, ids))
+    if not created:
+        return
+    path = f"/api/subscribers/{created['id']}"
+    client.call('PUT /api/subscribers/<subscriber_id>', 'PUT', path, person(rng, ids))
+    client.call('DELETE /api/subscribers/<subscriber_id>', 'DELETE', path)
+
+
+def new_document(client, rng, ids):
+    created = client.call('POST /api/documents', 'POST', '/api/documents', {
+        "title": new_title(rng, ids), "author": ' '.join(rng.choice(ids['names'])), "type": "book"
+    })
+    return created and created['id']
+
+
+def document_lifecycle(client, rng, ids):
+    document_id = new_document(client, rng, ids)
+    if not document_id:
+        return
+    path = f"/api/documents/{document_id}"
+    client.call('PUT /api/documents/<document_id>', 'PUT', path, {
+        "title": new_title(rng, ids), "author": ' '.join(rng.choice(ids['names'])), "type": "book"
+    })
+    client.call('DELETE /api/documents/<document_id>', 'DELETE', path)
+
+
+def import_documents(client, rng, ids):
+    rows = [
+        json.dumps({"title": new_title(rng, ids), "author": ' '.join(rng.choice(ids['names'])),
+                    "type": "book", "isbn": f"979{ObjectId()}"})
+        for _ in range(20)
+    ]
+    client.call('POST /api/documents/import', 'POST', '/api/documents/import?format=jsonl',
+                '\n'.join(rows).encode(), 'application/x-ndjson')
+
+
+def loan_cycle(client, rng, ids):
+    """Check out a fresh document, return it, delete the loan"""
+    document_id = new_document(client, rng, ids)
+    if not document_id:
+        return
+    today = datetime.utcnow()
+    created = client.call('POST /api/loans', 'POST', '/api/loans', {
+        "subscriber_id": str(rng.choice(ids['subscribers'])), "document_id": document_id,
+        "loan_date": today.strftime('%Y-%m-%d'), "due_date": (today + timedelta(days=21)).strftime('%Y-%m-%d')
+    })
+    if created:
+        path = f"/api/loans/{created['id']}"
+        client.call('PUT /api/loans/<loan_id>', 'PUT', path, {"status": "returned"})
+        client.call('DELETE /api/loans/<loan_id>', 'DELETE', path)
+    client.call('DELETE /api/documents/<document_id>', 'DELETE', f"/api/documents/{document_id}")
+
+
+def batch_cycle(client, rng, ids):
+    """Check out three fresh documents at once and return them at once"""
+    document_ids = [document_id for document_id in (new_document(client, rng, ids) for _ in range(3)) if document_id]
+    today = datetime.utcnow()
+    client.call('POST /api/loans/batch', 'POST', '/api/loans/batch', {
+        "subscriber_id": str(rng.choice(ids['subscribers'])), "document_ids": document_ids,
+        "loan_date": today.strftime('%Y-%m-%d'), "due_date": (today + timedelta(days=21)).strftime('%Y-%m-%d')
+    })
+    client.call('POST /api/loans/return', 'POST', '/api/loans/return', {"document_ids": document_ids})
+    for document_id in document_ids:
+        client.call('DELETE /api/documents/<document_id>', 'DELETE', f"/api/documents/{document_id}")
+
+
+SCENARIOS = {
+    'index': get('GET /', lambda rng, ids: '/'),
+    'subscribers_all': get('GET /api/subscribers/', lambda rng, ids: '/api/subscribers/'),
+    'subscribers_page': get('GET /api/subscribers/', lambda rng, ids: '/api/subscribers/?cursor=&per_page=20&sort=last_name'),
+    'subscriber': get('GET /api/subscribers/<subscriber_id>',
+                      lambda rng, ids: f"/api/subscribers/{rng.choice(ids['subscribers'])}"),
+    'documents_page': get('GET /api/documents/', lambda rng, ids: f"/api/documents/?page={rng.randint(1, 50)}&per_page=20"),
+    'documents_cursor': get('GET /api/documents/',
+                            lambda rng, ids: f"/api/documents/?cursor=&per_page=20&type={weighted(rng, TYPES)}"),
+    'document': get('GET /api/documents/<document_id>', lambda rng, ids: f"/api/documents/{rng.choice(ids['documents'])}"),
+    'documents_search': get('GET /api/documents/search', lambda rng, ids: f"/api/documents/search?q={word(rng, ids)}"),
+    'documents_facets': get('GET /api/documents/facets', lambda rng, ids: '/api/documents/facets'),
+    'loans_all': get('GET /api/loans/', lambda rng, ids: '/api/loans/'),
+    'loans_page': get('GET /api/loans/', lambda rng, ids: '/api/loans/?cursor=&per_page=20&status=active'),
+    'loan': get('GET /api/loans/<loan_id>', lambda rng, ids: f"/api/loans/{rng.choice(ids['loans'])}"),
+    'subscriber_loans': get('GET /api/loans/subscriber/<subscriber_id>',
+                            lambda rng, ids: f"/api/loans/subscriber/{rng.choice(ids['subscribers'])}"),
+    'document_loans': get('GET /api/loans/document/<document_id>',
+                          lambda rng, ids: f"/api/loans/document/{rng.choice(ids['documents'])}"),
+    'suggest_documents': get('GET /api/suggest/documents', lambda rng, ids: f"/api/suggest/documents?q={word(rng, ids)[:3]}"),
+    'suggest_subscribers': get('GET /api/suggest/subscribers',
+                               lambda rng, ids: f"/api/suggest/subscribers?q={rng.choice(ids['names'])[1][:3]}"),
+    'export_documents': get('GET /api/export/<collection>', lambda rng, ids: '/api/export/documents?fields=title,author'),
+    'cache_stats': get('GET /api/cache/stats', lambda rng, ids: '/api/cache/stats'),
+    # Writes run last: they grow current_loans and the catalogue
+    'subscriber_lifecycle': subscriber_lifecycle,
+    'document_lifecycle': document_lifecycle,
+    'import_documents': import_documents,
+    'loan_cycle': loan_cycle,
+    'batch_cycle': batch_cycle,
+}
+
+
+def run_scenario(url, scenario, ids, concurrency, duration, seed):
+    """Run `scenario` from `concurrency` clients; returns per-route samples"""
+    parts = urlsplit(url)
+    samples = defaultdict(list)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client_loop(index):
+        rng = random.Random(seed * 1000 + index)
+        local = defaultdict(list)
+        client = Client(parts.hostname, parts.port or 80, local)
+        while time.perf_counter() < deadline:
+            scenario(client, rng, ids)
+        client.close()
+        with lock:
+            for route, values in local.items():
+                samples[route].extend(values)
+
+    clients = [threading.Thread(target=client_loop, args=(i,), daemon=True) for i in range(concurrency)]
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples, elapsed, ops):
+    routes = {}
+    for route, values in sorted(samples.items()):
+        latencies = sorted(latency for latency, _ in values)
+        summary = {
+            'requests': len(values),
+            'errors': sum(1 for _, ok in values if not ok),
+            'throughput_rps': round(len(values) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'ops_per_request': None,
+        }
+        if ops is not None and ops.get(route, {}).get('requests'):
+            summary['ops_per_request'] = round(ops[route]['commands'] / ops[route]['requests'], 2)
+        routes[route] = summary
+    return routes
+
+
+def fetch_ops(url, method='GET'):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+    connection.request(method, OPS_PATH)
+    ops = json.loads(connection.getresponse().read())
+    connection.close()
+    return ops
+
+
+def compare(report, baseline, tolerance):
+    """Regressions of `report` against `baseline`, as messages"""
+    if report['params'] != baseline['params']:
+        return [f"parameters differ from the baseline: {baseline['params']} != {report['params']}"]
+    regressions = []
+    for name, routes in baseline['scenarios'].items():
+        for route, before in routes.items():
+            after = report['scenarios'].get(name, {}).get(route)
+            if after is None:
+                continue
+            label = f"{name} / {route}"
+            if after['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{label}: p95 {before['p95_ms']} -> {after['p95_ms']} ms")
+            if after['throughput_rps'] < before['throughput_rps'] * (1 - tolerance):
+                regressions.append(f"{label}: throughput {before['throughput_rps']} -> {after['throughput_rps']} req/s")
+            if before['ops_per_request'] is not None and after['ops_per_request'] is not None and \
+                    after['ops_per_request'] > before['ops_per_request'] + OPS_SLACK:
+                regressions.append(f"{label}: {before['ops_per_request']} -> {after['ops_per_request']} commands/request")
+            if after['errors'] > before['errors']:
+                regressions.append(f"{label}: {before['errors']} -> {after['errors']} errors")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test every /api route')
+    parser.add_argument('--mongo-uri', default=os.environ.get('BENCH_MONGO_URI', 'mongodb://localhost:27017/mediatheque_bench'),
+                        help='benchmark database (dropped and reseeded)')
+    parser.add_argument('--url', help='benchmark a running server instead of starting one (no command counts)')
+    parser.add_argument('--documents', type=int, default=10000)
+    parser.add_argument('--subscribers', type=int, default=2000)
+    parser.add_argument('--loans', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--seed-workers', type=int, default=1, help='processes generating the data')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients per scenario')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per scenario')
+    parser.add_argument('--scenario', action='append', dest='scenarios', choices=sorted(SCENARIOS),
+                        help='run only these scenarios (repeatable)')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--baseline', help='report to compare against; exit 1 on regression')
+    parser.add_argument('--save-baseline', help='also write the report here, as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed relative p95/throughput change (default 0.25)')
+    args = parser.parse_args()
+
+    sizes = {'documents': args.documents, 'subscribers': args.subscribers, 'loans': args.loans}
+    ids, mongodb_version = prepare_database(args.mongo_uri, sizes, args.seed, args.seed_workers)
+
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        ready = multiprocessing.Event()
+        server = multiprocessing.Process(target=serve, args=(args.mongo_uri, port, ready), daemon=True)
+        server.start()
+        if not ready.wait(30):
+            sys.exit("The app did not start")
+        url = f"http://127.0.0.1:{port}"
+
+    scenarios = {}
+    try:
+        for name, scenario in SCENARIOS.items():
+            if args.scenarios and name not in args.scenarios:
+                continue
+            # Warm-up: pool connections, caches, compiled serializers
+            run_scenario(url, scenario, ids, min(args.concurrency, 2), 1, args.seed)
+            if server is not None:
+                fetch_ops(url, 'DELETE')
+            samples, elapsed = run_scenario(url, scenario, ids, args.concurrency, args.duration, args.seed)
+            scenarios[name] = summarize(samples, elapsed, fetch_ops(url) if server is not None else None)
+            for route, summary in scenarios[name].items():
+                print(
+                    f"{name:>22} {route:<45} {summary['throughput_rps']:8.1f} req/s  "
+                    f"p50 {summary['p50_ms']:7.1f}  p95 {summary['p95_ms']:7.1f}  p99 {summary['p99_ms']:7.1f} ms  "
+                    f"ops {summary['ops_per_request']}  errors {summary['errors']}",
+                    file=sys.stderr
+                )
+    finally:
+        if server is not None:
+            server.terminate()
+
+    report = {
+        'params': {
+            **sizes, 'seed': args.seed, 'concurrency': args.concurrency, 'duration': args.duration,
+            'server': 'external' if args.url else 'in-process',
+        },
+        'environment': {
+            'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'mongodb': mongodb_version,
+        },
+        'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'scenarios': scenarios,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            f.write(output + '\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regression against the baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# async_vs_sync.py
+# Requests/s of the WSGI (gunicorn, wsgi:app) and ASGI (hypercorn, asgi:app)
+# servers under the same closed-loop load. Both servers must already be
+# running against the same database, e.g.
+#
+#   gunicorn -c gunicorn.conf.py --bind 0.0.0.0:5000 wsgi:app
+#   hypercorn --workers 4 --bind 0.0.0.0:5001 asgi:app
+#   python benchmarks/async_vs_sync.py --sync-url http://localhost:5000 \
+#       --async-url http://localhost:5001 --concurrency 200 --duration 60
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from http_load import run_load
+
+# Routes served by both apps; the loan listing exercises the concurrent
+# count + page queries and the $lookup join
+DEFAULT_PATHS = [
+    '/api/documents/?per_page=20',
+    '/api/documents/?cursor=&per_page=20',
+    '/api/subscribers/?cursor=&per_page=20',
+    '/api/loans/?cursor=&per_page=20',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the WSGI and ASGI servers under load')
+    parser.add_argument('--sync-url', default='http://localhost:5000', help='gunicorn (wsgi:app) base URL')
+    parser.add_argument('--async-url', default='http://localhost:5001', help='hypercorn (asgi:app) base URL')
+    parser.add_argument('--path', action='append', dest='paths', help='path to request (repeatable)')
+    parser.add_argument('--concurrency', type=int, default=200, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load per server')
+    args = parser.parse_args()
+
+    paths = args.paths or DEFAULT_PATHS
+    results = {}
+    for name, url in (('sync', args.sync_url), ('async', args.async_url)):
+        # Warm-up: imports, pool connections, server caches
+        run_load(url, paths, min(args.concurrency, 4), 2)
+        results[name] = run_load(url, paths, args.concurrency, args.duration)
+
+    print(f"{args.concurrency} clients, {args.duration:g}s per server, paths: {', '.join(paths)}")
+    for name, summary in results.items():
+        print(
+            f"{name:>5}: {summary['throughput_rps']:8.1f} req/s  "
+            f"p50 {summary['p50_ms']:.1f} ms  p95 {summary['p95_ms']:.1f} ms  p99 {summary['p99_ms']:.1f} ms  "
+            f"({summary['requests']} requests, {summary['errors']} errors)"
+        )
+    if results['sync']['throughput_rps']:
+        print(f"async/sync: {results['async']['throughput_rps'] / results['sync']['throughput_rps']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# catalogue_search.py
+# Compare the text-index search endpoint query against what the UI does today:
+# paging through the whole catalogue and filtering on the client.
+#
+#   python benchmarks/catalogue_search.py --documents 1000000 --queries 50
+#
+# The catalogue is seeded (deterministically) only when the collection holds
+# fewer documents than requested.
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+from pymongo import MongoClient
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.indexes import ensure_indexes
+
+WORDS = (
+    "shadow river night garden empire silent winter crown machine ocean "
+    "forgotten city storm glass letter journey secret fire memory island "
+    "mountain war light dream stone kingdom hunter echo heart queen"
+).split()
+GENRES = ["Fiction", "Mystery", "Romance", "Fantasy", "History", "Science", "Poetry", "Thriller"]
+AUTHORS = ["Dumas", "Hugo", "Verne", "Austen", "Tolstoy", "Woolf", "Camus", "Zola", "Orwell", "Sand"]
+
+
+def seed(db, total, batch_size=10000):
+    existing = db.documents.estimated_document_count()
+    if existing >= total:
+        return existing
+    rng = random.Random(42)
+    batch = []
+    for i in range(existing, total):
+        batch.append({
+            "title": " ".join(rng.choices(WORDS, k=rng.randint(2, 5))).title(),
+            "author": f"{rng.choice(AUTHORS)} {i % 997}",
+            "type": rng.choice(["book", "book", "book", "magazine", "dvd"]),
+            "genre": rng.choice(GENRES),
+            "description": " ".join(rng.choices(WORDS, k=25)),
+            "available": rng.random() > 0.2
+        })
+        if len(batch) == batch_size:
+            db.documents.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db.documents.insert_many(batch, ordered=False)
+    return total
+
+
+def text_search(db, term, per_page):
+    return list(
+        db.documents.find({"$text": {"$search": term}}, {"score": {"$meta": "textScore"}})
+        .sort([("score", {"$meta": "textScore"})])
+        .limit(per_page)
+    )
+
+
+def client_side_scan(db, term, per_page, page_size):
+    """Page through /api/documents-style pages and filter like the browser would"""
+    pattern = re.compile(re.escape(term), re.IGNORECASE)
+    matches = []
+    last_id = None
+    while True:
+        query = {"_id": {"$lt": last_id}} if last_id else {}
+        page = list(db.documents.find(query).sort("_id", -1).limit(page_size))
+        if not page:
+            break
+        last_id = page[-1]["_id"]
+        for doc in page:
+            if any(pattern.search(str(doc.get(field, ""))) for field in ("title", "author", "genre", "description")):
+                matches.append(doc)
+    return matches[:per_page]
+
+
+def measure(fn, terms):
+    timings = []
+    for term in terms:
+        started = time.perf_counter()
+        fn(term)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "p50_ms": statistics.median(timings) * 1000,
+        "p95_ms": timings[max(0, int(len(timings) * 0.95) - 1)] * 1000,
+        "max_ms": timings[-1] * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Full-text search vs client-side scan benchmark')
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017/mediatheque_bench'))
+    parser.add_argument('--documents', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=50, help='text search queries to time')
+    parser.add_argument('--scan-queries', type=int, default=3, help='full scans to time (slow)')
+    parser.add_argument('--scan-page-size', type=int, default=100, help='page size used by the scan')
+    parser.add_argument('--per-page', type=int, default=10)
+    args = parser.parse_args()
+
+    db = MongoClient(args.mongo_uri).get_default_database('mediatheque_bench')
+    started = time.perf_counter()
+    total = seed(db, args.documents)
+    print(f"catalogue: {total} documents (seeded in {time.perf_counter() - started:.1f}s)")
+
+    # Same indexes as init_db
+    ensure_indexes(db)
+
+    rng = random.Random(7)
+    terms = [rng.choice(WORDS) for _ in range(args.queries)]
+
+    indexed = measure(lambda term: text_search(db, term, args.per_page), terms)
+    print(f"text index search : p50 {indexed['p50_ms']:.1f} ms, p95 {indexed['p95_ms']:.1f} ms, max {indexed['max_ms']:.1f} ms")
+
+    scanned = measure(
+        lambda term: client_side_scan(db, term, args.per_page, args.scan_page_size),
+        terms[:args.scan_queries]
+    )
+    print(f"full-page scan    : p50 {scanned['p50_ms']:.1f} ms, p95 {scanned['p95_ms']:.1f} ms, max {scanned['max_ms']:.1f} ms")
+    print(f"speed-up (p50)    : {scanned['p50_ms'] / indexed['p50_ms']:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
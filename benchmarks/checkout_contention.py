@@ -0,0 +1,87 @@
+# checkout_contention.py
+# Fire N parallel checkouts of the same document and check that exactly one
+# of them wins, then report checkout latency.
+#
+#   python benchmarks/checkout_contention.py --clients 50 --rounds 20
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.circulation import CirculationError, checkout, checkout_in_transaction
+
+
+def run_round(client, db, clients, use_transactions):
+    subscriber_ids = db.subscribers.insert_many([
+        {"first_name": "Bench", "last_name": f"Client {i}", "current_loans": [], "loan_history": []}
+        for i in range(clients)
+    ]).inserted_ids
+    document_id = db.documents.insert_one({"title": "Contended title", "type": "book", "available": True}).inserted_id
+
+    barrier = threading.Barrier(clients)
+    loan_date = datetime.utcnow()
+    due_date = loan_date + timedelta(days=14)
+
+    def attempt(subscriber_id):
+        barrier.wait()
+        started = time.perf_counter()
+        try:
+            if use_transactions:
+                checkout_in_transaction(client, db, subscriber_id, document_id, loan_date, due_date)
+            else:
+                checkout(db, subscriber_id, document_id, loan_date, due_date)
+            won = True
+        except CirculationError:
+            won = False
+        return won, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(attempt, subscriber_ids))
+
+    loans = db.loans.count_documents({"document_id": document_id, "status": "active"})
+    return results, loans
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent checkout contention benchmark')
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017/mediatheque_bench'))
+    parser.add_argument('--clients', type=int, default=50, help='parallel checkouts per round')
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--transactions', action='store_true', help='use checkout_in_transaction (replica set only)')
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_uri, maxPoolSize=args.clients)
+    db = client.get_default_database('mediatheque_bench')
+    for name in ('subscribers', 'documents', 'loans'):
+        db[name].delete_many({})
+
+    latencies = []
+    failures = 0
+    for round_number in range(1, args.rounds + 1):
+        results, loans = run_round(client, db, args.clients, args.transactions)
+        wins = sum(1 for won, _ in results if won)
+        latencies.extend(elapsed for _, elapsed in results)
+        status = 'ok' if wins == 1 and loans == 1 else 'FAILED'
+        if status != 'ok':
+            failures += 1
+        print(f"round {round_number}: {wins} winner(s), {loans} active loan(s) -> {status}")
+
+    latencies.sort()
+    print(f"\n{len(latencies)} checkouts, {args.clients} concurrent")
+    print(f"p50 {statistics.median(latencies) * 1000:.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms")
+
+    assert failures == 0, f"{failures} round(s) did not have exactly one winner"
+
+
+if __name__ == "__main__":
+    main()
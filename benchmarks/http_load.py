@@ -0,0 +1,109 @@
+# http_load.py
+# Closed-loop HTTP load generator: `--concurrency` clients, each on its own
+# keep-alive connection, request the given paths round-robin for
+# `--duration` seconds. Prints throughput and latency percentiles.
+#
+#   python benchmarks/http_load.py --url http://localhost:5000 \
+#       --path /api/documents/?per_page=20 --path /api/loans/ \
+#       --concurrency 50 --duration 30
+import argparse
+import http.client
+import itertools
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def client_loop(host, port, paths, deadline, latencies, errors, lock):
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    local_latencies = []
+    local_errors = 0
+    for path in itertools.cycle(paths):
+        if time.perf_counter() >= deadline:
+            break
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                local_errors += 1
+            if response.getheader('Connection', '').lower() == 'close':
+                connection.close()
+        except (OSError, http.client.HTTPException):
+            local_errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        local_latencies.append(time.perf_counter() - started)
+    connection.close()
+    with lock:
+        latencies.extend(local_latencies)
+        errors[0] += local_errors
+
+
+def run_load(url, paths, concurrency, duration):
+    """Drive the server and return a summary dict"""
+    parts = urlsplit(url)
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+    started = time.perf_counter()
+    deadline = started + duration
+    clients = [
+        threading.Thread(
+            target=client_loop,
+            args=(parts.hostname, parts.port or 80, paths, deadline, latencies, errors, lock),
+            daemon=True
+        )
+        for _ in range(concurrency)
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Closed-loop HTTP load generator')
+    parser.add_argument('--url', default='http://localhost:5000', help='server base URL')
+    parser.add_argument('--path', action='append', dest='paths', help='path to request (repeatable)')
+    parser.add_argument('--concurrency', type=int, default=50, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load')
+    args = parser.parse_args()
+
+    paths = args.paths or ['/api/documents/?per_page=20']
+    # Warm-up: first requests pay for imports and pool connections
+    run_load(args.url, paths, min(args.concurrency, 4), 2)
+    summary = run_load(args.url, paths, args.concurrency, args.duration)
+
+    print(f"{args.concurrency} clients, {args.duration:g}s, paths: {', '.join(paths)}")
+    print(
+        f"{summary['throughput_rps']:.1f} req/s  "
+        f"p50 {summary['p50_ms']:.1f} ms  p95 {summary['p95_ms']:.1f} ms  p99 {summary['p99_ms']:.1f} ms  "
+        f"({summary['requests']} requests, {summary['errors']} errors)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# json_encoding.py
+# CPU time spent turning the subscriber and loan lists into a JSON response:
+# the previous pipeline (convert_objectid pre-walk or _id loop, then Flask's
+# default encoder) against the orjson provider encoding PyMongo documents
+# directly. No database needed, the rows are synthetic.
+#
+#   python benchmarks/json_encoding.py --rows 1000 --requests 50
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.json_provider import OrjsonProvider
+from app.schemas import SubscriberSchema
+
+subscriber_schema = SubscriberSchema()
+
+
+def convert_objectid(obj):
+    """The recursive pre-walk the routes used before the provider"""
+    if isinstance(obj, list):
+        return [convert_objectid(item) for item in obj]
+    elif isinstance(obj, dict):
+        return {key: convert_objectid(value) for key, value in obj.items()}
+    elif isinstance(obj, ObjectId):
+        return str(obj)
+    else:
+        return obj
+
+
+def make_loan(rng, subscriber_id, now):
+    loan_date = now - timedelta(days=rng.randint(1, 60))
+    return {
+        '_id': ObjectId(),
+        'subscriber_id': subscriber_id,
+        'document_id': ObjectId(),
+        'loan_date': loan_date,
+        'due_date': loan_date + timedelta(days=14),
+        'status': 'active'
+    }
+
+
+def make_subscribers(rows, rng):
+    now = datetime.utcnow()
+    subscribers = []
+    for i in range(rows):
+        subscriber_id = ObjectId()
+        subscribers.append({
+            '_id': subscriber_id,
+            'first_name': f'First{i}',
+            'last_name': f'Last{i}',
+            'email': f'user{i}@example.com',
+            'address': f'{i} rue de la Paix, Paris',
+            'phone': '0102030405',
+            'inscription_date': now,
+            'current_loans': [make_loan(rng, subscriber_id, now) for _ in range(rng.randint(0, 3))],
+            'loan_history': [make_loan(rng, subscriber_id, now) for _ in range(rng.randint(0, 10))]
+        })
+    return subscribers
+
+
+def make_loans(rows, rng):
+    """Rows shaped like the loans list (LOAN_LIST_PROJECTION)"""
+    now = datetime.utcnow()
+    loans = []
+    for i in range(rows):
+        loan = make_loan(rng, ObjectId(), now)
+        loans.append({
+            '_id': loan['_id'],
+            'loan_date': loan['loan_date'],
+            'due_date': loan['due_date'],
+            'status': loan['status'],
+            'subscriber_name': f'First{i} Last{i}',
+            'document_title': f'Title {i}'
+        })
+    return loans
+
+
+def cpu_per_request(app, build, requests):
+    """Mean CPU milliseconds of one call to build() inside an app context"""
+    with app.app_context():
+        build()  # warm-up
+        started = time.process_time()
+        for _ in range(requests):
+            build()
+        return (time.process_time() - started) * 1000 / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON encoding cost of the list endpoints')
+    parser.add_argument('--rows', type=int, default=1000, help='rows per list')
+    parser.add_argument('--requests', type=int, default=50, help='responses built per measurement')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    subscribers = make_subscribers(args.rows, rng)
+    loans = make_loans(args.rows, rng)
+
+    before = Flask('before')
+    before.json = DefaultJSONProvider(before)
+    after = Flask('after')
+    after.json = OrjsonProvider(after)
+
+    # The routes converted _id in place; on a private copy that stays
+    # repeatable (str() of a str still costs the call)
+    loan_rows = [dict(loan) for loan in loans]
+
+    def loans_before():
+        for row in loan_rows:
+            row['_id'] = str(row['_id'])
+        return before.json.response(loan_rows).get_data()
+
+    cases = [
+        ('subscribers (include=loans)',
+         lambda: before.json.response([subscriber_schema.dump(convert_objectid(s)) for s in subscribers]).get_data(),
+         lambda: after.json.response([subscriber_schema.dump(s) for s in subscribers]).get_data()),
+        ('loans',
+         loans_before,
+         lambda: after.json.response(loans).get_data()),
+    ]
+
+    print(f"{args.rows} rows per response, {args.requests} responses per measurement")
+    for name, build_before, build_after in cases:
+        cpu_before = cpu_per_request(before, build_before, args.requests)
+        cpu_after = cpu_per_request(after, build_after, args.requests)
+        print(f"{name:<28} before {cpu_before:7.2f} ms  after {cpu_after:7.2f} ms  ({cpu_before / cpu_after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
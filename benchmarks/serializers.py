@@ -0,0 +1,97 @@
+# serializers.py
+# Marshmallow Schema.dump() against the compiled projectors of
+# app/serializers.py on the list endpoints' rows: checks that both give the
+# same output, then compares the rows serialized per second. No database
+# needed, the rows are synthetic.
+#
+#   python benchmarks/serializers.py --rows 10000 --repeat 5
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.schemas import DocumentSchema, LoanSchema, SubscriberSchema
+from app.serializers import serialize_document, serialize_loan, serialize_subscriber
+from json_encoding import make_loan, make_subscribers
+
+
+def make_documents(rows, rng):
+    documents = []
+    for i in range(rows):
+        documents.append({
+            '_id': ObjectId(),
+            'title': f'Title {i}',
+            'type': rng.choice(['book', 'magazine', 'dvd']),
+            'author': f'Author {i % 500}',
+            'publication_date': datetime(1950, 1, 1) + timedelta(days=rng.randint(0, 27000)),
+            'available': rng.random() < 0.8,
+            'genre': rng.choice(['fiction', 'science', 'history']),
+            'isbn': f'978{i:010d}',
+            'version': 1
+        })
+    return documents
+
+
+def make_loans(rows, rng):
+    now = datetime.utcnow()
+    loans = []
+    for _ in range(rows):
+        loan = make_loan(rng, ObjectId(), now)
+        if rng.random() < 0.5:
+            loan['status'] = 'returned'
+            loan['return_date'] = loan['due_date']
+        loans.append(loan)
+    return loans
+
+
+def best_time(build, repeat):
+    """Fastest of `repeat` runs, in seconds"""
+    build()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        build()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Schema.dump() against the compiled serializers')
+    parser.add_argument('--rows', type=int, default=10000, help='rows per list')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case (best is kept)')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    cases = [
+        ('subscribers (with loans)', SubscriberSchema(), serialize_subscriber, make_subscribers(args.rows, rng)),
+        ('documents', DocumentSchema(), serialize_document, make_documents(args.rows, rng)),
+        ('loans', LoanSchema(), serialize_loan, make_loans(args.rows, rng)),
+    ]
+
+    print(f"{args.rows} rows per list, best of {args.repeat}")
+    failed = False
+    for name, schema, project, rows in cases:
+        expected = schema.dump(rows, many=True)
+        actual = [project(row) for row in rows]
+        parity = actual == expected and all(list(a) == list(e) for a, e in zip(actual, expected))
+        failed = failed or not parity
+
+        dump_time = best_time(lambda: schema.dump(rows, many=True), args.repeat)
+        project_time = best_time(lambda: [project(row) for row in rows], args.repeat)
+        print(
+            f"{name:<26} parity {'ok' if parity else 'MISMATCH':<8} "
+            f"dump {args.rows / dump_time:>10,.0f} rows/s  "
+            f"compiled {args.rows / project_time:>10,.0f} rows/s  ({dump_time / project_time:.1f}x)"
+        )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# gunicorn.conf.py
+# Production server settings, each overridable from the environment:
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+
+# Processes x threads. The views spend most of their time waiting on
+# MongoDB, so a few threads per worker keep the CPU busy; each worker has
+# its own MongoClient pool (MONGO_MAX_POOL_SIZE), sized for its threads.
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+
+# Import the app once in the master and fork the workers from it: faster
+# boot and shared memory pages. create_app() opens no connection, so every
+# worker starts its own pool after the fork. Keep MONGO_ENSURE_INDEXES off
+# (use `flask --app app init-db`) and run the overdue sweep from cron
+# (scripts/mark_overdue.py) rather than OVERDUE_SCAN_INTERVAL: neither a
+# connection nor a thread started in the master should cross the fork.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Keep client connections open between requests (behind a load balancer,
+# set this above the balancer's idle timeout)
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+# Recycle workers now and then so a slow leak cannot grow unbounded
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+accesslog = os.environ.get("GUNICORN_ACCESSLOG", "-")
+errorlog = "-"
+
+
+# Workers write their metrics samples to files in this directory, which
+# /metrics adds up. It must be set before the app is imported, and emptied
+# at startup so that samples of a previous run are not counted again.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "mediatheque-metrics"))
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+
+def child_exit(server, worker):
+    # Drop the live gauges (in-progress requests, pool connections) of a
+    # worker that has gone
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,34 @@
+# backfill_loan_read_model.py
+# Copy subscriber names and document titles onto existing loans so that the
+# denormalized loans read model (LOANS_READ_MODEL=denormalized) is complete
+import argparse
+import os
+import sys
+
+from pymongo import MongoClient
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.conditional import bump_change_counters
+from app.read_model import BACKFILL_BATCH_SIZE, backfill_loan_read_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill subscriber_name and document_title on loans')
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI', 'mongodb://mongo-db:27017/mediatheque'))
+    parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE,
+                        help='UpdateMany operations per bulk_write')
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_uri)
+    db = client.get_default_database('mediatheque')
+
+    modified = backfill_loan_read_model(db, args.batch_size)
+    bump_change_counters(db, 'loans')
+    print(f"subscriber_name set on {modified['subscriber_name']} loans")
+    print(f"document_title set on {modified['document_title']} loans")
+
+
+if __name__ == "__main__":
+    main()
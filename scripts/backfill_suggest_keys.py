@@ -0,0 +1,35 @@
+# backfill_suggest_keys.py
+# Compute the typeahead prefix keys (suggest_keys) on existing documents and
+# subscribers, e.g. after upgrading or after editing them outside the API
+import argparse
+import os
+import sys
+
+from pymongo import MongoClient
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.conditional import bump_change_counters
+from app.suggest import BACKFILL_BATCH_SIZE, backfill_suggest_keys, document_suggest_keys, subscriber_suggest_keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill suggest_keys on documents and subscribers')
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI', 'mongodb://mongo-db:27017/mediatheque'))
+    parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE, help='updates per bulk_write')
+    args = parser.parse_args()
+
+    db = MongoClient(args.mongo_uri).get_default_database('mediatheque')
+
+    modified = backfill_suggest_keys(db.documents, document_suggest_keys, {'title': 1, 'author': 1}, args.batch_size)
+    print(f"suggest_keys updated on {modified} documents")
+    modified = backfill_suggest_keys(
+        db.subscribers, subscriber_suggest_keys, {'first_name': 1, 'last_name': 1, 'email': 1}, args.batch_size
+    )
+    print(f"suggest_keys updated on {modified} subscribers")
+    bump_change_counters(db, 'documents', 'subscribers')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# export_collection.py
+# Export documents, subscribers or loans as NDJSON with constant memory
+#
+#   python scripts/export_collection.py loans --status active --gzip -o loans.ndjson.gz
+import argparse
+import os
+import sys
+import time
+
+from pymongo import MongoClient
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.export import DEFAULT_BATCH_SIZE, EXPORTS, export_cursor
+from app.streaming import iter_export
+
+
+class CountingCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.count = 0
+
+    def __iter__(self):
+        for row in self.cursor:
+            self.count += 1
+            yield row
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a collection as NDJSON')
+    parser.add_argument('collection', choices=sorted(EXPORTS))
+    parser.add_argument('-o', '--output', default='-', help="output file, '-' for stdout")
+    parser.add_argument('--gzip', action='store_true', help='gzip-compress the output')
+    parser.add_argument('--fields', help='comma-separated fields to export')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='rows per getMore')
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI', 'mongodb://mongo-db:27017/mediatheque'))
+    # Same filters as the list endpoints
+    parser.add_argument('--type')
+    parser.add_argument('--available', choices=('true', 'false'))
+    parser.add_argument('--status')
+    parser.add_argument('--subscriber-id')
+    parser.add_argument('--document-id')
+    args = parser.parse_args()
+
+    filters = {
+        'type': args.type,
+        'available': args.available,
+        'status': args.status,
+        'subscriber_id': args.subscriber_id,
+        'document_id': args.document_id
+    }
+    filters = {key: value for key, value in filters.items() if value is not None}
+
+    db = MongoClient(args.mongo_uri).get_default_database('mediatheque')
+    rows = CountingCursor(export_cursor(db, args.collection, filters, args.fields, args.batch_size))
+
+    started = time.perf_counter()
+    output = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    with output:
+        for chunk in iter_export(rows, args.gzip):
+            output.write(chunk)
+    elapsed = time.perf_counter() - started
+
+    print(f"Exported {rows.count} {args.collection} in {elapsed:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,172 +1,427 @@
 # generate_test_data.py
-from faker import Faker
-from pymongo import MongoClient
-from datetime import datetime, timedelta
+# Seeded generator of subscribers, documents and loan history, from demo
+# sizes up to production-scale datasets for load tests:
+#
+#   python scripts/generate_test_data.py
+#   python scripts/generate_test_data.py --subscribers 1000000 --documents 2000000 \
+#       --loans 20000000 --workers 8
+#
+# The same --seed and --as-of give the same records whatever --workers and
+# --batch-size. The subscribers, documents and loans collections are
+# dropped first. Popularity follows a Zipf law (a few titles are borrowed
+# all the time), a minority of subscribers borrow most of the items, and a
+# long tail of returns comes in weeks late, so some open loans are overdue.
+import argparse
+import math
+import os
 import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from functools import lru_cache
+
 import bcrypt
-from bson.objectid import ObjectId
-# Initialize Faker
-fake = Faker()
-
-# Connect to MongoDB
-client = MongoClient('mongodb://mongo-db:27017/')
-
-db = client['mediatheque']
-
-def generate_users():
-    """Generate 4 fake user accounts"""
-    users = [
-        {
-            "_id": ObjectId(),
-            "first_name": "Admin",
-            "last_name": "User",
-            "email": "admin@mediatheque.com",
-            "address": fake.address(),
-            "phone": fake.phone_number(),
-            "password": bcrypt.hashpw("admin123".encode('utf-8'), bcrypt.gensalt()),
-            "role": "admin",
-            "inscription_date": datetime.utcnow(),
-            "current_loans": [],
-            "loan_history": []
-        },
-        {
-            "_id": ObjectId(),
-            "first_name": "John",
-            "last_name": "Doe",
-            "email": "john.doe@mediatheque.com",
-            "address": fake.address(),
-            "phone": fake.phone_number(),
-            "password": bcrypt.hashpw("user123".encode('utf-8'), bcrypt.gensalt()),
-            "role": "user",
-            "inscription_date": datetime.utcnow(),
-            "current_loans": [],
-            "loan_history": []
-        },
-        {
-            "_id": ObjectId(),
-            "first_name": "Jane",
-            "last_name": "Smith",
-            "email": "jane.smith@mediatheque.com",
-            "address": fake.address(),
-            "phone": fake.phone_number(),
-            "password": bcrypt.hashpw("user123".encode('utf-8'), bcrypt.gensalt()),
-            "role": "user",
-            "inscription_date": datetime.utcnow(),
-            "current_loans": [],
-            "loan_history": []
-        },
-        {
-            "_id": ObjectId(),
-            "first_name": "Robert",
-            "last_name": "Johnson",
-            "email": "robert.johnson@mediatheque.com",
-            "address": fake.address(),
-            "phone": fake.phone_number(),
-            "password": bcrypt.hashpw("user123".encode('utf-8'), bcrypt.gensalt()),
-            "role": "user",
-            "inscription_date": datetime.utcnow(),
-            "current_loans": [],
-            "loan_history": []
-        }
-    ]
-    
-    # Insert users into database
-    db.subscribers.insert_many(users)
-    print("Created 4 user accounts")
-    return users
-
-def generate_books():
-    """Generate 100 fake books"""
-    genres = ["Fiction", "Non-Fiction", "Science Fiction", "Mystery", "Romance", 
-              "Fantasy", "Biography", "History", "Science", "Philosophy",
-              "Poetry", "Drama", "Horror", "Adventure", "Thriller"]
-    
-    publishers = ["Penguin Random House", "HarperCollins", "Simon & Schuster",
-                 "Hachette Book Group", "Macmillan Publishers"]
-    
-    languages = ["French", "English", "Spanish", "German"]
-    
-    books = []
-    
-    for _ in range(100):
-        publication_date = fake.date_between(start_date='-20y', end_date='today')
-        
-        book = {
-            "title": fake.catch_phrase(),
-            "author": fake.name(),
-            "type": "book",
-            "isbn": fake.isbn13(),
-            "publisher": random.choice(publishers),
-            "language": random.choice(languages),
-            "publication_date": datetime.combine(publication_date, datetime.min.time()),  # Convert to datetime
-            "genre": random.choice(genres),
-            "description": fake.text(max_nb_chars=200),
-            "pages": random.randint(100, 800),
-            "available": True,
-            "location": f"Section {random.choice('ABCDE')}-{random.randint(1,20)}",
-            "added_date": datetime.utcnow(),
-            "last_updated": datetime.utcnow()
+from bson import ObjectId
+from faker import Faker
+from pymongo import MongoClient
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.circulation import OPEN_LOAN_STATUSES
+from app.conditional import LAST_UPDATED_FIELD, VERSION_FIELD, bump_change_counters
+from app.indexes import ensure_indexes
+from app.suggest import SUGGEST_FIELD, document_suggest_keys, subscriber_suggest_keys
+
+# (first_name, last_name, email, password, role); the first subscribers
+DEMO_ACCOUNTS = [
+    ("Admin", "User", "admin@mediatheque.com", "admin123", "admin"),
+    ("John", "Doe", "john.doe@mediatheque.com", "user123", "user"),
+    ("Jane", "Smith", "jane.smith@mediatheque.com", "user123", "user"),
+    ("Robert", "Johnson", "robert.johnson@mediatheque.com", "user123", "user"),
+]
+
+GENRES = ["Fiction", "Non-Fiction", "Science Fiction", "Mystery", "Romance",
+          "Fantasy", "Biography", "History", "Science", "Philosophy",
+          "Poetry", "Drama", "Horror", "Adventure", "Thriller"]
+PUBLISHERS = ["Penguin Random House", "HarperCollins", "Simon & Schuster",
+              "Hachette Book Group", "Macmillan Publishers"]
+# (value, weight); only the types DocumentSchema accepts
+TYPES = [("book", 80), ("dvd", 12), ("magazine", 8)]
+LANGUAGES = [("French", 60), ("English", 25), ("Spanish", 8), ("German", 7)]
+
+LOAN_DAYS = 14
+# Distinct first/last names and authors to draw from
+FIRST_NAME_POOL = 700
+LAST_NAME_POOL = 1000
+MAX_AUTHOR_POOL = 20000
+# Share of returns that come back late, and how late (Pareto shape)
+LATE_RETURN_RATE = 0.08
+LATE_TAIL_SHAPE = 1.2
+# u ** BORROWER_SKEW picks the subscriber: the 10% most active borrow
+# about 45% of the items
+BORROWER_SKEW = 3
+
+KIND_SUBSCRIBER, KIND_DOCUMENT, KIND_LOAN = 1, 2, 3
+# Records generated from one random stream, the unit of work of a worker
+CHUNK_SIZE = 1000
+
+
+def object_id(when, kind, index, seq=0):
+    """Deterministic ObjectId: creation time, record kind, record index and
+    the loan's rank in its document's history"""
+    return ObjectId(
+        int(when.timestamp()).to_bytes(4, 'big') + kind.to_bytes(1, 'big')
+        + index.to_bytes(5, 'big') + seq.to_bytes(2, 'big')
+    )
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def coprime_stride(n):
+    """A multiplier coprime with n, to scatter ranks over indexes"""
+    stride = max(1, int(n * 0.618))
+    while math.gcd(stride, n) != 1:
+        stride += 1
+    return stride
+
+
+def isbn13(index):
+    digits = f"978{index:09d}"
+    check = (10 - sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits)) % 10) % 10
+    return digits + str(check)
+
+
+def power_sum(start, stop, skew):
+    """sum((rank + 1) ** -skew for rank in range(start, stop)), approximated
+    by the integral"""
+    if stop <= start:
+        return 0.0
+    low, high = start + 0.5, stop + 0.5
+    if skew == 1:
+        return math.log(high / low)
+    return (high ** (1 - skew) - low ** (1 - skew)) / (1 - skew)
+
+
+def popularity_scale(documents, loans, skew, cap):
+    """Scale c such that sum(min(cap, c * (rank + 1) ** -skew)) over the
+    document ranks is about `loans`: the most popular titles are capped at
+    `cap` loans and the rest is spread over the others"""
+    if loans >= cap * documents:
+        return math.inf
+    capped = 0
+    while True:
+        scale = (loans - cap * capped) / power_sum(capped, documents, skew)
+        now_capped = min(documents - 1, int((scale / cap) ** (1 / skew)))
+        if now_capped <= capped:
+            return scale
+        capped = now_capped
+
+
+class DatasetPlan:
+    """Everything a worker needs to generate any chunk on its own"""
+
+    def __init__(self, seed, subscribers, documents, loans, as_of, history_days, skew, batch_size):
+        self.seed = seed
+        self.subscribers = subscribers
+        self.documents = documents
+        self.loans = loans
+        self.as_of = as_of
+        self.history_start = as_of - timedelta(days=history_days)
+        # Records were created over the ten years before the history
+        self.catalogue_start = self.history_start - timedelta(days=3650)
+        self.skew = skew
+        self.batch_size = batch_size
+        # One copy per document: at most one loan every ~3 weeks
+        self.max_loans_per_document = max(1, history_days // (LOAN_DAYS + 7))
+        self.popularity = popularity_scale(documents, loans, skew, self.max_loans_per_document) if documents else 0
+        self.document_stride = coprime_stride(documents) if documents else 1
+        self.subscriber_stride = coprime_stride(subscribers) if subscribers else 1
+
+    def rng(self, kind, chunk):
+        return random.Random(f"{self.seed}:{kind}:{chunk}")
+
+    def created_at(self, index, count):
+        span = (self.history_start - self.catalogue_start).total_seconds()
+        return self.catalogue_start + timedelta(seconds=int(span * index / count))
+
+    def subscriber_id(self, index):
+        return object_id(self.created_at(index, self.subscribers), KIND_SUBSCRIBER, index)
+
+    def subscriber_name(self, index):
+        if index < len(DEMO_ACCOUNTS):
+            return DEMO_ACCOUNTS[index][0], DEMO_ACCOUNTS[index][1]
+        first_names, last_names, _ = name_pools(self.seed, self.documents)
+        return (
+            first_names[(index * 2654435761 + self.seed) % len(first_names)],
+            last_names[(index * 40503 + self.seed * 7) % len(last_names)]
+        )
+
+    def borrower(self, rng):
+        """Index of the subscriber of a loan, skewed towards heavy borrowers"""
+        rank = int(self.subscribers * rng.random() ** BORROWER_SKEW)
+        return (rank * self.subscriber_stride + self.seed) % self.subscribers
+
+    def expected_loans(self, document_index):
+        rank = (document_index * self.document_stride) % self.documents
+        return min(self.max_loans_per_document, self.popularity * (rank + 1) ** -self.skew)
+
+
+@lru_cache(maxsize=None)
+def name_pools(seed, documents):
+    fake = Faker()
+    fake.seed_instance(seed)
+    first_names = [fake.first_name() for _ in range(FIRST_NAME_POOL)]
+    last_names = [fake.last_name() for _ in range(LAST_NAME_POOL)]
+    authors = [fake.name() for _ in range(max(1, min(MAX_AUTHOR_POOL, documents // 4)))]
+    return first_names, last_names, authors
+
+
+@lru_cache(maxsize=None)
+def demo_password(password):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+
+
+def make_subscriber(plan, index, fake, rng):
+    first_name, last_name = plan.subscriber_name(index)
+    inscription_date = plan.created_at(index, plan.subscribers)
+    subscriber = {
+        "_id": plan.subscriber_id(index),
+        "first_name": first_name,
+        "last_name": last_name,
+        "email": f"{first_name}.{last_name}.{index}@example.org".lower().replace(' ', ''),
+        "address": fake.address(),
+        "phone": fake.phone_number(),
+        "role": "user",
+        "inscription_date": inscription_date,
+        "current_loans": [],
+        "loan_history": [],
+        VERSION_FIELD: 1,
+        LAST_UPDATED_FIELD: inscription_date,
+    }
+    if index < len(DEMO_ACCOUNTS):
+        _, _, subscriber["email"], password, subscriber["role"] = DEMO_ACCOUNTS[index]
+        subscriber["password"] = demo_password(password)
+    subscriber[SUGGEST_FIELD] = subscriber_suggest_keys(subscriber)
+    return subscriber
+
+
+def make_document(plan, index, fake, rng):
+    added_date = plan.created_at(index, plan.documents)
+    _, _, authors = name_pools(plan.seed, plan.documents)
+    document = {
+        "_id": object_id(added_date, KIND_DOCUMENT, index),
+        "title": fake.catch_phrase(),
+        # Prolific authors first
+        "author": authors[int(len(authors) * rng.random() ** 2)],
+        "type": weighted(rng, TYPES),
+        "isbn": isbn13(index),
+        "publisher": rng.choice(PUBLISHERS),
+        "language": weighted(rng, LANGUAGES),
+        "publication_date": added_date - timedelta(days=rng.randrange(30, 20 * 365)),
+        "genre": rng.choice(GENRES),
+        "description": fake.text(max_nb_chars=200),
+        "pages": rng.randint(100, 800),
+        "available": True,
+        "location": f"Section {rng.choice('ABCDE')}-{rng.randint(1, 20)}",
+        "added_date": added_date,
+        VERSION_FIELD: 1,
+        LAST_UPDATED_FIELD: added_date,
+    }
+    document[SUGGEST_FIELD] = document_suggest_keys(document)
+    return document
+
+
+def loan_history(plan, index, document, rng):
+    """The document's loans, one after the other over the history window.
+    A loan still out at --as-of is left open (active, or overdue once past
+    its due date) and the document marked as on loan."""
+    expected = plan.expected_loans(index)
+    count = int(expected) + (rng.random() < expected - int(expected))
+    if not count:
+        return []
+
+    window = (plan.as_of - plan.history_start).days
+    mean_gap = max(0.0, window / count - 10)
+    day = rng.uniform(0, mean_gap)
+    loans = []
+    for seq in range(count):
+        loan_date = plan.history_start + timedelta(days=int(day), seconds=rng.randrange(8 * 3600, 19 * 3600))
+        if loan_date > plan.as_of:
+            break
+        if rng.random() < LATE_RETURN_RATE:
+            kept = LOAN_DAYS + rng.paretovariate(LATE_TAIL_SHAPE) * 5
+        else:
+            kept = rng.triangular(1, LOAN_DAYS, 10)
+        subscriber_index = plan.borrower(rng)
+        first_name, last_name = plan.subscriber_name(subscriber_index)
+        loan = {
+            "_id": object_id(loan_date, KIND_LOAN, index, seq),
+            "subscriber_id": plan.subscriber_id(subscriber_index),
+            "document_id": document["_id"],
+            "loan_date": loan_date,
+            "due_date": loan_date + timedelta(days=LOAN_DAYS),
+            "subscriber_name": f"{first_name} {last_name}",
+            "document_title": document["title"],
+            VERSION_FIELD: 1,
         }
-        books.append(book)
-    
-    # Insert books into database
-    db.documents.insert_many(books)
-    print("Created 100 books")
-    return books
+        return_date = loan_date + timedelta(seconds=int(kept * 86400))
+        if return_date > plan.as_of:
+            loan["status"] = "overdue" if loan["due_date"] < plan.as_of else "active"
+            loan[LAST_UPDATED_FIELD] = loan_date
+            document["available"] = False
+            document["current_loan_id"] = loan["_id"]
+            loans.append(loan)
+            break
+        loan["status"] = "returned"
+        loan["return_date"] = return_date
+        loan[LAST_UPDATED_FIELD] = return_date
+        loans.append(loan)
+        day += kept
+        if mean_gap:
+            day += rng.expovariate(1 / mean_gap)
+    return loans
+
+
+_db = None
+
+
+def init_worker(mongo_uri):
+    global _db
+    _db = MongoClient(mongo_uri).get_default_database('mediatheque')
+
+
+def insert_batches(collection, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        collection.insert_many(rows[start:start + batch_size], ordered=False)
+
+
+def generate_chunk(plan, kind, chunk):
+    """Generate and insert CHUNK_SIZE subscribers, or documents with their
+    loans. Returns {collection: rows inserted}."""
+    rng = plan.rng(kind, chunk)
+    fake = Faker()
+    fake.seed_instance(f"{plan.seed}:{kind}:{chunk}")
+    start = chunk * CHUNK_SIZE
+
+    if kind == 'subscribers':
+        stop = min(start + CHUNK_SIZE, plan.subscribers)
+        subscribers = [make_subscriber(plan, index, fake, rng) for index in range(start, stop)]
+        insert_batches(_db.subscribers, subscribers, plan.batch_size)
+        return {'subscribers': len(subscribers)}
+
+    stop = min(start + CHUNK_SIZE, plan.documents)
+    documents, loans = [], []
+    for index in range(start, stop):
+        document = make_document(plan, index, fake, rng)
+        if plan.subscribers:
+            loans.extend(loan_history(plan, index, document, rng))
+        documents.append(document)
+    insert_batches(_db.documents, documents, plan.batch_size)
+    insert_batches(_db.loans, loans, plan.batch_size)
+    return {'documents': len(documents), 'loans': len(loans)}
+
+
+def copy_current_loans(db):
+    """Embed each subscriber's open loans in subscribers.current_loans"""
+    db.loans.aggregate([
+        {'$match': {'status': {'$in': list(OPEN_LOAN_STATUSES)}}},
+        {'$sort': {'loan_date': 1}},
+        {'$group': {'_id': '$subscriber_id', 'current_loans': {'$push': {
+            '_id': '$_id', 'subscriber_id': '$subscriber_id', 'document_id': '$document_id',
+            'loan_date': '$loan_date', 'due_date': '$due_date', 'status': '$status'
+        }}}},
+        {'$merge': {'into': 'subscribers', 'on': '_id', 'whenMatched': 'merge', 'whenNotMatched': 'discard'}},
+    ])
+
+
+def generate_dataset(mongo_uri, plan, workers=1, log=print):
+    """Drop the collections and fill them according to `plan`.
+
+    Returns {'rows': {collection: count}, 'generate_s', 'embed_s', 'index_s'}.
+    """
+    db = MongoClient(mongo_uri).get_default_database('mediatheque')
+    for name in ('subscribers', 'documents', 'loans'):
+        db[name].drop()
+
+    tasks = [('subscribers', chunk) for chunk in range(math.ceil(plan.subscribers / CHUNK_SIZE))]
+    tasks += [('documents', chunk) for chunk in range(math.ceil(plan.documents / CHUNK_SIZE))]
+    log(f"Generating {plan.subscribers} subscribers, {plan.documents} documents and ~{plan.loans} loans "
+        f"(seed {plan.seed}, {len(tasks)} chunks, {workers} workers)...")
+
+    rows = {'subscribers': 0, 'documents': 0, 'loans': 0}
+    started = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(mongo_uri,)) as pool:
+            futures = [pool.submit(generate_chunk, plan, kind, chunk) for kind, chunk in tasks]
+            for done, future in enumerate(as_completed(futures), 1):
+                for name, count in future.result().items():
+                    rows[name] += count
+                if done % max(1, len(tasks) // 10) == 0:
+                    log(f"  {done}/{len(tasks)} chunks, {sum(rows.values())} rows")
+    else:
+        init_worker(mongo_uri)
+        for kind, chunk in tasks:
+            for name, count in generate_chunk(plan, kind, chunk).items():
+                rows[name] += count
+    report = {'rows': rows, 'generate_s': time.perf_counter() - started}
+
+    started = time.perf_counter()
+    copy_current_loans(db)
+    report['embed_s'] = time.perf_counter() - started
+    started = time.perf_counter()
+    ensure_indexes(db)
+    report['index_s'] = time.perf_counter() - started
+    # Lists cached by clients are stale now
+    bump_change_counters(db, 'subscribers', 'documents', 'loans')
+    return report
+
 
 def main():
-    # Clear existing data
-    db.subscribers.delete_many({})
-    db.documents.delete_many({})
-    db.loans.delete_many({})
-    
-    print("Generating test data...")
-    users = generate_users()
-    books = generate_books()
-    
-    # Create some sample loans
-    for user in users[1:]:  # Skip admin user
-        # Create 2-3 random loans for each user
-        num_loans = random.randint(2, 3)
-        for _ in range(num_loans):
-            available_books = [b for b in books if b['available']]
-            if not available_books:
-                break
-                
-            book = random.choice(available_books)
-            loan_date = datetime.utcnow() - timedelta(days=random.randint(1, 30))
-            
-            loan = {
-                "subscriber_id": user['_id'],
-                "document_id": book['_id'],
-                "loan_date": loan_date,
-                "due_date": loan_date + timedelta(days=14),
-                "status": "active"
-            }
-            
-            # Update book availability
-            db.documents.update_one(
-                {'_id': book['_id']},
-                {'$set': {'available': False}}
-            )
-            
-            # Add loan to user's current loans
-            db.subscribers.update_one(
-                {'_id': user['_id']},
-                {'$push': {'current_loans': loan}}
-            )
-            
-            # Create loan record
-            db.loans.insert_one(loan)
-            books.remove(book)  # Remove book from our local list
-            
-    print("Created sample loans for users")
+    parser = argparse.ArgumentParser(description='Generate seeded test data (drops existing data)')
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI', 'mongodb://mongo-db:27017/mediatheque'))
+    parser.add_argument('--subscribers', type=int, default=200)
+    parser.add_argument('--documents', type=int, default=1000)
+    parser.add_argument('--loans', type=int, default=3000, help='historical loans, about')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--as-of', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        default=datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0),
+                        help='date the data ends at, YYYY-MM-DD (default: today)')
+    parser.add_argument('--history-days', type=int, default=730, help='days of loan history')
+    parser.add_argument('--skew', type=float, default=0.9, help='Zipf exponent of title popularity')
+    parser.add_argument('--batch-size', type=int, default=5000, help='rows per insert_many')
+    parser.add_argument('--workers', type=int, default=1, help='processes generating chunks in parallel')
+    args = parser.parse_args()
+    if args.subscribers < len(DEMO_ACCOUNTS):
+        parser.error(f"--subscribers must be at least {len(DEMO_ACCOUNTS)} (the demo accounts)")
+
+    plan = DatasetPlan(
+        args.seed, args.subscribers, args.documents, args.loans,
+        args.as_of, args.history_days, args.skew, args.batch_size
+    )
+    report = generate_dataset(args.mongo_uri, plan, args.workers)
+
     print("\nTest data generation complete!")
+    elapsed = report['generate_s']
+    for name, count in report['rows'].items():
+        print(f"  {name:<12} {count:>12,} rows  {count / elapsed:>10,.0f} rows/s")
+    rows = sum(report['rows'].values())
+    print(f"  {'total':<12} {rows:>12,} rows  {rows / elapsed:>10,.0f} rows/s in {elapsed:.1f}s")
+    print(f"  current_loans embedded in {report['embed_s']:.1f}s, indexes built in {report['index_s']:.1f}s")
+    db = MongoClient(args.mongo_uri).get_default_database('mediatheque')
+    open_loans = db.loans.count_documents({'status': {'$in': list(OPEN_LOAN_STATUSES)}})
+    overdue = db.loans.count_documents({'status': 'overdue'})
+    print(f"  {open_loans:,} loans open, {overdue:,} of them overdue")
+
     print("\nUser credentials:")
-    print("Admin - Email: admin@mediatheque.com, Password: admin123")
-    print("User1 - Email: john.doe@mediatheque.com, Password: user123")
-    print("User2 - Email: jane.smith@mediatheque.com, Password: user123")
-    print("User3 - Email: robert.johnson@mediatheque.com, Password: user123")
+    for first_name, _, email, password, role in DEMO_ACCOUNTS:
+        label = "Admin" if role == "admin" else first_name
+        print(f"{label} - Email: {email}, Password: {password}")
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
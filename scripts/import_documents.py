@@ -0,0 +1,54 @@
+# import_documents.py
+# Stream a CSV or JSON Lines catalogue export into the documents collection
+#
+#   python scripts/import_documents.py catalogue.csv --batch-size 2000
+import argparse
+import json
+import os
+import sys
+import time
+
+from pymongo import MongoClient
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.catalogue_import import DEFAULT_BATCH_SIZE, FORMATS, guess_format, import_documents, iter_rows
+from app.conditional import bump_change_counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import documents from CSV or JSON Lines')
+    parser.add_argument('path', help="file to import, '-' for stdin")
+    parser.add_argument('--format', choices=FORMATS, help='defaults to the file extension')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='rows per insert_many')
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI', 'mongodb://mongo-db:27017/mediatheque'))
+    parser.add_argument('--report', help='write the full per-row report to this JSON file')
+    args = parser.parse_args()
+
+    fmt = args.format or guess_format(args.path)
+    if fmt is None:
+        parser.error('cannot guess the format, use --format')
+
+    db = MongoClient(args.mongo_uri).get_default_database('mediatheque')
+
+    started = time.perf_counter()
+    stream = sys.stdin.buffer if args.path == '-' else open(args.path, 'rb')
+    with stream:
+        report = import_documents(db.documents, iter_rows(stream, fmt), args.batch_size)
+    bump_change_counters(db, 'documents')
+    elapsed = time.perf_counter() - started
+
+    print(f"Inserted {report['inserted']} documents in {elapsed:.1f}s "
+          f"({report['inserted'] / elapsed if elapsed else 0:.0f} rows/s)")
+    print(f"Invalid rows: {report['invalid']}, duplicate ISBNs: {report['duplicates']}, other failures: {report['failed']}")
+    for duplicate in report['duplicate_rows'][:10]:
+        print(f"  row {duplicate['row']}: duplicate ISBN {duplicate['isbn']}")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
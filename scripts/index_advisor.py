@@ -0,0 +1,40 @@
+# index_advisor.py
+# Run explain() on the query shape of every route and report the ones that
+# scan a whole collection or sort in memory. Exits with status 1 when any
+# plan is flagged, so it can run in CI against a seeded database.
+import argparse
+import os
+import sys
+
+from pymongo import MongoClient
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.index_advisor import advise
+from app.indexes import ensure_indexes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flag COLLSCAN and in-memory SORT plans of the API queries')
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI', 'mongodb://mongo-db:27017/mediatheque'))
+    parser.add_argument('--create-indexes', action='store_true', help='create the registered indexes first')
+    args = parser.parse_args()
+
+    db = MongoClient(args.mongo_uri).get_default_database('mediatheque')
+    if args.create_indexes:
+        for collection, names in ensure_indexes(db).items():
+            print(f"{collection}: {', '.join(names)}")
+
+    flagged = 0
+    for entry in advise(db):
+        status = ', '.join(entry['flags']) if entry['flags'] else 'ok'
+        print(f"{status:<14} {entry['route']:<40} {entry['collection']}: {' > '.join(entry['stages'])}")
+        flagged += bool(entry['flags'])
+
+    print(f"{flagged} flagged query shape(s)")
+    sys.exit(1 if flagged else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+# mark_overdue.py
+# Mark active loans past their due date as overdue. Meant to run from cron
+# when the in-process sweep (OVERDUE_SCAN_INTERVAL) is not enabled.
+import argparse
+import os
+import sys
+
+from pymongo import MongoClient
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.overdue import DEFAULT_BATCH_SIZE, mark_overdue
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mark overdue loans')
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI', 'mongodb://mongo-db:27017/mediatheque'))
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='loans per update_many')
+    args = parser.parse_args()
+
+    db = MongoClient(args.mongo_uri).get_default_database('mediatheque')
+    run = mark_overdue(db, batch_size=args.batch_size)
+    print(f"{run['loans_marked']} loans marked overdue in {run['batches']} batches ({run['duration_ms']} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,18 @@
 # tests/conftest.py
 import pytest
-from flask import Flask
-from flask_pymongo import PyMongo
 import os
 import sys
 
 # Add the project root to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app import app  # Import your Flask app
+from app import create_app, mongo as app_mongo
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def test_app():
-    app.config.update({
+    app = create_app({
         "TESTING": True,
-        "MONGO_URI": "mongodb://localhost:27017/mediatheque_test"
+        "MONGO_URI": os.environ.get("TEST_MONGO_URI", "mongodb://localhost:27017/mediatheque_test")
     })
     return app
 
@@ -24,9 +22,10 @@ def client(test_app):
 
 @pytest.fixture
 def mongo(test_app):
-    mongo = PyMongo(test_app)
+    # The app's own client, so tests and routes share one pool
+    mongo = app_mongo
     # Clear collections before each test
     mongo.db.subscribers.delete_many({})
     mongo.db.documents.delete_many({})
     mongo.db.loans.delete_many({})
-    return mongo
\ No newline at end of file
+    return mongo
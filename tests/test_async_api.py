@@ -0,0 +1,98 @@
+import pytest
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+pytest.importorskip("quart")
+pytest.importorskip("motor")
+
+from app.async_api import create_async_app
+
+
+def run_async(test_app, scenario):
+    """Run `scenario(client)` against the async app, serving hooks included"""
+    app = create_async_app({"TESTING": True, "MONGO_URI": test_app.config["MONGO_URI"]})
+
+    async def main():
+        async with app.test_app() as served:
+            return await scenario(served.test_client())
+
+    return asyncio.run(main())
+
+
+class TestAsyncApi:
+    def test_checkout_and_return(self, test_app, mongo):
+        subscriber_id = mongo.db.subscribers.insert_one({
+            "first_name": "Test",
+            "last_name": "User",
+            "current_loans": []
+        }).inserted_id
+        document_id = mongo.db.documents.insert_one({
+            "title": "Test Book",
+            "available": True
+        }).inserted_id
+        loan_data = {
+            "subscriber_id": str(subscriber_id),
+            "document_id": str(document_id),
+            "loan_date": datetime.now().strftime("%Y-%m-%d"),
+            "due_date": (datetime.now() + timedelta(days=14)).strftime("%Y-%m-%d")
+        }
+
+        async def scenario(client):
+            created = await client.post('/api/loans', json=loan_data)
+            second = await client.post('/api/loans', json=loan_data)
+            loan_id = (await created.get_json())["id"]
+            returned = await client.put(f'/api/loans/{loan_id}', json={"status": "returned"})
+            listed = await client.get('/api/loans/?read_model=denormalized')
+            return created.status_code, second.status_code, returned.status_code, await listed.get_json()
+
+        created, second, returned, loans = run_async(test_app, scenario)
+        assert (created, second, returned) == (201, 400, 200)
+        assert loans[0]["subscriber_name"] == "Test User"
+        assert loans[0]["document_title"] == "Test Book"
+        assert loans[0]["status"] == "returned"
+
+        assert mongo.db.documents.find_one({"_id": document_id})["available"] is True
+        assert mongo.db.subscribers.find_one({"_id": subscriber_id})["current_loans"] == []
+
+    def test_checkout_unknown_subscriber_releases_document(self, test_app, mongo):
+        document_id = mongo.db.documents.insert_one({"title": "Test Book", "available": True}).inserted_id
+
+        async def scenario(client):
+            response = await client.post('/api/loans', json={
+                "subscriber_id": "5f9f1b9b9c9d440000000000",
+                "document_id": str(document_id),
+                "loan_date": "2024-01-01",
+                "due_date": "2024-01-15"
+            })
+            return response.status_code
+
+        assert run_async(test_app, scenario) == 404
+        assert mongo.db.documents.find_one({"_id": document_id})["available"] is True
+        assert mongo.db.loans.count_documents({}) == 0
+
+    def test_documents_list_and_subscribers_stream(self, test_app, mongo):
+        mongo.db.documents.insert_many([{"title": f"Book {i}", "available": True} for i in range(3)])
+        mongo.db.subscribers.insert_one({"first_name": "Test", "last_name": "User", "email": "t@example.com"})
+
+        async def scenario(client):
+            documents = await client.get('/api/documents/?per_page=2&count=exact')
+            subscribers = await client.get('/api/subscribers/')
+            return await documents.get_json(), await subscribers.get_json()
+
+        documents, subscribers = run_async(test_app, scenario)
+        assert len(documents["documents"]) == 2
+        assert documents["pagination"]["total_documents"] == 3
+        assert [subscriber["email"] for subscriber in subscribers] == ["t@example.com"]
+
+    def test_retitling_unknown_document_leaves_loans_alone(self, test_app, mongo):
+        missing_id = "5f9f1b9b9c9d440000000000"
+        mongo.db.loans.insert_one({"document_id": ObjectId(missing_id), "document_title": "Old"})
+
+        async def scenario(client):
+            response = await client.put(f'/api/documents/{missing_id}', json={"title": "New"})
+            return response.status_code
+
+        assert run_async(test_app, scenario) == 404
+        assert mongo.db.loans.find_one({})["document_title"] == "Old"
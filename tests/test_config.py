@@ -0,0 +1,16 @@
+from app.config import Config, mongo_client_options
+
+def test_mongo_client_options(test_app):
+    options = mongo_client_options(dict(test_app.config, MONGO_MAX_POOL_SIZE=20, MONGO_COMPRESSORS="zlib"))
+    assert options["maxPoolSize"] == 20
+    assert options["minPoolSize"] == Config.MONGO_MIN_POOL_SIZE
+    assert options["compressors"] == "zlib"
+
+def test_mongo_client_options_without_compression(test_app):
+    options = mongo_client_options(dict(test_app.config, MONGO_COMPRESSORS="", MONGO_SOCKET_TIMEOUT_MS=0))
+    assert "compressors" not in options
+    assert options["socketTimeoutMS"] is None
+
+def test_create_app_does_not_create_indexes(test_app):
+    assert test_app.config["MONGO_ENSURE_INDEXES"] is False
+    assert "init-db" in test_app.cli.commands
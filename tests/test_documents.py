@@ -1,5 +1,7 @@
 import pytest
 from bson import ObjectId
+import gzip
+import io
 import json
 
 class TestDocuments:
@@ -20,6 +22,31 @@ class TestDocuments:
         assert len(data["documents"]) == 10
         assert data["pagination"]["total_pages"] == 2
 
+    def test_get_documents_cursor_pagination(self, client, mongo):
+        for i in range(15):
+            mongo.db.documents.insert_one({
+                "title": f"Book {i:02d}",
+                "author": "Author",
+                "type": "book",
+                "available": True
+            })
+
+        # Walk every page by following next_cursor
+        titles = []
+        cursor = ""
+        while cursor is not None:
+            response = client.get(f'/api/documents/?cursor={cursor}&per_page=4&sort=title&order=asc')
+            assert response.status_code == 200
+            data = response.json
+            titles.extend(doc["title"] for doc in data["documents"])
+            cursor = data["pagination"]["next_cursor"]
+
+        assert titles == [f"Book {i:02d}" for i in range(15)]
+
+    def test_get_documents_invalid_cursor(self, client, mongo):
+        response = client.get('/api/documents/?cursor=not-a-cursor')
+        assert response.status_code == 400
+
     def test_create_document(self, client, mongo):
         document_data = {
             "title": "Test Book",
@@ -93,4 +120,198 @@ class TestDocuments:
         })
 
         response = client.delete(f'/api/documents/{str(doc_id)}')
-        assert response.status_code == 400
\ No newline at end of file
+        assert response.status_code == 400
+
+    def test_import_documents_csv(self, client, mongo):
+        mongo.db.documents.create_index('isbn', unique=True, sparse=True)
+        csv_data = (
+            "title,author,type,genre,publication_date,isbn\n"
+            "Book A,Author,book,Fiction,2020-01-01,111\n"
+            "Book B,Author,book,Fiction,2020-01-01,111\n"
+            "Book C,Author,vinyl,Fiction,2020-01-01,\n"
+            "Book D,Author,dvd,Drama,2021-06-01,\n"
+        )
+
+        response = client.post('/api/documents/import?batch_size=2',
+                               data={"file": (io.BytesIO(csv_data.encode()), "catalogue.csv")},
+                               content_type='multipart/form-data')
+        assert response.status_code == 200
+        report = response.json
+        assert report["inserted"] == 2
+        assert report["duplicate_rows"] == [{"row": 3, "isbn": "111"}]
+        assert report["invalid_rows"][0]["row"] == 4
+
+        assert mongo.db.documents.count_documents({"available": True}) == 2
+
+    def test_documents_leave_out_suggest_keys(self, client, mongo):
+        response = client.post('/api/documents', json={"title": "Ocean", "author": "Author", "type": "book"})
+        document_id = response.json["id"]
+        assert mongo.db.documents.find_one({"_id": ObjectId(document_id)})["suggest_keys"]
+
+        for url in ('/api/documents/', '/api/documents/?cursor='):
+            assert "suggest_keys" not in client.get(url).json["documents"][0]
+        assert "suggest_keys" not in client.get(f'/api/documents/{document_id}').json
+
+    def test_import_exported_documents(self, client, mongo):
+        exported = {
+            "_id": str(ObjectId()), "title": "Book A", "author": "Author", "type": "book",
+            "genre": "Fiction", "publication_date": "2020-01-01", "publisher": "Gallimard",
+            "available": False, "current_loan_id": str(ObjectId()), "version": 7,
+            "suggest_keys": ["stale"], "internal": "dropped"
+        }
+
+        response = client.post('/api/documents/import?format=jsonl', data=json.dumps(exported) + "\n")
+        assert response.status_code == 200
+        assert response.json["inserted"] == 1
+
+        document = mongo.db.documents.find_one({"title": "Book A"})
+        assert isinstance(document["_id"], ObjectId)
+        assert document["available"] is True
+        assert document["version"] == 1
+        assert document["publisher"] == "Gallimard"
+        assert "current_loan_id" not in document and "internal" not in document
+        assert "stale" not in document["suggest_keys"]
+
+    def test_import_rejects_invalid_batch_size(self, client, mongo):
+        for batch_size in ("0", "-5", "ten"):
+            response = client.post(f'/api/documents/import?format=jsonl&batch_size={batch_size}', data="")
+            assert response.status_code == 400
+            assert response.json["error"] == "Invalid batch_size"
+
+    def test_export_documents_ndjson(self, client, mongo):
+        for i in range(4):
+            mongo.db.documents.insert_one({
+                "title": f"Book {i}",
+                "author": "Author",
+                "type": "book" if i % 2 else "dvd",
+                "available": True
+            })
+
+        response = client.get('/api/export/documents?type=book&fields=title')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [row["title"] for row in rows] == ["Book 1", "Book 3"]
+        assert set(rows[0]) == {"_id", "title"}
+
+    def test_export_documents_leaves_out_bookkeeping(self, client, mongo):
+        client.post('/api/documents', json={"title": "Book", "author": "Author", "type": "book"})
+
+        response = client.get('/api/export/documents')
+        row = json.loads(response.get_data(as_text=True).splitlines()[0])
+        assert row["title"] == "Book"
+        assert not {"suggest_keys", "version", "last_updated", "current_loan_id"} & set(row)
+
+    def test_search_documents_requires_query(self, client, mongo):
+        response = client.get('/api/documents/search')
+        assert response.status_code == 400
+
+    def test_search_documents_ranked(self, client, mongo):
+        mongo.db.documents.create_index(
+            [('title', 'text'), ('author', 'text'), ('genre', 'text'), ('description', 'text')],
+            weights={'title': 10, 'author': 5, 'genre': 3, 'description': 1},
+            default_language='none',
+            language_override='text_language',
+            name='catalogue_text'
+        )
+        mongo.db.documents.insert_many([
+            {"title": "Ocean Stories", "author": "Author", "type": "book", "available": True},
+            {"title": "Mountains", "author": "Author", "type": "book", "available": True,
+             "description": "A short trip to the ocean"},
+            {"title": "Deserts", "author": "Author", "type": "book", "available": True}
+        ])
+
+        response = client.get('/api/documents/search?q=ocean')
+        assert response.status_code == 200
+        titles = [doc["title"] for doc in response.json["documents"]]
+        # A title match outranks a description match
+        assert titles == ["Ocean Stories", "Mountains"]
+
+    def test_suggest_documents_by_prefix(self, client, mongo):
+        client.post('/api/documents', json={"title": "Les Misérables", "author": "Victor Hugo", "type": "book"})
+        client.post('/api/documents', json={"title": "Germinal", "author": "Émile Zola", "type": "book"})
+
+        # Accents and case are ignored, any word of the title or author matches
+        response = client.get('/api/suggest/documents?q=mise')
+        assert response.status_code == 200
+        assert [item["label"] for item in response.json] == ["Les Misérables — Victor Hugo"]
+
+        response = client.get('/api/suggest/documents?q=EMI')
+        assert [item["label"] for item in response.json] == ["Germinal — Émile Zola"]
+        assert set(response.json[0]) == {"_id", "label"}
+    def test_document_facets(self, client, mongo):
+        client.post('/api/documents', json={"title": "A", "type": "book", "genre": "Roman", "language": "fr"})
+        client.post('/api/documents', json={"title": "B", "type": "book", "genre": "Roman", "language": "en"})
+        client.post('/api/documents', json={"title": "C", "type": "dvd", "genre": "Drame", "language": "fr"})
+
+        response = client.get('/api/documents/facets?type=book')
+        assert response.status_code == 200
+        facets = response.json["facets"]
+        assert facets["total"] == 2
+        assert facets["genre"] == [{"value": "Roman", "count": 2}]
+        assert sorted(row["value"] for row in facets["language"]) == ["en", "fr"]
+        assert facets["available"] == [{"value": True, "count": 2}]
+
+        # A second call is served from the cache until the catalogue changes
+        assert client.get('/api/documents/facets?type=book').json["cached"] is True
+        client.post('/api/documents', json={"title": "D", "type": "book", "genre": "Conte"})
+        response = client.get('/api/documents/facets?type=book')
+        assert response.json["cached"] is False
+        assert response.json["facets"]["total"] == 3
+
+    def test_get_document_is_cached_until_updated(self, client, mongo):
+        document_id = client.post('/api/documents', json={"title": "Cached", "type": "book"}).json["id"]
+
+        before = client.get('/api/cache/stats').json["local"]
+        assert client.get(f'/api/documents/{document_id}').json["title"] == "Cached"
+        assert client.get(f'/api/documents/{document_id}').json["title"] == "Cached"
+        after = client.get('/api/cache/stats').json["local"]
+        assert after["hits"] == before["hits"] + 1
+        assert after["misses"] == before["misses"] + 1
+
+        client.put(f'/api/documents/{document_id}', json={"title": "Renamed", "type": "book"})
+        assert client.get(f'/api/documents/{document_id}').json["title"] == "Renamed"
+
+    def test_large_responses_are_compressed(self, client, mongo):
+        mongo.db.documents.insert_many([
+            {"title": f"Book {i}", "author": "Author", "type": "book", "available": True}
+            for i in range(50)
+        ])
+
+        response = client.get('/api/documents/?per_page=50', headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        data = json.loads(gzip.decompress(response.data))
+        assert len(data["documents"]) == 50
+        # ObjectIds come out as strings without any per-route conversion
+        assert all(isinstance(doc["_id"], str) for doc in data["documents"])
+
+        # Small payloads are sent as is
+        response = client.get('/api/documents/?per_page=1', headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in response.headers
+
+    def test_v2_document_crud(self, client, mongo):
+        document_data = {
+            "title": "Le Petit Prince",
+            "type": "book",
+            "author": "Saint-Exupery",
+            "publication_date": "1943-04-06",
+            "genre": "fiction"
+        }
+        response = client.post('/api/v2/documents/', json=document_data)
+        assert response.status_code == 201
+        document = response.json["data"]
+        assert document["available"] is True
+        assert document["publication_date"] == "1943-04-06"
+
+        response = client.get('/api/v2/documents/?type=book')
+        assert response.status_code == 200
+        assert response.json["total"] == 1
+
+        response = client.put(f'/api/v2/documents/{document["_id"]}', json=dict(document_data, title="Vol de nuit"))
+        assert response.status_code == 200
+        assert client.get(f'/api/v2/documents/{document["_id"]}').json["title"] == "Vol de nuit"
+
+        response = client.post('/api/v2/documents/', json=dict(document_data, type="vinyl"))
+        assert response.status_code == 400
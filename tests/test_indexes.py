@@ -0,0 +1,35 @@
+import pytest
+
+from app.index_advisor import advise, winning_stages
+from app.indexes import INDEXES, ensure_indexes
+
+@pytest.fixture
+def drop_created_indexes(mongo):
+    # The unique indexes would reject the bare records other tests insert
+    yield
+    for collection in INDEXES:
+        mongo.db[collection].drop_indexes()
+
+@pytest.mark.usefixtures("drop_created_indexes")
+def test_ensure_indexes_is_idempotent(mongo):
+    first = ensure_indexes(mongo.db)
+    second = ensure_indexes(mongo.db)
+    assert first == second
+    for collection, models in INDEXES.items():
+        names = mongo.db[collection].index_information()
+        assert all(model.document['name'] in names for model in models)
+
+def test_winning_stages_ignores_rejected_plans():
+    explain = {
+        "queryPlanner": {
+            "winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}},
+            "rejectedPlans": [{"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}]
+        }
+    }
+    assert winning_stages(explain) == ["FETCH", "IXSCAN"]
+
+@pytest.mark.usefixtures("drop_created_indexes")
+def test_advisor_flags_nothing_with_registered_indexes(mongo):
+    ensure_indexes(mongo.db)
+    flagged = [entry["route"] for entry in advise(mongo.db) if entry["flags"]]
+    assert flagged == []
@@ -2,6 +2,9 @@ import pytest
 from bson import ObjectId
 import json
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from app.overdue import mark_overdue
 
 class TestLoans:
     def test_create_loan(self, client, mongo):
@@ -61,4 +64,304 @@ class TestLoans:
 
         # Verify document is available again
         document = mongo.db.documents.find_one({"_id": document_id})
-        assert document["available"] is True
\ No newline at end of file
+        assert document["available"] is True
+
+    def test_get_loans_filtered_and_paginated(self, client, mongo):
+        subscriber_id = mongo.db.subscribers.insert_one({
+            "first_name": "Test",
+            "last_name": "User",
+            "current_loans": [],
+            "loan_history": []
+        }).inserted_id
+
+        for i in range(5):
+            document_id = mongo.db.documents.insert_one({
+                "title": f"Book {i}",
+                "available": i % 2 == 0
+            }).inserted_id
+            mongo.db.loans.insert_one({
+                "subscriber_id": subscriber_id,
+                "document_id": document_id,
+                "status": "returned" if i % 2 == 0 else "active",
+                "loan_date": datetime.utcnow(),
+                "due_date": datetime.utcnow() + timedelta(days=14)
+            })
+
+        response = client.get('/api/loans/?status=returned&cursor=&per_page=2')
+        assert response.status_code == 200
+        data = response.json
+        assert len(data["loans"]) == 2
+        assert data["loans"][0]["subscriber_name"] == "Test User"
+        assert data["pagination"]["has_next"] is True
+
+        response = client.get(f'/api/loans/?status=returned&cursor={data["pagination"]["next_cursor"]}&per_page=2')
+        data = response.json
+        assert len(data["loans"]) == 1
+        assert data["loans"][0]["status"] == "returned"
+        assert data["pagination"]["next_cursor"] is None
+
+    def test_get_loans_invalid_filter(self, client, mongo):
+        response = client.get('/api/loans/?due_before=tomorrow')
+        assert response.status_code == 400
+
+    def test_loans_read_model_follows_renames(self, client, mongo):
+        subscriber_id = mongo.db.subscribers.insert_one({
+            "first_name": "Old",
+            "last_name": "Name",
+            "current_loans": []
+        }).inserted_id
+
+        document_id = mongo.db.documents.insert_one({
+            "title": "Old Title",
+            "available": True
+        }).inserted_id
+
+        response = client.post('/api/loans', json={
+            "subscriber_id": str(subscriber_id),
+            "document_id": str(document_id),
+            "loan_date": datetime.now().strftime("%Y-%m-%d"),
+            "due_date": (datetime.now() + timedelta(days=14)).strftime("%Y-%m-%d")
+        })
+        assert response.status_code == 201
+
+        client.put(f'/api/subscribers/{str(subscriber_id)}', json={"first_name": "New", "last_name": "Name"})
+        client.put(f'/api/documents/{str(document_id)}', json={"title": "New Title"})
+
+        response = client.get('/api/loans/?read_model=denormalized')
+        assert response.status_code == 200
+        assert response.json[0]["subscriber_name"] == "New Name"
+        assert response.json[0]["document_title"] == "New Title"
+
+    def test_get_loans_array_is_paged(self, client, mongo):
+        mongo.db.loans.insert_many([{"status": "active", "subscriber_name": f"S{i}"} for i in range(5)])
+
+        response = client.get('/api/loans/?read_model=denormalized&per_page=2')
+        assert [loan["subscriber_name"] for loan in response.json] == ["S4", "S3"]
+        assert response.headers["Link"] == (
+            '<http://localhost/api/loans/?read_model=denormalized&per_page=2&page=2>; rel="next"'
+        )
+        response = client.get('/api/loans/?read_model=denormalized&per_page=2&page=3')
+        assert [loan["subscriber_name"] for loan in response.json] == ["S0"]
+        assert "Link" not in response.headers
+
+    def test_concurrent_checkouts_of_same_document(self, test_app, mongo):
+        document_id = mongo.db.documents.insert_one({
+            "title": "Popular Book",
+            "available": True
+        }).inserted_id
+
+        subscriber_ids = [
+            mongo.db.subscribers.insert_one({
+                "first_name": "Test",
+                "last_name": f"User {i}",
+                "current_loans": []
+            }).inserted_id
+            for i in range(8)
+        ]
+
+        def checkout(subscriber_id):
+            return test_app.test_client().post('/api/loans', json={
+                "subscriber_id": str(subscriber_id),
+                "document_id": str(document_id),
+                "loan_date": datetime.now().strftime("%Y-%m-%d"),
+                "due_date": (datetime.now() + timedelta(days=14)).strftime("%Y-%m-%d")
+            }).status_code
+
+        with ThreadPoolExecutor(max_workers=len(subscriber_ids)) as pool:
+            status_codes = list(pool.map(checkout, subscriber_ids))
+
+        # Exactly one clerk gets the document
+        assert status_codes.count(201) == 1
+        assert mongo.db.loans.count_documents({"document_id": document_id}) == 1
+
+    def test_checkout_unknown_subscriber_releases_document(self, client, mongo):
+        document_id = mongo.db.documents.insert_one({
+            "title": "Test Book",
+            "available": True
+        }).inserted_id
+
+        response = client.post('/api/loans', json={
+            "subscriber_id": str(ObjectId()),
+            "document_id": str(document_id),
+            "loan_date": datetime.now().strftime("%Y-%m-%d"),
+            "due_date": (datetime.now() + timedelta(days=14)).strftime("%Y-%m-%d")
+        })
+        assert response.status_code == 404
+        assert mongo.db.documents.find_one({"_id": document_id})["available"] is True
+
+    def test_batch_checkout(self, client, mongo):
+        subscriber_id = mongo.db.subscribers.insert_one({
+            "first_name": "Test",
+            "last_name": "User",
+            "current_loans": []
+        }).inserted_id
+
+        available_ids = [
+            mongo.db.documents.insert_one({"title": f"Book {i}", "available": True}).inserted_id
+            for i in range(3)
+        ]
+        loaned_id = mongo.db.documents.insert_one({"title": "Loaned Book", "available": False}).inserted_id
+
+        response = client.post('/api/loans/batch', json={
+            "subscriber_id": str(subscriber_id),
+            "document_ids": [str(i) for i in available_ids] + [str(loaned_id), "not-an-id"],
+            "loan_date": datetime.now().strftime("%Y-%m-%d"),
+            "due_date": (datetime.now() + timedelta(days=14)).strftime("%Y-%m-%d")
+        })
+        assert response.status_code == 201
+        data = response.json
+        assert data["checked_out"] == 3
+        assert [r["status"] for r in data["results"]] == [
+            "checked_out", "checked_out", "checked_out", "unavailable", "invalid_id"
+        ]
+
+        assert mongo.db.loans.count_documents({"subscriber_id": subscriber_id}) == 3
+        assert mongo.db.documents.count_documents({"_id": {"$in": available_ids}, "available": False}) == 3
+        subscriber = mongo.db.subscribers.find_one({"_id": subscriber_id})
+        assert len(subscriber["current_loans"]) == 3
+
+    def test_batch_return(self, client, mongo):
+        subscriber_id = mongo.db.subscribers.insert_one({
+            "first_name": "Test",
+            "last_name": "User",
+            "current_loans": [],
+            "loan_history": []
+        }).inserted_id
+
+        document_ids = []
+        loan_ids = []
+        for i in range(3):
+            document_id = mongo.db.documents.insert_one({"title": f"Book {i}", "available": False}).inserted_id
+            loan = {
+                "subscriber_id": subscriber_id,
+                "document_id": document_id,
+                "status": "active",
+                "loan_date": datetime.utcnow(),
+                "due_date": datetime.utcnow() + timedelta(days=14)
+            }
+            loan_ids.append(mongo.db.loans.insert_one(loan).inserted_id)
+            document_ids.append(document_id)
+            mongo.db.subscribers.update_one({"_id": subscriber_id}, {"$push": {"current_loans": loan}})
+
+        # Two loans by loan id, one by the scanned document
+        response = client.post('/api/loans/return', json={
+            "loan_ids": [str(loan_ids[0]), str(loan_ids[1]), str(ObjectId())],
+            "document_ids": [str(document_ids[2])]
+        })
+        assert response.status_code == 200
+        data = response.json
+        assert data["returned"] == 3
+        assert [r["status"] for r in data["results"]] == ["returned", "returned", "not_found", "returned"]
+
+        assert mongo.db.loans.count_documents({"status": "returned"}) == 3
+        assert mongo.db.documents.count_documents({"available": True}) == 3
+        subscriber = mongo.db.subscribers.find_one({"_id": subscriber_id})
+        assert subscriber["current_loans"] == []
+        assert len(subscriber["loan_history"]) == 3
+
+    def test_batch_return_leaves_a_relent_document_alone(self, client, mongo):
+        subscriber_id = mongo.db.subscribers.insert_one({"first_name": "Test", "last_name": "User"}).inserted_id
+        new_loan_id = ObjectId()
+        document_id = mongo.db.documents.insert_one({
+            "title": "Book", "available": False, "current_loan_id": new_loan_id
+        }).inserted_id
+        old_loan_id = mongo.db.loans.insert_one({
+            "subscriber_id": subscriber_id,
+            "document_id": document_id,
+            "status": "active",
+            "loan_date": datetime.utcnow(),
+            "due_date": datetime.utcnow() + timedelta(days=14)
+        }).inserted_id
+
+        response = client.post('/api/loans/return', json={"loan_ids": [str(old_loan_id)]})
+        assert response.status_code == 200
+        assert response.json["returned"] == 1
+
+        document = mongo.db.documents.find_one({"_id": document_id})
+        assert document["available"] is False
+        assert document["current_loan_id"] == new_loan_id
+
+    def test_put_return_moves_the_loan_to_history(self, client, mongo):
+        document_id = mongo.db.documents.insert_one({"title": "Book", "available": True}).inserted_id
+        subscriber_id = mongo.db.subscribers.insert_one({
+            "first_name": "Test", "last_name": "User", "current_loans": []
+        }).inserted_id
+        response = client.post('/api/loans', json={
+            "subscriber_id": str(subscriber_id),
+            "document_id": str(document_id),
+            "loan_date": datetime.now().strftime("%Y-%m-%d"),
+            "due_date": (datetime.now() + timedelta(days=14)).strftime("%Y-%m-%d")
+        })
+        loan_id = response.json["id"]
+
+        response = client.put(f'/api/loans/{loan_id}', json={"status": "returned"})
+        assert response.status_code == 200
+
+        subscriber = mongo.db.subscribers.find_one({"_id": subscriber_id})
+        assert subscriber["current_loans"] == []
+        assert [str(loan["_id"]) for loan in subscriber["loan_history"]] == [loan_id]
+        assert mongo.db.documents.find_one({"_id": document_id})["available"] is True
+
+    def test_v2_checkout_extend_and_return(self, client, mongo):
+        subscriber_id = mongo.db.subscribers.insert_one({
+            "first_name": "Test",
+            "last_name": "User",
+            "current_loans": []
+        }).inserted_id
+        document_id = mongo.db.documents.insert_one({
+            "title": "Test Book",
+            "available": True
+        }).inserted_id
+
+        response = client.post('/api/v2/loans/', json={
+            "subscriber_id": str(subscriber_id),
+            "document_id": str(document_id)
+        })
+        assert response.status_code == 201
+        loan_id = response.json["data"]["_id"]
+        assert mongo.db.documents.find_one({"_id": document_id})["available"] is False
+
+        due_date = mongo.db.loans.find_one({"_id": ObjectId(loan_id)})["due_date"]
+        assert client.post(f'/api/v2/loans/{loan_id}/extend').status_code == 200
+        subscriber = mongo.db.subscribers.find_one({"_id": subscriber_id})
+        assert subscriber["current_loans"][0]["due_date"] > due_date
+
+        assert client.post(f'/api/v2/loans/{loan_id}/return').status_code == 200
+        assert client.post(f'/api/v2/loans/{loan_id}/return').status_code == 400
+        assert mongo.db.documents.find_one({"_id": document_id})["available"] is True
+        assert mongo.db.subscribers.find_one({"_id": subscriber_id})["current_loans"] == []
+
+    def test_mark_overdue(self, client, mongo):
+        subscriber_id = mongo.db.subscribers.insert_one({
+            "first_name": "Test",
+            "last_name": "User",
+            "current_loans": [],
+            "loan_history": []
+        }).inserted_id
+
+        loan_ids = []
+        for days in (-3, -1, 5):
+            document_id = mongo.db.documents.insert_one({"title": f"Book {days}", "available": False}).inserted_id
+            loan = {
+                "subscriber_id": subscriber_id,
+                "document_id": document_id,
+                "status": "active",
+                "loan_date": datetime.utcnow() - timedelta(days=14),
+                "due_date": datetime.utcnow() + timedelta(days=days)
+            }
+            loan_ids.append(mongo.db.loans.insert_one(loan).inserted_id)
+            mongo.db.subscribers.update_one({"_id": subscriber_id}, {"$push": {"current_loans": loan}})
+
+        run = mark_overdue(mongo.db, batch_size=1)
+        assert run["loans_marked"] == 2
+        assert mongo.db.job_runs.find_one({"_id": run["_id"]})["batches"] == 2
+
+        response = client.get('/api/loans/?status=overdue&sort=due_date&order=asc')
+        assert response.status_code == 200
+        assert [loan["_id"] for loan in response.json] == [str(loan_ids[0]), str(loan_ids[1])]
+        subscriber = mongo.db.subscribers.find_one({"_id": subscriber_id})
+        assert [loan["status"] for loan in subscriber["current_loans"]] == ["overdue", "overdue", "active"]
+
+        # Overdue loans can still be returned
+        response = client.post('/api/loans/return', json={"loan_ids": [str(loan_ids[0])]})
+        assert response.json["returned"] == 1
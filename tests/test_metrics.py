@@ -0,0 +1,36 @@
+from prometheus_client import REGISTRY
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+def test_request_metrics_are_labelled_by_route(client, mongo):
+    labels = {"method": "GET", "route": "/api/documents/", "status": "200"}
+    before = sample("http_request_duration_seconds_count", **labels)
+    in_progress = sample("http_requests_in_progress", method="GET")
+
+    response = client.get('/api/documents/?per_page=5')
+    response.close()
+
+    assert sample("http_request_duration_seconds_count", **labels) == before + 1
+    assert sample("http_response_size_bytes_count", method="GET", route="/api/documents/") >= 1
+    # Decremented once the body is closed
+    assert sample("http_requests_in_progress", method="GET") == in_progress
+
+def test_unknown_paths_share_one_label(client):
+    before = sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="404")
+    client.get('/api/no-such-route/123').close()
+    assert sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="404") == before + 1
+
+def test_mongo_commands_are_counted_per_collection(client, mongo):
+    labels = {"collection": "documents", "command": "find", "outcome": "success"}
+    before = sample("mongodb_commands_total", **labels)
+    client.get('/api/documents/?per_page=5').close()
+    assert sample("mongodb_commands_total", **labels) > before
+
+def test_metrics_endpoint(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    assert "http_request_duration_seconds" in body
+    assert "mongodb_pool_checkout_wait_seconds" in body
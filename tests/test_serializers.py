@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.schemas import DocumentSchema, LoanSchema, SubscriberSchema
+from app.serializers import serialize_document, serialize_loan, serialize_subscriber
+
+def test_serializers_match_schema_dump():
+    subscriber_id = ObjectId()
+    loan = {
+        "_id": ObjectId(),
+        "subscriber_id": subscriber_id,
+        "document_id": ObjectId(),
+        "loan_date": datetime(2024, 1, 1, 10, 30),
+        "due_date": datetime(2024, 1, 15, 10, 30),
+        "return_date": None,
+        "status": "active"
+    }
+    subscriber = {
+        "_id": subscriber_id,
+        "first_name": "Jean",
+        "last_name": "Dupont",
+        "email": "jean.dupont@example.com",
+        "address": "1 rue de la Paix",
+        "phone": "0102030405",
+        "inscription_date": datetime(2023, 5, 1),
+        "current_loans": [loan],
+        "loan_history": [],
+        "version": 3
+    }
+    document = {
+        "_id": ObjectId(),
+        "title": "Le Petit Prince",
+        "type": "book",
+        "author": "Saint-Exupery",
+        "publication_date": datetime(1943, 4, 6),
+        "available": False,
+        "genre": "fiction"
+    }
+    for schema, project, record in [
+        (SubscriberSchema(), serialize_subscriber, subscriber),
+        (DocumentSchema(), serialize_document, document),
+        (LoanSchema(), serialize_loan, loan),
+    ]:
+        expected = schema.dump(record)
+        assert project(record) == expected
+        assert list(project(record)) == list(expected)
+
+def test_serializers_skip_missing_fields():
+    # List views project the embedded loans out
+    subscriber = {"_id": ObjectId(), "first_name": "Jean", "last_name": "Dupont"}
+    assert serialize_subscriber(subscriber) == SubscriberSchema().dump(subscriber)
+    assert "current_loans" not in serialize_subscriber(subscriber)
@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+from app.filters import loan_filter
+from app.slow_queries import SlowQueryLog, command_shape, redact
+
+def command_events(name, command, duration_ms, request_id=1):
+    common = dict(command_name=name, connection_id=('localhost', 27017), request_id=request_id,
+                  database_name='mediatheque_test')
+    started = SimpleNamespace(command=command, **common)
+    succeeded = SimpleNamespace(duration_micros=int(duration_ms * 1000), reply={'ok': 1}, **common)
+    return started, succeeded
+
+def test_redact_keeps_fields_and_operators():
+    query = loan_filter({'status': 'active', 'due_before': '2024-01-01'})
+    assert redact(query) == {'status': '?', 'due_date': {'$lt': '?'}}
+    assert redact({'$or': [{'title': 'a'}, {'author': {'$in': ['b', 'c']}}]}) == {'$or': [{'title': '?'}, {'author': {'$in': '?'}}]}
+    assert command_shape('update', {'update': 'loans', 'updates': [{'q': {'_id': 1}, 'u': {'$set': {'status': 'returned'}}}]}) == {'filter': {'_id': '?'}}
+
+def test_only_slow_commands_are_recorded(test_app):
+    log = SlowQueryLog(threshold_ms=50, size=2)
+    find = {'find': 'loans', 'filter': {'subscriber_id': 'x'}, 'sort': {'loan_date': -1}, '$db': 'mediatheque_test'}
+    with test_app.test_request_context('/api/loans/?subscriber_id=x'):
+        for request_id, duration_ms in enumerate((5, 80, 120, 300)):
+            started, succeeded = command_events('find', find, duration_ms, request_id)
+            log.started(started)
+            log.succeeded(succeeded)
+
+    report = log.report()
+    assert report['recorded'] == 3
+    # Bounded: the oldest slow command is gone
+    assert [entry['duration_ms'] for entry in report['entries']] == [300, 120]
+    entry = report['entries'][0]
+    assert entry['route'] == 'GET /api/loans/'
+    assert entry['collection'] == 'loans'
+    assert entry['shape'] == {'filter': {'subscriber_id': '?'}, 'sort': {'loan_date': -1}}
+
+def test_slow_query_endpoint(client, mongo, monkeypatch):
+    slow_queries = client.application.extensions['slow_queries']
+    monkeypatch.setattr(slow_queries, 'threshold_ms', 0)
+    client.delete('/api/admin/slow-queries')
+
+    client.get('/api/documents/?per_page=5').close()
+
+    response = client.get('/api/admin/slow-queries?limit=10')
+    assert response.status_code == 200
+    routes = {(entry['route'], entry['collection']) for entry in response.json['entries']}
+    assert ('GET /api/documents/', 'documents') in routes
@@ -1,5 +1,6 @@
 # tests/test_subscribers.py
 import pytest
+import gzip
 import json
 from datetime import datetime
 from bson import ObjectId
@@ -8,6 +9,66 @@ def test_get_subscribers_empty(client):
     response = client.get('/api/subscribers/')
     assert response.status_code == 200
 
+def test_get_subscribers_excludes_loans_by_default(client, mongo):
+    mongo.db.subscribers.insert_one({
+        "first_name": "Test",
+        "last_name": "User",
+        "email": "test@example.com",
+        "current_loans": [{"document_id": ObjectId()}],
+        "loan_history": []
+    })
+
+    response = client.get('/api/subscribers/')
+    assert response.status_code == 200
+    assert "current_loans" not in response.json[0]
+
+    response = client.get('/api/subscribers/?include=loans')
+    assert len(response.json[0]["current_loans"]) == 1
+
+def test_get_subscribers_cursor_pagination(client, mongo):
+    for i in range(5):
+        mongo.db.subscribers.insert_one({
+            "first_name": "Test",
+            "last_name": f"User {i}",
+            "email": f"user{i}@example.com"
+        })
+
+    response = client.get('/api/subscribers/?cursor=&per_page=3')
+    assert response.status_code == 200
+    first_page = response.json
+    assert len(first_page["subscribers"]) == 3
+    assert first_page["pagination"]["has_next"] is True
+
+    response = client.get(f'/api/subscribers/?cursor={first_page["pagination"]["next_cursor"]}&per_page=3')
+    second_page = response.json
+    assert len(second_page["subscribers"]) == 2
+    assert second_page["pagination"]["next_cursor"] is None
+
+def test_get_subscribers_ndjson(client, mongo):
+    for i in range(3):
+        mongo.db.subscribers.insert_one({
+            "first_name": "Test",
+            "last_name": "User",
+            "email": f"user{i}@example.com"
+        })
+
+    response = client.get('/api/subscribers/?format=ndjson')
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)["email"] for line in lines] == [f"user{i}@example.com" for i in range(3)]
+
+def test_streamed_subscribers_are_compressed(client, mongo):
+    mongo.db.subscribers.insert_many([
+        {"first_name": "Test", "last_name": "User", "email": f"user{i}@example.com"} for i in range(3)
+    ])
+
+    response = client.get('/api/subscribers/?format=ndjson', headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    lines = gzip.decompress(response.data).decode().splitlines()
+    assert [json.loads(line)["email"] for line in lines] == [f"user{i}@example.com" for i in range(3)]
+
 def test_add_subscriber(client, mongo):
     subscriber_data = {
         "first_name": "John",
@@ -57,4 +118,93 @@ def test_update_subscriber(client, mongo):
         f'/api/subscribers/{subscriber_id}',
         json=update_data  # Use json instead of data with json.dumps
     )
-    assert response.status_code == 200
\ No newline at end of file
+    assert response.status_code == 200
+
+def test_renaming_subscriber_updates_loan_etags(client, mongo):
+    subscriber_id = mongo.db.subscribers.insert_one({"first_name": "Old", "last_name": "Name"}).inserted_id
+    loan_id = mongo.db.loans.insert_one({
+        "subscriber_id": subscriber_id,
+        "subscriber_name": "Old Name",
+        "status": "active",
+        "version": 1,
+        "last_updated": datetime(2024, 1, 1)
+    }).inserted_id
+    before = client.get(f'/api/loans/{loan_id}')
+
+    response = client.put(f'/api/subscribers/{subscriber_id}', json={"first_name": "New", "last_name": "Name"})
+    assert response.status_code == 200
+
+    after = client.get(f'/api/loans/{loan_id}', headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert after.headers["ETag"] != before.headers["ETag"]
+    loan = mongo.db.loans.find_one({"_id": loan_id})
+    assert loan["subscriber_name"] == "New Name"
+    assert loan["version"] == 2
+
+def test_suggest_subscribers_by_prefix(client, mongo):
+    client.post('/api/subscribers', json={
+        "first_name": "Jane",
+        "last_name": "Smith",
+        "email": "jane.smith@example.com",
+        "phone": "1234567890",
+        "address": "123 Test St"
+    })
+
+    response = client.get('/api/suggest/subscribers?q=smi')
+    assert response.status_code == 200
+    assert response.json[0]["label"] == "Jane Smith <jane.smith@example.com>"
+
+    response = client.get('/api/suggest/subscribers?q=jane.s')
+    assert len(response.json) == 1
+
+def test_get_subscriber_conditional(client, mongo):
+    response = client.post('/api/subscribers', json={
+        "first_name": "Test",
+        "last_name": "User",
+        "email": "etag@example.com"
+    })
+    subscriber_id = response.json["id"]
+
+    response = client.get(f'/api/subscribers/{subscriber_id}')
+    etag = response.headers["ETag"]
+    assert response.headers["Last-Modified"]
+
+    response = client.get(f'/api/subscribers/{subscriber_id}', headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    client.put(f'/api/subscribers/{subscriber_id}', json={"first_name": "New", "last_name": "User", "email": "etag@example.com"})
+    response = client.get(f'/api/subscribers/{subscriber_id}', headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_get_subscribers_list_conditional(client, mongo):
+    etag = client.get('/api/subscribers/?cursor=').headers["ETag"]
+    assert client.get('/api/subscribers/?cursor=', headers={"If-None-Match": etag}).status_code == 304
+    # Another query string is another list
+    assert client.get('/api/subscribers/?cursor=&per_page=5', headers={"If-None-Match": etag}).status_code == 200
+
+    client.post('/api/subscribers', json={"first_name": "Test", "last_name": "User", "email": "list@example.com"})
+    assert client.get('/api/subscribers/?cursor=', headers={"If-None-Match": etag}).status_code == 200
+
+def test_v2_create_and_update_subscriber(client, mongo):
+    subscriber_data = {
+        "first_name": "Jean",
+        "last_name": "Dupont",
+        "email": "jean.dupont@example.com",
+        "address": "1 rue de la Paix",
+        "phone": "0102030405"
+    }
+    response = client.post('/api/v2/subscribers/', json=subscriber_data)
+    assert response.status_code == 201
+    created = response.json["data"]
+    assert created["current_loans"] == []
+    assert isinstance(mongo.db.subscribers.find_one()["inscription_date"], datetime)
+
+    # An unchanged body is still a match, not a 404
+    response = client.put(f'/api/v2/subscribers/{created["_id"]}', json=subscriber_data)
+    assert response.status_code == 200
+
+    response = client.post('/api/v2/subscribers/', json={"first_name": "J"})
+    assert response.status_code == 400
+    assert "email" in response.json["validation_errors"]